@@ -0,0 +1,124 @@
+from dataclasses import dataclass, field
+import shlex
+from typing import ClassVar, Dict, Iterator, List, Optional
+
+
+@dataclass
+class CompileFlags:
+    """Compile definitions and options parsed from the flags of a legacy makefile.
+
+    Definitions ('-DNAME' or '-DNAME=VALUE') are stored without the '-D', a
+    definition repeated with another value keeps its first position and its
+    last value, as the compiler would. Options are deduplicated keeping the
+    first occurrence. Options taking their argument as the next token (e.g.
+    '-include file.h') are combined with the CMake 'SHELL:' prefix, so the
+    deduplication can not tear them apart. Include paths and the output
+    options CMake adds itself are dropped.
+    """
+
+    definitions: List[str] = field(default_factory=list)
+    options: List[str] = field(default_factory=list)
+
+    options_with_argument: ClassVar[List[str]] = [
+        "-include",
+        "-imacros",
+        "-isystem",
+        "-idirafter",
+        "-iquote",
+        "-x",
+        "-Xassembler",
+        "-Xpreprocessor",
+        "-Xlinker",
+        "-MF",
+        "-MT",
+        "-MQ",
+        "-T",
+    ]
+    # include paths come from the includes variable, compiling and the output are up to CMake
+    dropped_options: ClassVar[List[str]] = ["-c", "-o"]
+
+    @classmethod
+    def parse(cls, flags: Optional[str]) -> "CompileFlags":
+        definitions: Dict[str, str] = {}
+        options: Dict[str, None] = {}
+        for option in group_options(split_flags(flags)):
+            if option.startswith("-D") and len(option) > 2:
+                definition = option[2:]
+                definitions[definition.split("=", 1)[0]] = definition
+            elif not (
+                option.startswith("-I")
+                or option.split(" ", 1)[0] in cls.dropped_options
+            ):
+                options[option] = None
+        return cls(list(definitions.values()), list(options))
+
+    def difference(self, other: "CompileFlags") -> "CompileFlags":
+        """Flags not contained in the other flags, e.g. the ones added for a single target."""
+        return CompileFlags(
+            [
+                definition
+                for definition in self.definitions
+                if definition not in other.definitions
+            ],
+            [option for option in self.options if option not in other.options],
+        )
+
+    def missing(self, other: "CompileFlags") -> "CompileFlags":
+        """Flags of the other flags not contained here, e.g. the ones a target replacing a flags variable drops.
+
+        A definition only misses if no definition of the same name is left,
+        other values are part of the difference.
+        """
+        names = {definition.split("=", 1)[0] for definition in self.definitions}
+        return CompileFlags(
+            [
+                definition
+                for definition in other.definitions
+                if definition.split("=", 1)[0] not in names
+            ],
+            [option for option in other.options if option not in self.options],
+        )
+
+    def __str__(self) -> str:
+        return " ".join(
+            [f"-D{definition}" for definition in self.definitions] + self.options
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.definitions or self.options)
+
+
+def split_flags(flags: Optional[str]) -> List[str]:
+    """Split the flags at white space like the shell does, but keep backslashes (Windows paths)."""
+    if not flags:
+        return []
+    lexer = shlex.shlex(flags, posix=False)
+    lexer.whitespace_split = True
+    lexer.commenters = ""
+    return [
+        token[1:-1] if len(token) > 1 and token[0] == token[-1] == '"' else token
+        for token in lexer
+    ]
+
+
+def group_options(tokens: List[str]) -> Iterator[str]:
+    """Combine options with their separate argument.
+
+    '-D NAME' becomes '-DNAME', '-I dir' becomes '-Idir', '-o file' becomes
+    '-o file' and '-include file.h' becomes 'SHELL:-include file.h'.
+    """
+    tokens_iter = iter(tokens)
+    for token in tokens_iter:
+        argument = None
+        if token in ("-D", "-I", "-o") or token in CompileFlags.options_with_argument:
+            argument = next(tokens_iter, None)
+        if argument is None:
+            yield token
+        elif token in ("-D", "-I"):
+            yield token + argument
+        elif token == "-o":
+            yield f"{token} {argument}"
+        else:
+            if " " in argument:
+                argument = f'"{argument}"'
+            yield f"SHELL:{token} {argument}"
@@ -0,0 +1,51 @@
+from pathlib import Path
+import re
+from typing import Dict, List, Tuple
+
+from TransformerConfig import ComponentRule
+
+
+class ComponentSplitter:
+    """Groups the legacy sources into components by their directories.
+
+    A source belongs to the component of the first rule whose directory
+    contains it. All other sources are grouped by their first `depth`
+    directories, e.g. 'app/io/uart.c' belongs to the component 'app_io' for a
+    depth of 2. Sources directly in the source directory belong to the
+    'root' component. The component names are valid CMake target names.
+    """
+
+    root_component = "root"
+
+    def __init__(self, depth: int, rules: List[ComponentRule]) -> None:
+        self.depth = depth
+        self.rules: List[Tuple[Tuple[str, ...], str]] = [
+            (Path(rule.subdir_rel).parts, self.component_name(rule.name))
+            for rule in rules
+        ]
+
+    def split(self, sources: List[Path]) -> Dict[str, List[Path]]:
+        """Sources of each component sorted by component name, keeping the order of the sources."""
+        components: Dict[str, List[Path]] = {}
+        # all sources of a directory belong to the same component
+        dir_components: Dict[Path, str] = {}
+        for source in sources:
+            component = dir_components.get(source.parent)
+            if component is None:
+                component = dir_components[source.parent] = self.component_of(
+                    source.parent.parts
+                )
+            components.setdefault(component, []).append(source)
+        return dict(sorted(components.items()))
+
+    def component_of(self, dir_parts: Tuple[str, ...]) -> str:
+        for rule_parts, name in self.rules:
+            if dir_parts[: len(rule_parts)] == rule_parts:
+                return name
+        if self.depth <= 0 or not dir_parts:
+            return self.root_component
+        return self.component_name("_".join(dir_parts[: self.depth]))
+
+    @staticmethod
+    def component_name(name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_]", "_", name)
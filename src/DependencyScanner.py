@@ -0,0 +1,219 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import mmap
+import os
+from pathlib import Path
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+INCLUDE_PATTERN = re.compile(
+    rb'^[ \t]*#[ \t]*include[ \t]*([<"])([^">\r\n]+)[">]', re.MULTILINE
+)
+
+HEADER_EXTENSIONS = [".h", ".hh", ".hpp", ".hxx", ".inc"]
+
+# a quoted or angle bracket include and the included name
+Include = Tuple[bool, str]
+# size, modification time and includes of a file
+FileIncludes = Tuple[int, int, List[Include]]
+
+
+def scan_file(file: str) -> List[Include]:
+    """Includes of a file, memory mapped instead of read to avoid copying large files."""
+    try:
+        with open(file, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as content:
+            return [
+                (kind == b'"', name.strip().decode("utf-8", "replace"))
+                for kind, name in INCLUDE_PATTERN.findall(content)
+            ]
+    except (OSError, ValueError):
+        # missing or empty files (which can not be mapped)
+        return []
+
+
+class DependencyScanner:
+    """Reads the '#include' lines of all sources and headers below a directory.
+
+    The files are matched by extension and scanned in parallel on a process
+    pool. If a cache file is given, the includes of each file are stored
+    together with its size and modification time, so only new and changed
+    files are scanned again. Files outside of the root directory are scanned
+    on demand. All paths are normalized in case.
+    """
+
+    cache_version = 1
+    # below this number of files, starting the worker processes takes longer than scanning
+    min_parallel_files = 200
+
+    def __init__(
+        self,
+        root_dir: Path,
+        extensions: List[str],
+        cache_file: Optional[Path] = None,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self.root_dir = os.path.normcase(os.path.normpath(root_dir))
+        self.extensions = {os.path.normcase(extension) for extension in extensions}
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self.files: Optional[Dict[str, FileIncludes]] = None
+        self.scanned_files = 0
+
+    def scan(self) -> Dict[str, FileIncludes]:
+        """Includes of all matching files below the root directory."""
+        cache = self.load_cache()
+        self.files = {}
+        pending_files = []
+        for file, file_stat in self.walk():
+            cached = cache.get(file)
+            if cached and cached[:2] == (file_stat.st_size, file_stat.st_mtime_ns):
+                self.files[file] = cached
+            else:
+                self.files[file] = (file_stat.st_size, file_stat.st_mtime_ns, [])
+                pending_files.append(file)
+        for file, includes in zip(pending_files, self.scan_files(pending_files)):
+            self.files[file] = (*self.files[file][:2], includes)
+        self.scanned_files = len(pending_files)
+        if self.files != cache:
+            self.save_cache()
+        return self.files
+
+    def includes_of(self, file: str) -> List[Include]:
+        """Includes of a normalized file path, the root directory is scanned on the first call."""
+        if self.files is None:
+            self.scan()
+        file_includes = self.files.get(file)
+        if file_includes is None:
+            try:
+                file_stat = os.stat(file)
+            except OSError:
+                return []
+            file_includes = self.files[file] = (
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                scan_file(file),
+            )
+            self.scanned_files += 1
+        return file_includes[2]
+
+    def scan_files(self, files: List[str]) -> Iterable[List[Include]]:
+        if len(files) < self.min_parallel_files or self.max_workers == 1:
+            return map(scan_file, files)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(scan_file, files, chunksize=64))
+
+    def walk(self) -> Iterable[Tuple[str, os.stat_result]]:
+        pending_dirs = [self.root_dir]
+        while pending_dirs:
+            directory = pending_dirs.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending_dirs.append(
+                                os.path.join(directory, os.path.normcase(entry.name))
+                            )
+                        elif (
+                            os.path.normcase(os.path.splitext(entry.name)[1])
+                            in self.extensions
+                        ):
+                            yield os.path.join(
+                                directory, os.path.normcase(entry.name)
+                            ), entry.stat()
+            except OSError:
+                pass
+
+    def load_cache(self) -> Dict[str, FileIncludes]:
+        if not self.cache_file:
+            return {}
+        try:
+            data = json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return {}
+        if data.get("settings") != self.cache_settings():
+            return {}
+        return {
+            file: (size, mtime_ns, [(quoted, name) for quoted, name in includes])
+            for file, (size, mtime_ns, includes) in data["files"].items()
+        }
+
+    def save_cache(self) -> None:
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(
+            f"{self.cache_file.name}.{os.getpid()}.tmp"
+        )
+        tmp_file.write_text(
+            json.dumps(
+                {"settings": self.cache_settings(), "files": self.files},
+                separators=(",", ":"),
+            )
+        )
+        os.replace(tmp_file, self.cache_file)
+
+    def cache_settings(self) -> Dict:
+        return {
+            "version": self.cache_version,
+            "root_dir": self.root_dir,
+            "extensions": sorted(self.extensions),
+        }
+
+
+class DependencyGraph:
+    """Resolved includes between the legacy files, e.g. to find rebuild hot spots."""
+
+    def __init__(self, dependencies: Dict[str, List[str]]) -> None:
+        self.dependencies = dependencies
+
+    def fan_in(self, sources: Iterable[str]) -> Dict[str, int]:
+        """Number of sources including each header directly or transitively, highest first."""
+        counts: Dict[str, int] = {}
+        for source in sources:
+            visited: Set[str] = {source}
+            pending_files = [source]
+            while pending_files:
+                for dependency in self.dependencies.get(pending_files.pop(), []):
+                    if dependency not in visited:
+                        visited.add(dependency)
+                        pending_files.append(dependency)
+                        counts[dependency] = counts.get(dependency, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+    def to_json(self, file: Path, root_dir: Optional[Path] = None) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(
+            json.dumps(
+                {
+                    self.display_path(source, root_dir): [
+                        self.display_path(dependency, root_dir)
+                        for dependency in dependencies
+                    ]
+                    for source, dependencies in sorted(self.dependencies.items())
+                },
+                indent=2,
+            )
+        )
+
+    def to_dot(self, file: Path, root_dir: Optional[Path] = None) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with open(file, "w") as f:
+            f.write("digraph includes {\n")
+            for source, dependencies in sorted(self.dependencies.items()):
+                for dependency in dependencies:
+                    f.write(
+                        f'  "{self.display_path(source, root_dir)}" -> '
+                        f'"{self.display_path(dependency, root_dir)}";\n'
+                    )
+            f.write("}\n")
+
+    @staticmethod
+    def display_path(path: str, root_dir: Optional[Path]) -> str:
+        """Posix path relative to the root directory if it is inside of it."""
+        if root_dir:
+            rel_path = os.path.relpath(path, os.path.normcase(root_dir))
+            if not rel_path.startswith(os.pardir):
+                path = rel_path
+        return Path(path).as_posix()
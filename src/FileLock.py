@@ -0,0 +1,107 @@
+import logging
+import os
+from pathlib import Path
+import time
+from types import TracebackType
+from typing import Optional, Type
+import uuid
+
+
+class FileLock:
+    """Inter-process lock based on exclusively creating a lock file.
+
+    Works on every platform and file system without additional packages.
+    The lock file contains the process id and a token unique to each
+    acquisition, only the owner of the lock removes it again. A lock file
+    older than `stale_after` seconds is considered to be left behind by a
+    crashed process and is taken over. Processes taking over a stale lock
+    do so one after the other, each one only removes the lock if it still
+    contains the owner found stale, never a lock taken in the meantime.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(
+        self, lock_file: Path, timeout: float = 60.0, stale_after: float = 300.0
+    ) -> None:
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.lock_file = lock_file
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.owner: Optional[str] = None
+
+    def acquire(self) -> None:
+        deadline = time.monotonic() + self.timeout
+        owner = f"{os.getpid()} {uuid.uuid4().hex}"
+        while True:
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                self.remove_stale_lock()
+                if time.monotonic() > deadline:
+                    raise TimeoutError(
+                        f"Could not acquire the lock {self.lock_file} within {self.timeout}s."
+                    )
+                time.sleep(self.poll_interval)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(owner)
+            self.owner = owner
+            return
+
+    def release(self) -> None:
+        if self.owner is None:
+            return
+        if self.read_owner(self.lock_file) == self.owner:
+            self.lock_file.unlink(missing_ok=True)
+        else:
+            self.logger.warning(
+                f"The lock {self.lock_file} was taken over as stale, it is not removed."
+            )
+        self.owner = None
+
+    def remove_stale_lock(self) -> None:
+        stale_owner = self.read_owner(self.lock_file)
+        if stale_owner is None or not self.is_stale(self.lock_file):
+            return
+        # only one process at a time takes over the stale lock
+        breaker = self.lock_file.with_name(f"{self.lock_file.name}.break")
+        try:
+            fd = os.open(breaker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # left behind if a process crashed while taking over the lock
+            if self.is_stale(breaker):
+                breaker.unlink(missing_ok=True)
+            return
+        try:
+            # another process might have taken over the stale lock already
+            if self.read_owner(self.lock_file) == stale_owner:
+                self.lock_file.unlink(missing_ok=True)
+        finally:
+            os.close(fd)
+            breaker.unlink(missing_ok=True)
+
+    def is_stale(self, file: Path) -> bool:
+        try:
+            return time.time() - file.stat().st_mtime > self.stale_after
+        except OSError:
+            return False
+
+    @staticmethod
+    def read_owner(file: Path) -> Optional[str]:
+        try:
+            return file.read_text()
+        except OSError:
+            return None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.release()
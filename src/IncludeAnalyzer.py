@@ -0,0 +1,237 @@
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from DependencyScanner import DependencyGraph, DependencyScanner
+
+
+class HeaderIndex:
+    """Maps file names to the directories containing them.
+
+    Built with a single walk over the root directories. Afterwards, checking
+    whether a directory resolves an include name like 'sub/header.h' needs
+    no file system access anymore. Paths are compared normalized in case.
+    """
+
+    def __init__(self, root_dirs: Iterable[str]) -> None:
+        self.dirs_by_name: Dict[str, Set[str]] = {}
+        walked_roots: List[str] = []
+        for root_dir in sorted(self.normalize(root_dir) for root_dir in root_dirs):
+            # nested roots are covered by the walk of their parent already
+            if any(
+                root_dir == walked
+                or root_dir.startswith(walked.rstrip(os.sep) + os.sep)
+                for walked in walked_roots
+            ):
+                continue
+            walked_roots.append(root_dir)
+            self.add_tree(root_dir)
+
+    def add_tree(self, root_dir: str) -> None:
+        # the path to scan and its normalized form the headers are indexed with
+        pending_dirs = [(root_dir, root_dir)]
+        while pending_dirs:
+            path, directory = pending_dirs.pop()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending_dirs.append(
+                                (
+                                    entry.path,
+                                    os.path.join(
+                                        directory, os.path.normcase(entry.name)
+                                    ),
+                                )
+                            )
+                        else:
+                            self.dirs_by_name.setdefault(
+                                os.path.normcase(entry.name), set()
+                            ).add(directory)
+            except OSError:
+                pass
+
+    def resolve(self, directory: str, include_name: str) -> Optional[str]:
+        """Normalized path of the included file if the directory contains it."""
+        path = self.normalize(os.path.join(directory, include_name))
+        parent, name = os.path.split(path)
+        return path if parent in self.dirs_by_name.get(name, ()) else None
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        return os.path.normcase(os.path.normpath(path))
+
+
+@dataclass
+class IncludeAnalysisReport:
+    sources: int = 0
+    headers: int = 0
+    includes: int = 0
+    # include paths in their original order and the number of includes each one resolves
+    used: Dict[str, int] = field(default_factory=dict)
+    unused: List[str] = field(default_factory=list)
+    # names of the includes not found in any include path, e.g. system headers
+    unresolved: Dict[str, int] = field(default_factory=dict)
+    # include paths required by the sources of each component
+    components: Dict[str, List[str]] = field(default_factory=dict)
+    # headers included directly or transitively by the most sources, the rebuild hot spots
+    fan_in: Dict[str, int] = field(default_factory=dict)
+    duration: float = 0.0
+
+    def to_file(self, file: Path) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(
+            json.dumps(
+                {
+                    "sources": self.sources,
+                    "headers": self.headers,
+                    "includes": self.includes,
+                    "used": self.used,
+                    "unused": self.unused,
+                    "unresolved": self.unresolved,
+                    "components": self.components,
+                    "fan_in": self.fan_in,
+                },
+                indent=2,
+            )
+        )
+
+    @staticmethod
+    def used_include_dirs(file: Path) -> List[str]:
+        return list(json.loads(file.read_text())["used"])
+
+    def __str__(self) -> str:
+        return (
+            f"Analyzed {self.includes} includes of {self.sources} sources and {self.headers} headers "
+            f"in {self.duration:.2f}s: {len(self.used)} include paths used, "
+            f"{len(self.unused)} unused, {len(self.unresolved)} headers not found"
+        )
+
+
+class IncludeAnalyzer:
+    """Finds the include paths really needed to compile the legacy sources.
+
+    The '#include' lines of the sources and, transitively, of all headers
+    they include are resolved like the preprocessor does: quoted includes
+    relative to the including file first, then along the include paths,
+    the first match wins. An include path is used if it is the first match
+    for at least one include. All other include paths can be dropped without
+    changing which header any include resolves to. Conditional includes are
+    all taken into account, computed includes (#include MACRO) and headers
+    generated during the build are not.
+    """
+
+    # number of headers listed in the fan-in of the report
+    max_fan_in_headers = 100
+
+    def __init__(
+        self,
+        include_dirs: List[str],
+        header_index: HeaderIndex,
+        scanner: DependencyScanner,
+    ) -> None:
+        self.include_dirs = include_dirs
+        self.normalized_include_dirs = [
+            HeaderIndex.normalize(include_dir) for include_dir in include_dirs
+        ]
+        self.header_index = header_index
+        self.scanner = scanner
+        # resolved includes and the include path index each one was found with, per scanned file
+        self.dependencies: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+        self.unresolved: Dict[str, int] = {}
+
+    def analyze(
+        self,
+        sources: List[str],
+        components: Optional[Dict[str, List[str]]] = None,
+    ) -> IncludeAnalysisReport:
+        start = time.perf_counter()
+        normalized_sources = [HeaderIndex.normalize(source) for source in sources]
+        self.scan(normalized_sources)
+        used_counts = [0] * len(self.include_dirs)
+        includes = 0
+        for dependencies in self.dependencies.values():
+            includes += len(dependencies)
+            for _, include_dir_index in dependencies:
+                if include_dir_index is not None:
+                    used_counts[include_dir_index] += 1
+        report = IncludeAnalysisReport(
+            sources=len(sources),
+            headers=len(self.dependencies) - len(set(normalized_sources)),
+            includes=includes + sum(self.unresolved.values()),
+            unresolved=dict(sorted(self.unresolved.items())),
+        )
+        for include_dir, count in zip(self.include_dirs, used_counts):
+            if count:
+                report.used[include_dir] = count
+            else:
+                report.unused.append(include_dir)
+        for component, component_sources in (components or {}).items():
+            report.components[component] = self.required_include_dirs(
+                HeaderIndex.normalize(source) for source in component_sources
+            )
+        report.fan_in = dict(
+            list(self.graph().fan_in(normalized_sources).items())[
+                : self.max_fan_in_headers
+            ]
+        )
+        report.duration = time.perf_counter() - start
+        return report
+
+    def scan(self, files: Iterable[str]) -> None:
+        """Scan the files and all files they include, transitively."""
+        pending_files = [file for file in files if file not in self.dependencies]
+        while pending_files:
+            file = pending_files.pop()
+            if file in self.dependencies:
+                continue
+            dependencies = self.dependencies[file] = []
+            for quoted, name in self.scanner.includes_of(file):
+                resolved = self.resolve(file, quoted, name)
+                if resolved is None:
+                    self.unresolved[name] = self.unresolved.get(name, 0) + 1
+                    continue
+                dependencies.append(resolved)
+                if resolved[0] not in self.dependencies:
+                    pending_files.append(resolved[0])
+
+    def resolve(
+        self, file: str, quoted: bool, name: str
+    ) -> Optional[Tuple[str, Optional[int]]]:
+        if quoted:
+            resolved = self.header_index.resolve(os.path.dirname(file), name)
+            if resolved:
+                return resolved, None
+        for index, include_dir in enumerate(self.normalized_include_dirs):
+            resolved = self.header_index.resolve(include_dir, name)
+            if resolved:
+                return resolved, index
+        return None
+
+    def required_include_dirs(self, files: Iterable[str]) -> List[str]:
+        """Include paths needed by the given (scanned) files, in their original order."""
+        required: Set[int] = set()
+        visited: Set[str] = set()
+        pending_files = list(files)
+        while pending_files:
+            file = pending_files.pop()
+            if file in visited:
+                continue
+            visited.add(file)
+            for resolved, include_dir_index in self.dependencies.get(file, []):
+                if include_dir_index is not None:
+                    required.add(include_dir_index)
+                pending_files.append(resolved)
+        return [self.include_dirs[index] for index in sorted(required)]
+
+    def graph(self) -> DependencyGraph:
+        """Resolved includes of all scanned files."""
+        return DependencyGraph(
+            {
+                file: [resolved for resolved, _ in dependencies]
+                for file, dependencies in self.dependencies.items()
+            }
+        )
@@ -1,20 +1,51 @@
+import logging
+import os
 from pathlib import Path
 import re
-from typing import Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
+from CompileFlags import CompileFlags, group_options, split_flags
+from LibraryScanner import LibraryScanner
+from MakeDatabase import matches_pattern
+from MakeVariablesDump import MakeVariablesDump
 from TransformerConfig import TransformerConfig
 
 
 class LegacyBuildSystem:
     """TODO: give this class only the required information and not the whole TransformerConfig"""
 
+    # sources compiled with the assembler flags instead of the compiler flags
+    asm_extensions = [".s", ".asm"]
+
     def __init__(
-        self, make_variables_dump: Union[str, Path], config: TransformerConfig
+        self,
+        make_variables_dump: Union[str, Path],
+        config: TransformerConfig,
+        cache_dir: Optional[Path] = None,
+        target_variables: Optional[Dict[str, Dict[str, str]]] = None,
     ) -> None:
-        self.make_variables: Dict[str, str] = self.parse_make_var_dump(
-            make_variables_dump
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.make_variables_dump = MakeVariablesDump(
+            make_variables_dump, persistent_index=True
         )
         self.config = config
+        self.cache_dir = cache_dir
+        # values of the variables set for single targets (e.g. 'main.o: CCFLAGS += -O0'), by target
+        self.target_variables = target_variables or {}
+
+    def close(self) -> None:
+        """Close the index of the make variables dump, e.g. before make writes a new dump."""
+        self.make_variables_dump.close()
+
+    def __enter__(self) -> "LegacyBuildSystem":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @property
+    def make_variables(self) -> Dict[str, str]:
+        return self.make_variables_dump.to_dict()
 
     @property
     def build_dir(self) -> Path:
@@ -29,7 +60,7 @@ class LegacyBuildSystem:
         return self.config.input_dir / self.config.third_party_libs_dir_rel
 
     def get_variable(self, var_name: str) -> Optional[str]:
-        return self.make_variables.get(var_name, None)
+        return self.make_variables_dump.get(var_name)
 
     def get_include_paths(self) -> List[Path]:
         return self.relativize_paths(
@@ -41,39 +72,176 @@ class LegacyBuildSystem:
             self.extract_source_paths(self.get_variable(self.config.sources_var))
         )
 
-    def relativize_paths(self, paths: List[Path]) -> List[Path]:
-        result = []
-        for path in paths:
-            try:
-                rel_path = (
-                    self.build_dir.joinpath(path)
-                    .resolve(strict=False)
-                    .relative_to(self.sources_dir)
+    def get_include_dirs(self) -> List[str]:
+        """Absolute include paths"""
+        return self.resolve_paths(
+            self.extract_include_paths(self.get_variable(self.config.includes_var))
+        )
+
+    def get_source_files(self) -> List[str]:
+        """Absolute source paths"""
+        return self.resolve_paths(
+            self.extract_source_paths(self.get_variable(self.config.sources_var))
+        )
+
+    def get_compile_flags(self) -> CompileFlags:
+        return CompileFlags.parse(self.get_flags(self.config.compile_flags_vars))
+
+    def get_asm_flags(self) -> CompileFlags:
+        return CompileFlags.parse(self.get_flags(self.config.asm_flags_vars))
+
+    def get_link_options(self) -> List[str]:
+        """Linker flags in their original order, libraries may have to be repeated."""
+        return list(
+            group_options(split_flags(self.get_flags(self.config.link_flags_vars)))
+        )
+
+    def get_source_compile_flags(self) -> Dict[Path, CompileFlags]:
+        """Flags added by target specific variables to single sources, by source path.
+
+        A target belongs to the source with the same path without extension
+        (e.g. 'main.o' built in the source directory) or, if unambiguous, to the
+        source with the same name without extension (e.g. 'obj/main.o').
+        Patterns (e.g. 'obj/fast_%.o') are matched the same way against all
+        sources, the variables of a target win over the ones of a pattern.
+        Flags of the target which are also global flags are left out.
+        CMake applies the global flags to all sources, so a warning lists the
+        global flags a target drops by replacing a flags variable ('=' or ':='
+        instead of '+=').
+        """
+        if not self.target_variables:
+            return {}
+        sources_by_path: Dict[str, Path] = {}
+        sources_by_name: Dict[str, List[Path]] = {}
+        for source_file, source_path in zip(
+            self.get_source_files(), self.get_source_paths()
+        ):
+            stem = os.path.splitext(source_file)[0]
+            sources_by_path[stem] = source_path
+            sources_by_name.setdefault(os.path.basename(stem), []).append(source_path)
+        global_flags: Dict[bool, CompileFlags] = {}
+        result: Dict[Path, CompileFlags] = {}
+        removed_flags: Dict[Path, CompileFlags] = {}
+        # patterns first, so the targets overwrite their flags
+        for target, variables in sorted(
+            self.target_variables.items(), key=lambda item: "%" not in item[0]
+        ):
+            for source_path in self.target_sources(
+                target, sources_by_path, sources_by_name
+            ):
+                flags = self.get_target_compile_flags(
+                    source_path, variables, global_flags, removed_flags
                 )
-            # For paths which are not inside the configured build folder,
-            # expect them to be relative to the root folder.
-            except ValueError:
-                rel_path = (
-                    self.build_dir.joinpath(path)
-                    .resolve(strict=False)
-                    .relative_to(self.config.input_dir)
+                if flags:
+                    result[source_path] = flags
+        for source_path, removed in removed_flags.items():
+            if removed:
+                self.logger.warning(
+                    f"The target variables of {source_path.as_posix()} remove the flags "
+                    f"'{removed}', CMake still applies them as global flags."
                 )
-            result.append(rel_path)
         return result
 
+    def target_sources(
+        self,
+        target: str,
+        sources_by_path: Dict[str, Path],
+        sources_by_name: Dict[str, List[Path]],
+    ) -> List[Path]:
+        stem = os.path.splitext(self.resolve_paths([target])[0])[0]
+        if "%" in stem:
+            return [
+                source_path
+                for source_stem, source_path in sources_by_path.items()
+                if matches_pattern(source_stem, stem)
+            ] or [
+                source_path
+                for name, source_paths in sources_by_name.items()
+                if matches_pattern(name, os.path.basename(stem))
+                for source_path in source_paths
+            ]
+        source_path = sources_by_path.get(stem)
+        if source_path is not None:
+            return [source_path]
+        candidates = sources_by_name.get(os.path.basename(stem), [])
+        return candidates if len(candidates) == 1 else []
+
+    def get_target_compile_flags(
+        self,
+        source_path: Path,
+        variables: Dict[str, str],
+        global_flags: Dict[bool, CompileFlags],
+        removed_flags: Dict[Path, CompileFlags],
+    ) -> Optional[CompileFlags]:
+        is_asm = source_path.suffix.lower() in self.asm_extensions
+        var_names = (
+            self.config.asm_flags_vars if is_asm else self.config.compile_flags_vars
+        )
+        if not any(var_name in variables for var_name in var_names):
+            return None
+        if is_asm not in global_flags:
+            global_flags[is_asm] = CompileFlags.parse(self.get_flags(var_names))
+        flags = CompileFlags.parse(self.get_flags(var_names, variables))
+        removed_flags[source_path] = flags.missing(global_flags[is_asm])
+        return flags.difference(global_flags[is_asm])
+
+    def get_flags(
+        self, var_names: List[str], target_variables: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Values of the flags variables, the target specific values win if given."""
+        values = []
+        for var_name in var_names:
+            if target_variables and var_name in target_variables:
+                values.append(target_variables[var_name])
+            else:
+                values.append(self.get_variable(var_name) or "")
+        return " ".join(values)
+
+    def resolve_paths(self, paths: List[str]) -> List[str]:
+        """Make paths relative to the build folder absolute and normalize them lexically."""
+        build_dir = str(self.build_dir)
+        return [os.path.normpath(os.path.join(build_dir, path)) for path in paths]
+
+    def relativize_paths(self, paths: List[str]) -> List[Path]:
+        """Convert paths relative to the build folder into paths relative to the sources folder.
+
+        Paths outside of the sources folder are made relative to the input folder.
+        Paths are normalized lexically (without accessing the file system) and
+        the decision which folder they are relative to is taken once per directory.
+        """
+        sources_dir = os.path.normpath(self.sources_dir)
+        rel_dirs: Dict[str, Path] = {}
+        result = []
+        for normalized_path in self.resolve_paths(paths):
+            if normalized_path == sources_dir:
+                result.append(Path("."))
+                continue
+            directory, name = os.path.split(normalized_path)
+            rel_dir = rel_dirs.get(directory)
+            if rel_dir is None:
+                rel_dir = rel_dirs[directory] = self.relativize_dir(Path(directory))
+            result.append(rel_dir / name)
+        return result
+
+    def relativize_dir(self, directory: Path) -> Path:
+        try:
+            return directory.relative_to(self.sources_dir)
+        # For paths which are not inside the configured build folder,
+        # expect them to be relative to the root folder.
+        except ValueError:
+            return directory.relative_to(self.config.input_dir)
+
     def get_thirdparty_libs(self) -> List[Path]:
-        libraries = list(self.third_party_dir.glob("**/*.a"))
-        libraries.extend(list(self.third_party_dir.glob("**/*.lib")))
-        return [lib.relative_to(self.third_party_dir) for lib in libraries]
+        return LibraryScanner(
+            self.third_party_dir,
+            self.config.third_party_lib_extensions,
+            self.config.third_party_exclude_dirs,
+            self.cache_dir / "third_party_libs.json" if self.cache_dir else None,
+        ).find()
 
     @staticmethod
     def parse_make_var_dump(make_variables_dump: Union[str, Path]) -> Dict:
-        content = (
-            make_variables_dump
-            if isinstance(make_variables_dump, str)
-            else make_variables_dump.read_text()
-        )
-        return LegacyBuildSystem.create_dict_from_multiline_str(content)
+        return MakeVariablesDump(make_variables_dump).to_dict()
 
     @staticmethod
     def create_dict_from_multiline_str(multiline_str):
@@ -0,0 +1,111 @@
+import fnmatch
+import json
+import os
+from pathlib import Path
+import posixpath
+from typing import Dict, List, Optional, Tuple
+
+# modification time, library names and subdirectory names of a directory
+DirEntries = Tuple[int, List[str], List[str]]
+
+
+class LibraryScanner:
+    """Finds the libraries in a directory tree in a single pass.
+
+    Files are matched by extension, directories matching one of the exclude
+    patterns are pruned. If a cache file is given, the libraries and
+    subdirectories of each directory are stored together with its modification
+    time. On the next run only directories whose modification time changed
+    (i.e. entries were added, removed or renamed) are listed again.
+    """
+
+    cache_version = 1
+
+    def __init__(
+        self,
+        root_dir: Path,
+        extensions: List[str],
+        exclude_dirs: Optional[List[str]] = None,
+        cache_file: Optional[Path] = None,
+    ) -> None:
+        self.root_dir = root_dir
+        self.extensions = {os.path.normcase(extension) for extension in extensions}
+        self.exclude_dirs = exclude_dirs or []
+        self.cache_file = cache_file
+
+    def find(self) -> List[Path]:
+        """Library paths relative to the root directory, sorted by their posix path."""
+        cache = self.load_cache()
+        dirs: Dict[str, DirEntries] = {}
+        libraries = []
+        pending_dirs = [""]
+        while pending_dirs:
+            rel_dir = pending_dirs.pop()
+            directory = os.path.join(self.root_dir, rel_dir)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            cached_entries = cache.get(rel_dir)
+            if cached_entries and cached_entries[0] == mtime_ns:
+                entries = cached_entries
+            else:
+                entries = (mtime_ns, *self.scan_dir(directory))
+            dirs[rel_dir] = entries
+            libraries.extend(posixpath.join(rel_dir, name) for name in entries[1])
+            pending_dirs.extend(posixpath.join(rel_dir, name) for name in entries[2])
+        if dirs != cache:
+            self.save_cache(dirs)
+        return [Path(library) for library in sorted(libraries)]
+
+    def scan_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        libraries = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if not self.is_excluded(entry.name):
+                            subdirs.append(entry.name)
+                    elif self.is_library(entry.name):
+                        libraries.append(entry.name)
+        except OSError:
+            pass
+        return libraries, subdirs
+
+    def is_library(self, file_name: str) -> bool:
+        return os.path.normcase(os.path.splitext(file_name)[1]) in self.extensions
+
+    def is_excluded(self, dir_name: str) -> bool:
+        return any(fnmatch.fnmatch(dir_name, pattern) for pattern in self.exclude_dirs)
+
+    def load_cache(self) -> Dict[str, DirEntries]:
+        if not self.cache_file:
+            return {}
+        try:
+            data = json.loads(self.cache_file.read_text())
+        except (OSError, ValueError):
+            return {}
+        if data.get("settings") != self.cache_settings():
+            return {}
+        return {rel_dir: tuple(entries) for rel_dir, entries in data["dirs"].items()}
+
+    def save_cache(self, dirs: Dict[str, DirEntries]) -> None:
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(
+            f"{self.cache_file.name}.{os.getpid()}.tmp"
+        )
+        tmp_file.write_text(
+            json.dumps({"settings": self.cache_settings(), "dirs": dirs})
+        )
+        os.replace(tmp_file, self.cache_file)
+
+    def cache_settings(self) -> Dict:
+        return {
+            "version": self.cache_version,
+            "root_dir": str(Path(self.root_dir).absolute()),
+            "extensions": sorted(self.extensions),
+            "exclude_dirs": self.exclude_dirs,
+        }
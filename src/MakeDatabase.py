@@ -0,0 +1,276 @@
+import json
+import os
+from pathlib import Path
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# a variable definition is printed after a comment with its origin, e.g. '# makefile (from 'makefile', line 3)'
+ORIGIN_PATTERN = re.compile(
+    r"# (default|environment|automatic|makefile|command line|'?override'?)\b"
+)
+ASSIGNMENT_PATTERN = re.compile(r"([^\s=]+) (:{0,3}=|[+?!]=) ?(.*)")
+TARGET_ASSIGNMENT_PATTERN = re.compile(r"(.+?): " + ASSIGNMENT_PATTERN.pattern)
+# $(NAME), ${NAME}, substitution references like $(SOURCES:.c=.o) and $$
+REFERENCE_PATTERN = re.compile(
+    r"\$(?:\(([^()$\s:=#,]+)(?::([^()$\s=#]*)=([^()$\s#]*))?\)"
+    r"|\{([^{}$\s:=#,]+)(?::([^{}$\s=#]*)=([^{}$\s#]*))?\}|(\$))"
+)
+
+# flags make passes to sub-makes, never selected by a pattern like '%FLAGS'
+MAKE_FLAGS_VARIABLES = ("MAKEFLAGS", "MFLAGS", "GNUMAKEFLAGS")
+
+# operator and raw value of a variable definition
+Definition = Tuple[str, str]
+
+SECTIONS = {
+    "# Variables": "variables",
+    "# Pattern-specific Variable Values": "patterns",
+    "# Directories": "other",
+    "# Implicit Rules": "other",
+    "# Files": "files",
+    "# VPATH Search Paths": "other",
+}
+
+
+class MakeDatabase:
+    """Target specific variables read from the database make prints with '-p'.
+
+    The database is fed line by line, e.g. while make is still writing it,
+    and only the variable definitions are kept, so even huge databases are
+    parsed in bounded memory. Targets include the patterns of pattern
+    specific variables (e.g. 'obj/%.o').
+
+    The global variables are expanded by make itself, collect.mak writes them
+    while make prints the database. Only the variables a target changes, and
+    the global variables referencing them, are expanded here in the context
+    of the target, on a best-effort basis: references to variables and
+    substitution references are expanded, function calls around them are
+    kept as they are. All other variables get the values make expanded.
+    Automatic variables are skipped. If a selection of variable names or
+    make patterns is given, only the matching variables coming from the
+    makefiles or the command line are written, like collect.mak does.
+    """
+
+    def __init__(self, selection: Optional[List[str]] = None) -> None:
+        self.selection = selection or []
+        # origin and definition of each global variable
+        self.variables: Dict[str, Tuple[str, Definition]] = {}
+        self.target_variables: Dict[str, Dict[str, Definition]] = {}
+        self.section: Optional[str] = None
+        self.origin: Optional[str] = None
+        self.pattern: Optional[str] = None
+        # name, operator and lines of a multi-line variable ('define NAME')
+        self.define: Optional[Tuple[str, str, List[str]]] = None
+        # global variables referencing each variable, built on first use
+        self.referencing: Optional[Dict[str, Set[str]]] = None
+
+    def parse(self, lines: Iterable[str]) -> "MakeDatabase":
+        for line in lines:
+            self.feed(line)
+        return self
+
+    def feed(self, line: str) -> None:
+        if self.define:
+            line = line.rstrip("\r\n")
+            if line == "endef":
+                name, operator, value_lines = self.define
+                self.add_global(name, operator, "\n".join(value_lines))
+                self.define = None
+            else:
+                self.define[2].append(line)
+            return
+        if self.origin is None:
+            # most lines are comments about files ('#  ...') and recipes, skip them fast
+            if line.startswith("# ") and not line.startswith("#  "):
+                line = line.rstrip("\r\n")
+                section = SECTIONS.get(line)
+                if section:
+                    self.section = section
+                    self.pattern = None
+                    return
+                match = ORIGIN_PATTERN.match(line)
+                if match:
+                    self.origin = match.group(1)
+            elif self.section == "patterns" and not line.startswith("#"):
+                line = line.rstrip("\r\n")
+                if line.endswith(" :"):
+                    self.pattern = line[:-2]
+            return
+        line = line.rstrip("\r\n")
+        if self.section == "patterns" and line.startswith("# "):
+            # pattern specific variables are printed as comments
+            line = line[2:]
+        self.add_definition(line)
+        self.origin = None
+
+    def add_definition(self, line: str) -> None:
+        if self.section == "variables":
+            if line.startswith("define "):
+                name, _, operator = line[len("define ") :].partition(" ")
+                self.define = (name, operator or "=", [])
+                return
+            match = ASSIGNMENT_PATTERN.fullmatch(line)
+            if match:
+                self.add_global(*match.groups())
+        elif self.section == "patterns":
+            match = ASSIGNMENT_PATTERN.fullmatch(line)
+            if match and self.pattern:
+                name, operator, value = match.groups()
+                self.target_variables.setdefault(self.pattern, {})[name] = (
+                    operator,
+                    value,
+                )
+        elif self.section == "files":
+            match = TARGET_ASSIGNMENT_PATTERN.fullmatch(line)
+            if match:
+                target, name, operator, value = match.groups()
+                self.target_variables.setdefault(target, {})[name] = (operator, value)
+
+    def add_global(self, name: str, operator: str, value: str) -> None:
+        if self.origin != "automatic":
+            self.variables[name] = (self.origin or "makefile", (operator, value))
+
+    def target_values(self, global_values: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+        """Expanded values of the selected variables differing for a target from the global ones.
+
+        Besides the variables set for the target itself, these are the global
+        variables referencing them, e.g. 'CFLAGS = $(OPT)' for 'main.o: OPT = -O0'.
+        The global values are the ones make expanded, e.g. read from the dump.
+        """
+        result: Dict[str, Dict[str, str]] = {}
+        for target, definitions in self.target_variables.items():
+            affected = self.affected_variables(definitions)
+            # the variables the target does not change keep the values make expanded
+            expanded = {
+                name: value
+                for name, value in global_values.items()
+                if name not in affected
+            }
+            values = {}
+            for name in sorted(affected):
+                if not self.is_selected(
+                    name, self.variables.get(name, ("makefile",))[0]
+                ):
+                    continue
+                value = self.expand_target(name, definitions, expanded, set())
+                if value.strip() != global_values.get(name):
+                    values[name] = value
+            if values:
+                result[target] = values
+        return result
+
+    def affected_variables(self, names: Iterable[str]) -> Set[str]:
+        """The variables and all global variables referencing them, transitively."""
+        if self.referencing is None:
+            self.referencing = {}
+            for name, (_, (operator, value)) in self.variables.items():
+                if operator in (":=", "::=", ":::="):
+                    continue
+                for match in REFERENCE_PATTERN.finditer(value):
+                    reference = match.group(1) or match.group(4)
+                    if reference:
+                        self.referencing.setdefault(reference, set()).add(name)
+        affected = set(names)
+        pending = list(affected)
+        while pending:
+            for name in self.referencing.get(pending.pop(), ()):
+                if name not in affected:
+                    affected.add(name)
+                    pending.append(name)
+        return affected
+
+    def expand_target(
+        self,
+        name: str,
+        definitions: Dict[str, Definition],
+        expanded: Dict[str, str],
+        expanding: Set[str],
+    ) -> str:
+        if name not in expanded:
+            if name in expanding:
+                return ""
+            expanding.add(name)
+
+            def lookup(reference: str) -> str:
+                return self.expand_target(reference, definitions, expanded, expanding)
+
+            definition = definitions.get(name)
+            global_definition = self.variables.get(name, (None, None))[1]
+            if definition is None:
+                value = (
+                    self.evaluate(global_definition, lookup)
+                    if global_definition
+                    else ""
+                )
+            elif definition[0] == "+=":
+                base = (
+                    self.evaluate(global_definition, lookup)
+                    if global_definition
+                    else ""
+                )
+                appended = self.evaluate(("=", definition[1]), lookup)
+                value = f"{base} {appended}" if base else appended
+            else:
+                value = self.evaluate(definition, lookup)
+            expanding.discard(name)
+            expanded[name] = value
+        return expanded[name]
+
+    @staticmethod
+    def evaluate(definition: Definition, lookup: Callable[[str], str]) -> str:
+        operator, value = definition
+        if operator in (":=", "::=", ":::="):
+            # simple variables are printed expanded already, with '$' escaped
+            return value.replace("$$", "$")
+
+        def replace(match: re.Match) -> str:
+            if match.group(7):
+                return "$"
+            name = match.group(1) or match.group(4)
+            old_suffix = match.group(2) if match.group(1) else match.group(5)
+            new_suffix = match.group(3) if match.group(1) else match.group(6)
+            result = lookup(name)
+            if old_suffix is not None:
+                result = " ".join(
+                    (
+                        word[: -len(old_suffix)] + new_suffix
+                        if old_suffix and word.endswith(old_suffix)
+                        else word
+                    )
+                    for word in result.split()
+                )
+            return result
+
+        return REFERENCE_PATTERN.sub(replace, value)
+
+    def is_selected(self, name: str, origin: str) -> bool:
+        if not self.selection:
+            return True
+        return (
+            origin not in ("default", "environment", "automatic")
+            and name not in MAKE_FLAGS_VARIABLES
+            and any(matches_pattern(name, pattern) for pattern in self.selection)
+        )
+
+    def to_target_variables_file(
+        self, file: Path, global_values: Dict[str, str]
+    ) -> None:
+        tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(self.target_values(global_values), indent=2))
+        os.replace(tmp_file, file)
+
+    @staticmethod
+    def read_target_variables(file: Path) -> Dict[str, Dict[str, str]]:
+        return json.loads(file.read_text())
+
+
+def matches_pattern(name: str, pattern: str) -> bool:
+    """Match a name like make's $(filter) does, '%' matches any number of characters."""
+    prefix, percent, suffix = pattern.partition("%")
+    if not percent:
+        return name == pattern
+    return (
+        len(name) >= len(prefix) + len(suffix)
+        and name.startswith(prefix)
+        and name.endswith(suffix)
+    )
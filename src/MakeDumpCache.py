@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+from typing import Any, Dict, Iterable, List, Optional
+
+from LegacyBuildSystem import LegacyBuildSystem
+from MakeVariablesDump import MakeVariablesDump
+
+
+class MakeDumpCache:
+    """Cache for make variable dumps.
+
+    The lookup works in two steps. The collection setup (build directory,
+    batch commands, environment, ...) selects a manifest listing the makefiles
+    read by previous runs of make together with their content hashes. A stored
+    dump is reused if all of its makefiles are still unchanged. Dumps collected
+    from the make database keep their target specific variables next to them.
+
+    Makefiles may list files with $(wildcard ...), so the names of the files
+    in the directories of the makefiles and of the dumped sources are part of
+    the manifest as well. Adding or removing a file there invalidates the
+    dump. Wildcards on other directories and environment variables not part of
+    the setup are not detected.
+    """
+
+    max_entries = 10
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        build_dir: Path,
+        setup: Dict[str, Any],
+        sources_var: Optional[str] = None,
+    ):
+        self.build_dir = build_dir
+        self.sources_var = sources_var
+        self.setup_key = self.hash_str(json.dumps(setup, sort_keys=True))
+        self.entry_dir = cache_dir / "make_dumps" / self.setup_key
+
+    @property
+    def manifest_file(self) -> Path:
+        return self.entry_dir / "manifest.json"
+
+    def lookup(self) -> Optional[Path]:
+        """Return the cached dump matching the current makefiles."""
+        for entry in self.read_manifest():
+            if entry["makefiles"] == self.hash_makefiles(
+                entry["makefiles"].keys()
+            ) and entry.get("directories") == self.hash_directories(
+                entry.get("directories", {}).keys()
+            ):
+                dump_file = self.entry_dir / entry["dump"]
+                if dump_file.is_file():
+                    return dump_file
+        return None
+
+    def store(
+        self, make_dump_file: Path, target_variables_file: Optional[Path] = None
+    ) -> None:
+        inputs = self.dump_inputs(make_dump_file)
+        inputs_key = self.hash_str(json.dumps(inputs, sort_keys=True))
+        dump_file_name = f"{inputs_key}.txt"
+        self.entry_dir.mkdir(parents=True, exist_ok=True)
+        if target_variables_file:
+            self.copy_file(
+                target_variables_file,
+                self.target_variables_file(self.entry_dir / dump_file_name),
+            )
+        self.copy_file(make_dump_file, self.entry_dir / dump_file_name)
+
+        entries = [
+            entry for entry in self.read_manifest() if entry["dump"] != dump_file_name
+        ]
+        entries.insert(0, {"dump": dump_file_name, **inputs})
+        for obsolete_entry in entries[self.max_entries :]:
+            obsolete_dump_file = self.entry_dir / obsolete_entry["dump"]
+            obsolete_dump_file.unlink(missing_ok=True)
+            self.target_variables_file(obsolete_dump_file).unlink(missing_ok=True)
+        tmp_file = self.manifest_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(entries[: self.max_entries], indent=2))
+        os.replace(tmp_file, self.manifest_file)
+
+    @staticmethod
+    def target_variables_file(dump_file: Path) -> Path:
+        return dump_file.with_suffix(".targets.json")
+
+    @staticmethod
+    def copy_file(source: Path, target: Path) -> None:
+        tmp_file = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        shutil.copyfile(source, tmp_file)
+        os.replace(tmp_file, target)
+
+    def read_manifest(self) -> List[Dict[str, Any]]:
+        try:
+            return json.loads(self.manifest_file.read_text())
+        except (OSError, ValueError):
+            return []
+
+    def dump_inputs(self, make_dump_file: Path) -> Dict[str, Dict[str, Optional[str]]]:
+        """Hashes of the makefiles read by make and of the directories wildcards may have listed."""
+        make_variables_dump = MakeVariablesDump(make_dump_file)
+        makefiles = LegacyBuildSystem.extract_source_paths(
+            make_variables_dump.get("MAKEFILE_LIST")
+        )
+        sources = (
+            LegacyBuildSystem.extract_source_paths(
+                make_variables_dump.get(self.sources_var)
+            )
+            if self.sources_var
+            else []
+        )
+        return {
+            "makefiles": self.hash_makefiles(makefiles),
+            "directories": self.hash_directories(
+                sorted({os.path.dirname(path) for path in makefiles + sources})
+            ),
+        }
+
+    def hash_directories(self, directories: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Hash of the file names in each directory, None for directories not existing (anymore)."""
+        result = {}
+        for directory in directories:
+            try:
+                names = sorted(os.listdir(self.build_dir / directory))
+            except OSError:
+                result[directory] = None
+                continue
+            result[directory] = self.hash_str("\n".join(names))
+        return result
+
+    def hash_makefiles(self, makefiles: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Content hash of each makefile, None for makefiles not existing (anymore)."""
+        result = {}
+        for makefile in makefiles:
+            try:
+                with open(self.build_dir / makefile, "rb") as f:
+                    result[makefile] = hashlib.file_digest(f, "sha1").hexdigest()
+            except OSError:
+                result[makefile] = None
+        return result
+
+    @staticmethod
+    def hash_str(content: str) -> str:
+        return hashlib.sha1(content.encode()).hexdigest()
@@ -0,0 +1,157 @@
+import contextlib
+import io
+import locale
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from MakeVariablesIndex import MakeVariablesIndex
+
+
+class MakeVariablesDump:
+    """Lazy access to a make variables dump with one 'NAME = value' entry per line.
+
+    Variables are looked up by scanning the dump backwards until all requested
+    variables are found, only their values get decoded. Alternatively an index
+    of byte offsets can be built in one pass, afterwards only the values
+    actually asked for get decoded.
+    If a variable name occurs more than once, the last occurrence wins, like for
+    a dict built from the dump.
+
+    For dump files a persistent index can be used, see MakeVariablesIndex. It
+    stays open until the dump is closed, e.g. at the end of a 'with' block.
+    """
+
+    def __init__(
+        self, make_variables_dump: Union[str, Path], persistent_index: bool = False
+    ) -> None:
+        self.logger = logging.getLogger(self.__class__.__name__)
+        if isinstance(make_variables_dump, str):
+            self.file: Optional[Path] = None
+            self.content: Optional[bytes] = make_variables_dump.encode()
+            self.encoding = "utf-8"
+        else:
+            self.file = make_variables_dump
+            self.content = None
+            # same encoding as Path.read_text() uses
+            self.encoding = locale.getpreferredencoding(False)
+        self.values: Dict[str, Optional[str]] = {}
+        self.offsets: Optional[Dict[str, Tuple[int, int]]] = None
+        self.persistent_index = persistent_index and self.file is not None
+        self.index: Optional[MakeVariablesIndex] = None
+
+    def get(self, name: str) -> Optional[str]:
+        if name not in self.values:
+            index = self.load_index()
+            if index:
+                value = index.get(name)
+                self.values[name] = (
+                    None if value is None else value.decode(self.encoding)
+                )
+            elif self.offsets is None:
+                self.values.update(self.find([name]))
+            else:
+                self.values[name] = self.read_value(name)
+        return self.values[name]
+
+    def find(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Scan the dump from its end and decode the values of the given variables.
+
+        The last occurrence of a variable wins, so the scan stops as soon as
+        all of them are found.
+        """
+        result: Dict[str, Optional[str]] = dict.fromkeys(names)
+        pending = {name.encode(self.encoding): name for name in result}
+        with self.mapped() as data:
+            end = len(data)
+            while pending and end > 0:
+                start = data.rfind(b"\n", 0, end) + 1
+                separator = data.find(b"=", start, end)
+                if separator >= 0:
+                    name = pending.pop(data[start:separator].strip(), None)
+                    if name is not None:
+                        result[name] = (
+                            data[separator + 1 : end].strip().decode(self.encoding)
+                        )
+                end = start - 1
+        return result
+
+    def build_index(self) -> Dict[str, Tuple[int, int]]:
+        """Collect the byte range of each value without decoding it."""
+        if self.offsets is None:
+            offsets: Dict[str, Tuple[int, int]] = {}
+            offset = 0
+            with self.open() as f:
+                for line in f:
+                    separator = line.find(b"=")
+                    if separator >= 0:
+                        name = line[:separator].strip().decode(self.encoding)
+                        offsets[name] = (offset + separator + 1, offset + len(line))
+                    offset += len(line)
+            self.offsets = offsets
+        return self.offsets
+
+    def load_index(self) -> Optional[MakeVariablesIndex]:
+        if self.persistent_index and not self.index:
+            try:
+                self.index = MakeVariablesIndex.load(
+                    self.file, self.build_index, self.encoding
+                )
+            except OSError as error:
+                self.logger.warning(f"Not using an index for {self.file}: {error}")
+                self.persistent_index = False
+        return self.index
+
+    def read_value(self, name: str) -> Optional[str]:
+        offsets = self.build_index().get(name, None)
+        if offsets is None:
+            return None
+        start, end = offsets
+        with self.mapped() as data:
+            value = data[start:end]
+        return value.strip().decode(self.encoding)
+
+    def to_dict(self) -> Dict[str, str]:
+        result: Dict[str, str] = {}
+        with self.open() as f:
+            for name, value in self.iter_entries(f):
+                result[name] = value.strip().decode(self.encoding)
+        return result
+
+    def close(self) -> None:
+        if self.index:
+            self.index.close()
+            self.index = None
+
+    def __enter__(self) -> "MakeVariablesDump":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def open(self) -> BinaryIO:
+        if self.content is not None:
+            return io.BytesIO(self.content)
+        return open(self.file, "rb")
+
+    @contextlib.contextmanager
+    def mapped(self) -> Iterator[Union[bytes, mmap.mmap]]:
+        """The content of the dump, a file is memory mapped instead of being read."""
+        if self.content is not None:
+            yield self.content
+            return
+        with open(self.file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # an empty file cannot be mapped
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                yield mapped_file
+
+    def iter_entries(self, lines: Iterable[bytes]) -> Iterator[Tuple[str, bytes]]:
+        for line in lines:
+            if b"=" in line:
+                name, value = line.split(b"=", 1)
+                yield name.strip().decode(self.encoding), value
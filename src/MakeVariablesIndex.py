@@ -0,0 +1,200 @@
+import codecs
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+# byte ranges of the values in the dump, variable name as key
+ValueOffsets = Dict[str, Tuple[int, int]]
+
+
+class MakeVariablesIndex:
+    """Persistent index of a make variables dump for fast reloads.
+
+    The index file is stored next to the dump and consists of a header and an
+    open addressing hash table, filled up to three quarters. Each slot holds a
+    hash of the variable name and the offset of its value in the dump, the value
+    ends with the line. Names and values are not copied. Index and dump get memory mapped, so
+    looking up a variable is O(1) and does not need to parse the dump again.
+    The name in front of the value in the dump tells a hash collision apart.
+    The header stores size, modification time and hash of the dump, the index is
+    rebuilt as soon as the dump content changes. Names are encoded with the
+    encoding of the dump, which is stored in the header as well.
+
+    The index keeps both files mapped until it is closed, use it as a context
+    manager. On Windows, a mapped index can neither be rebuilt nor deleted and
+    the mapped dump cannot be rewritten.
+    """
+
+    magic = b"SPLMVIDX"
+    version = 3
+    # magic, version, slot count, dump size, dump modification time, dump digest, encoding
+    header = struct.Struct("<8sIIQQ32s16s")
+    # name hash, value offset in the dump
+    slot = struct.Struct("<IQ")
+    empty_slot_offset = 2**64 - 1
+
+    def __init__(
+        self, index_file: Path, dump_file: Path, rebuilt: bool, encoding: str
+    ) -> None:
+        self.index_file = index_file
+        self.rebuilt = rebuilt
+        self.encoding = encoding
+        with open(index_file, "rb") as f:
+            self.mapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.slot_count = self.header.unpack_from(self.mapped_file)[2]
+        with open(dump_file, "rb") as f:
+            # an empty dump cannot be mapped
+            self.mapped_dump: Union[mmap.mmap, bytes] = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if os.fstat(f.fileno()).st_size
+                else b""
+            )
+
+    @classmethod
+    def load(
+        cls,
+        dump_file: Path,
+        value_offsets: Callable[[], ValueOffsets],
+        encoding: str = "utf-8",
+    ) -> "MakeVariablesIndex":
+        """Open the index of the given dump, (re)build it from the value offsets if it is missing or outdated."""
+        index_file = cls.index_file_for(dump_file)
+        if cls.is_up_to_date(index_file, dump_file, encoding):
+            return cls(index_file, dump_file, rebuilt=False, encoding=encoding)
+        cls.build(dump_file, index_file, value_offsets(), encoding)
+        return cls(index_file, dump_file, rebuilt=True, encoding=encoding)
+
+    @staticmethod
+    def index_file_for(dump_file: Path) -> Path:
+        return dump_file.with_name(dump_file.name + ".idx")
+
+    @classmethod
+    def is_up_to_date(cls, index_file: Path, dump_file: Path, encoding: str) -> bool:
+        try:
+            with open(index_file, "r+b") as f:
+                header = f.read(cls.header.size)
+                (
+                    magic,
+                    version,
+                    slot_count,
+                    size,
+                    mtime_ns,
+                    digest,
+                    index_encoding,
+                ) = cls.header.unpack(header)
+                if (
+                    magic != cls.magic
+                    or version != cls.version
+                    or index_encoding.rstrip(b"\0") != cls.encoding_name(encoding)
+                ):
+                    return False
+                dump_stat = dump_file.stat()
+                if size == dump_stat.st_size and mtime_ns == dump_stat.st_mtime_ns:
+                    return True
+                if size != dump_stat.st_size or digest != cls.digest(dump_file):
+                    return False
+                # same content, only remember the new modification time
+                f.seek(0)
+                f.write(
+                    cls.header.pack(
+                        magic,
+                        version,
+                        slot_count,
+                        size,
+                        dump_stat.st_mtime_ns,
+                        digest,
+                        index_encoding,
+                    )
+                )
+                return True
+        except (OSError, struct.error):
+            return False
+
+    @classmethod
+    def build(
+        cls,
+        dump_file: Path,
+        index_file: Path,
+        offsets: ValueOffsets,
+        encoding: str = "utf-8",
+    ) -> None:
+        dump_stat = dump_file.stat()
+        # filled up to three quarters, empty slots end the search for unknown names
+        slot_count = len(offsets) * 4 // 3 + 1
+        slots = [(0, cls.empty_slot_offset)] * slot_count
+        for name, (start, _) in offsets.items():
+            name_hash = cls.hash(name.encode(encoding))
+            position = name_hash % slot_count
+            while slots[position][1] != cls.empty_slot_offset:
+                position = (position + 1) % slot_count
+            slots[position] = (name_hash & 0xFFFFFFFF, start)
+        tmp_file = index_file.with_name(f"{index_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as f:
+            f.write(
+                cls.header.pack(
+                    cls.magic,
+                    cls.version,
+                    slot_count,
+                    dump_stat.st_size,
+                    dump_stat.st_mtime_ns,
+                    cls.digest(dump_file),
+                    cls.encoding_name(encoding),
+                )
+            )
+            f.write(b"".join(cls.slot.pack(*slot) for slot in slots))
+        os.replace(tmp_file, index_file)
+
+    def get(self, name: str) -> Optional[bytes]:
+        """Stripped raw value of a variable, None if it does not exist."""
+        name_bytes = name.encode(self.encoding)
+        name_hash = self.hash(name_bytes)
+        position = name_hash % self.slot_count
+        while True:
+            slot_hash, value_offset = self.slot.unpack_from(
+                self.mapped_file, self.header.size + position * self.slot.size
+            )
+            if value_offset == self.empty_slot_offset:
+                return None
+            if (
+                slot_hash == name_hash & 0xFFFFFFFF
+                and self.name_at(value_offset) == name_bytes
+            ):
+                value_end = self.mapped_dump.find(b"\n", value_offset)
+                if value_end < 0:
+                    value_end = len(self.mapped_dump)
+                return self.mapped_dump[value_offset:value_end].strip()
+            position = (position + 1) % self.slot_count
+
+    def name_at(self, value_offset: int) -> bytes:
+        """Name of the variable in the dump line containing the value."""
+        line_start = self.mapped_dump.rfind(b"\n", 0, value_offset) + 1
+        separator = self.mapped_dump.find(b"=", line_start, value_offset)
+        return self.mapped_dump[line_start:separator].strip()
+
+    def close(self) -> None:
+        self.mapped_file.close()
+        if isinstance(self.mapped_dump, mmap.mmap):
+            self.mapped_dump.close()
+
+    def __enter__(self) -> "MakeVariablesIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @staticmethod
+    def encoding_name(encoding: str) -> bytes:
+        # as stored in the header, e.g. 'cp1252' for 'windows-1252'
+        return codecs.lookup(encoding).name.encode()[:16]
+
+    @staticmethod
+    def hash(name: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(name, digest_size=8).digest(), "little")
+
+    @staticmethod
+    def digest(file: Path) -> bytes:
+        with open(file, "rb") as f:
+            return hashlib.file_digest(f, "sha256").digest()
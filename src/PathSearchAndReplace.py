@@ -1,21 +1,71 @@
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 from SubdirReplacement import SubdirReplacement
 
+# index of the matching replacement and the position of the matching part (None for the root)
+Match = Tuple[Optional[int], Optional[int]]
+
 
 class PathSearchAndReplace:
+    """Replaces the first path part matching one of the replacements.
+
+    The replacements are applied in the given order, the first one matching wins.
+    A replacement for '/' matches every path and prepends its replacement.
+    The replacements are indexed by path part, so the cost of a lookup only
+    depends on the length of the path and not on the number of replacements.
+    """
+
     def __init__(self, replacements: List[SubdirReplacement]):
         self.replacements = replacements
+        self.root_replacement: Optional[int] = None
+        self.part_replacements: Dict[str, int] = {}
+        for index, replacement in enumerate(replacements):
+            if replacement.subdir_rel == "/":
+                # replacements after the root replacement can never match
+                self.root_replacement = index
+                break
+            self.part_replacements.setdefault(replacement.subdir_rel, index)
 
     def replace_path(self, path: Path) -> Path:
-        for replacement in self.replacements:
-            if replacement.subdir_rel == "/":
-                return Path(replacement.replacement).joinpath(path)
-            if replacement.subdir_rel in path.parts:
-                path_parts = list(path.parts)
-                for i, part in enumerate(path_parts):
-                    if part == replacement.subdir_rel:
-                        path_parts[i] = replacement.replacement
-                        break  # stop after the first replacement
-                return Path(*path_parts)
-        return path
+        return self.apply(path, self.match(path.parts))
+
+    def replace_many(self, paths: Iterable[Path]) -> List[Path]:
+        """Replace all paths, matching the parts of each parent directory only once."""
+        parent_matches: Dict[Path, Match] = {}
+        result = []
+        for path in paths:
+            parent_match = parent_matches.get(path.parent)
+            if parent_match is None:
+                parent_match = parent_matches[path.parent] = self.match(
+                    path.parent.parts
+                )
+            result.append(self.apply(path, self.match_name(path, parent_match)))
+        return result
+
+    def match(self, parts: Tuple[str, ...]) -> Match:
+        best_match: Match = (self.root_replacement, None)
+        for position, part in enumerate(parts):
+            best_match = self.better_match(best_match, part, position)
+        return best_match
+
+    def match_name(self, path: Path, parent_match: Match) -> Match:
+        if path.name and path.parent != path:
+            return self.better_match(parent_match, path.name, len(path.parts) - 1)
+        return parent_match
+
+    def better_match(self, best_match: Match, part: str, position: int) -> Match:
+        index = self.part_replacements.get(part)
+        if index is not None and (best_match[0] is None or index < best_match[0]):
+            return (index, position)
+        return best_match
+
+    def apply(self, path: Path, match: Match) -> Path:
+        index, position = match
+        if index is None:
+            return path
+        replacement = self.replacements[index].replacement
+        if position is None:
+            return Path(replacement).joinpath(path)
+        path_parts = list(path.parts)
+        path_parts[position] = replacement
+        return Path(*path_parts)
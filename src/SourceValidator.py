@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import time
+from typing import Dict, Iterable, List, Optional
+
+ISSUE_KINDS = ["missing", "duplicate", "outside_source_tree", "unknown_extension"]
+
+
+@dataclass
+class SourceValidationReport:
+    sources: int = 0
+    include_paths: int = 0
+    # issue kind as key, each issue consists of the path and its type (source or include)
+    issues: Dict[str, List[Dict[str, str]]] = field(
+        default_factory=lambda: {kind: [] for kind in ISSUE_KINDS}
+    )
+    duration: float = 0.0
+
+    def add_issue(self, kind: str, path: str, path_type: str) -> None:
+        self.issues[kind].append({"path": Path(path).as_posix(), "type": path_type})
+
+    def count(self, kind: str) -> int:
+        return len(self.issues[kind])
+
+    def has_issues(self, kinds: Iterable[str]) -> bool:
+        return any(self.issues[kind] for kind in kinds)
+
+    def to_file(self, file: Path) -> None:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(
+            json.dumps(
+                {
+                    "sources": self.sources,
+                    "include_paths": self.include_paths,
+                    "issues": self.issues,
+                },
+                indent=2,
+            )
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"Validated {self.sources} sources and {self.include_paths} include paths "
+            f"in {self.duration:.2f}s: "
+            + ", ".join(
+                f"{self.count(kind)} {kind.replace('_', ' ')}" for kind in ISSUE_KINDS
+            )
+        )
+
+
+class SourceValidator:
+    """Checks the sources and include paths collected from the legacy build system.
+
+    Paths are expected to be absolute and normalized. Each one is checked for
+    existence, duplicates, being outside the source tree and, for sources only,
+    an unknown extension. Instead of accessing every path on its own, the
+    directories containing them are listed once, concurrently on a thread pool.
+    """
+
+    def __init__(
+        self,
+        sources_dir: Path,
+        source_extensions: List[str],
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self.sources_dir = os.path.normcase(os.path.normpath(sources_dir))
+        self.source_extensions = {extension.lower() for extension in source_extensions}
+        self.max_workers = max_workers
+
+    def validate(
+        self, sources: List[str], include_paths: List[str]
+    ) -> SourceValidationReport:
+        start = time.perf_counter()
+        report = SourceValidationReport(len(sources), len(include_paths))
+        listings = self.list_dirs(
+            {os.path.dirname(path) for path in sources + include_paths}
+        )
+        for paths, path_type in ((sources, "source"), (include_paths, "include")):
+            seen = set()
+            for path in paths:
+                normalized_path = os.path.normcase(path)
+                if normalized_path in seen:
+                    report.add_issue("duplicate", path, path_type)
+                    continue
+                seen.add(normalized_path)
+                name = os.path.basename(normalized_path)
+                is_dir = listings[os.path.dirname(path)].get(name)
+                if is_dir is None or is_dir != (path_type == "include"):
+                    report.add_issue("missing", path, path_type)
+                if not self.is_inside_sources_dir(normalized_path):
+                    report.add_issue("outside_source_tree", path, path_type)
+                if (
+                    path_type == "source"
+                    and self.source_extensions
+                    and os.path.splitext(name)[1].lower() not in self.source_extensions
+                ):
+                    report.add_issue("unknown_extension", path, path_type)
+        report.duration = time.perf_counter() - start
+        return report
+
+    def is_inside_sources_dir(self, normalized_path: str) -> bool:
+        return normalized_path == self.sources_dir or normalized_path.startswith(
+            self.sources_dir.rstrip(os.sep) + os.sep
+        )
+
+    def list_dirs(self, directories: Iterable[str]) -> Dict[str, Dict[str, bool]]:
+        directories = list(directories)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(directories, executor.map(self.list_dir, directories)))
+
+    @staticmethod
+    def list_dir(directory: str) -> Dict[str, bool]:
+        """Entry names (normalized in case) of a directory and whether they are directories."""
+        try:
+            with os.scandir(directory) as entries:
+                return {
+                    os.path.normcase(entry.name): entry.is_dir() for entry in entries
+                }
+        except OSError:
+            return {}
@@ -0,0 +1,211 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import contextlib
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class Stage:
+    name: str
+    function: Callable[[], None]
+    # stages which have to be finished before this one starts
+    dependencies: List[str] = field(default_factory=list)
+    # everything the result of the stage depends on (config fields, file digests, ...),
+    # evaluated after the dependencies finished. Stages without inputs always run.
+    inputs: Optional[Callable[[], Any]] = None
+    # files or directories created by the stage, the stage runs if a file changed or one is missing
+    outputs: List[Path] = field(default_factory=list)
+
+
+class StageGraph:
+    """Runs stages in the order of their dependencies and skips up-to-date ones.
+
+    The digests of the inputs and of the output files of all successfully
+    executed stages are stored in a stamp file, evaluated after the stage ran,
+    together with the version of the tool running them. A stage is up-to-date
+    if the version and the digests of its current inputs and outputs match its
+    stamp, so a new version, a deleted or a modified output runs it again.
+    Output directories only need to exist. Independent stages run concurrently
+    on a thread pool.
+
+    If a stage fails or the run is interrupted, no further stages are started
+    and the cancel event is set. Long running stages check it and stop by
+    raising a CancelledError. The first error is raised after all running
+    stages finished.
+
+    Resources shared by the stages, e.g. an opened make variables dump, are
+    entered into the exit stack of the graph and closed at the end of the run.
+    """
+
+    def __init__(
+        self, stamp_file: Path, max_workers: Optional[int] = None, version: str = ""
+    ) -> None:
+        self.stamp_file = stamp_file
+        self.max_workers = max_workers
+        self.version = version
+        self.stages: Dict[str, Stage] = {}
+        self.cancel_event = threading.Event()
+        self.resources = contextlib.ExitStack()
+
+    def add(self, stage: Stage) -> None:
+        self.stages[stage.name] = stage
+
+    def run(self, force: bool = False) -> Tuple[List[str], List[str]]:
+        """Run all dirty stages, return the names of the executed and the skipped stages."""
+        for stage in self.stages.values():
+            unknown_dependencies = set(stage.dependencies) - set(self.stages)
+            if unknown_dependencies:
+                raise ValueError(
+                    f"Stage {stage.name} depends on unknown stages {', '.join(sorted(unknown_dependencies))}."
+                )
+        stamps = {} if force else self.load_stamps()
+        new_stamps = dict(stamps)
+        pending = dict(self.stages)
+        finished: List[str] = []
+        executed: List[str] = []
+        skipped: List[str] = []
+        error: Optional[BaseException] = None
+        self.cancel_event.clear()
+        with self.resources, ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            running: Dict[Future, str] = {}
+            while True:
+                if error is None:
+                    for name in self.ready_stages(pending, finished):
+                        future = executor.submit(
+                            self.run_stage, pending.pop(name), stamps
+                        )
+                        running[future] = name
+                if not running:
+                    break
+                try:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                except BaseException as interrupt:
+                    # e.g. Ctrl+C, stop the running stages instead of waiting for them
+                    self.cancel_event.set()
+                    error = error or interrupt
+                    done, _ = wait(running)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        stamp, ran = future.result()
+                    except BaseException as stage_error:
+                        self.cancel_event.set()
+                        new_stamps.pop(name, None)
+                        error = error or stage_error
+                        continue
+                    if stamp is None:
+                        new_stamps.pop(name, None)
+                    else:
+                        new_stamps[name] = stamp
+                    finished.append(name)
+                    (executed if ran else skipped).append(name)
+        self.save_stamps(new_stamps)
+        if error:
+            raise error
+        if pending:
+            raise ValueError(
+                f"Cyclic dependencies between the stages {', '.join(sorted(pending))}."
+            )
+        order = list(self.stages)
+        return sorted(executed, key=order.index), sorted(skipped, key=order.index)
+
+    @staticmethod
+    def ready_stages(pending: Dict[str, Stage], finished: List[str]) -> List[str]:
+        return [
+            name
+            for name, stage in pending.items()
+            if all(dependency in finished for dependency in stage.dependencies)
+        ]
+
+    def run_stage(
+        self, stage: Stage, stamps: Dict[str, Dict]
+    ) -> Tuple[Optional[Dict], bool]:
+        if not stage.inputs:
+            stage.function()
+            return None, True
+        stamp = self.stamp(stage)
+        if stamps.get(stage.name) == stamp:
+            return stamp, False
+        stage.function()
+        # the stage may have changed its inputs, e.g. the makefiles listed in the dump
+        return self.stamp(stage), True
+
+    def stamp(self, stage: Stage) -> Dict:
+        return {
+            "version": self.version,
+            "inputs": self.digest(stage.inputs()),
+            "outputs": {str(output): output_digest(output) for output in stage.outputs},
+        }
+
+    @staticmethod
+    def digest(inputs: Any) -> str:
+        return hashlib.sha1(
+            json.dumps(inputs, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def load_stamps(self) -> Dict[str, Dict]:
+        try:
+            return json.loads(self.stamp_file.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def save_stamps(self, stamps: Dict[str, Dict]) -> None:
+        self.stamp_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.stamp_file.with_name(
+            f"{self.stamp_file.name}.{os.getpid()}.tmp"
+        )
+        tmp_file.write_text(json.dumps(stamps, indent=2, sort_keys=True))
+        os.replace(tmp_file, self.stamp_file)
+
+
+def file_digest(file: Path) -> Optional[str]:
+    """Content digest of a file, None if it does not exist."""
+    try:
+        with open(file, "rb") as f:
+            return hashlib.file_digest(f, "sha1").hexdigest()
+    except OSError:
+        return None
+
+
+def output_digest(output: Path) -> Optional[str]:
+    """Content digest of an output file, a marker for an existing directory, None if missing."""
+    if output.is_dir():
+        return "directory"
+    return file_digest(output)
+
+
+def files_digest(files: Iterable[Path]) -> str:
+    """Digest of the content of the given files, e.g. of the sources of a tool as its version."""
+    digest = hashlib.sha1()
+    for file in files:
+        digest.update(f"{Path(file).name}|{file_digest(file)}\n".encode())
+    return digest.hexdigest()
+
+
+def tree_digest(directory: Path) -> str:
+    """Digest of the paths, sizes and modification times of all files below a directory."""
+    digest = hashlib.sha1()
+    pending_dirs = [Path(directory)]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as scanned_entries:
+                entries = sorted(scanned_entries, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                pending_dirs.append(Path(entry.path))
+            else:
+                entry_stat = entry.stat()
+                digest.update(
+                    f"{entry.path}|{entry_stat.st_size}|{entry_stat.st_mtime_ns}\n".encode()
+                )
+    return digest.hexdigest()
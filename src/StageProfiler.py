@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+@dataclass
+class StageProfile:
+    name: str
+    # time.perf_counter() at the begin of the stage, comparable between processes
+    start: float = 0.0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    # growth of the peak resident set size, None if it can not be determined
+    peak_rss_delta: Optional[int] = None
+    # peak of the memory allocated by Python during the stage, None if not traced
+    peak_memory: Optional[int] = None
+    counts: Dict[str, int] = field(default_factory=dict)
+    pid: int = field(default_factory=os.getpid)
+
+    def __str__(self) -> str:
+        details = [f"{self.wall_time:.2f}s wall", f"{self.cpu_time:.2f}s CPU"]
+        if self.peak_rss_delta is not None:
+            details.append(f"peak RSS +{self.peak_rss_delta / 1e6:.1f} MB")
+        if self.peak_memory is not None:
+            details.append(f"peak memory {self.peak_memory / 1e6:.1f} MB")
+        details.extend(f"{name} {value}" for name, value in self.counts.items())
+        return f"{self.name}: " + ", ".join(details)
+
+
+class StageProfiler:
+    """Measures wall time, CPU time and memory of the transformation stages.
+
+    Stages must not be nested within a thread. Besides the measurements, the
+    code running inside a stage can record counts (e.g. the number of copied
+    files) for it. Tracing the Python memory allocations slows down the stages
+    noticeably, therefore it is only done if `trace_memory` is set. Stages may
+    run concurrently in several threads, the CPU time and memory measurements
+    then include the other threads of the process.
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.stages: List[StageProfile] = []
+        # each thread runs its own stage
+        self.local = threading.local()
+
+    @property
+    def current_stage(self) -> Optional[StageProfile]:
+        return getattr(self.local, "stage", None)
+
+    def __getstate__(self) -> Dict:
+        # profilers are returned from the worker processes of the batch mode
+        state = dict(self.__dict__)
+        del state["local"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageProfile]:
+        profile = StageProfile(name)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start_rss = self.peak_rss()
+        start_cpu_time = time.process_time()
+        profile.start = time.perf_counter()
+        self.local.stage = profile
+        try:
+            yield profile
+        finally:
+            self.local.stage = None
+            profile.wall_time = time.perf_counter() - profile.start
+            profile.cpu_time = time.process_time() - start_cpu_time
+            end_rss = self.peak_rss()
+            if start_rss is not None and end_rss is not None:
+                profile.peak_rss_delta = end_rss - start_rss
+            if self.trace_memory:
+                profile.peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+            self.stages.append(profile)
+
+    def count(self, name: str, value: int) -> None:
+        """Add to a count of the running stage, ignored outside of a stage."""
+        if self.current_stage:
+            counts = self.current_stage.counts
+            counts[name] = counts.get(name, 0) + value
+
+    @staticmethod
+    def peak_rss() -> Optional[int]:
+        """Peak resident set size of the process in bytes."""
+        if resource is None:
+            return None
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def write_profile(profiles: Dict[str, List[StageProfile]], file: Path) -> None:
+    """Write the stage profiles of each variant as JSON."""
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_text(
+        json.dumps(
+            {
+                variant: [asdict(stage) for stage in stages]
+                for variant, stages in profiles.items()
+            },
+            indent=2,
+        )
+    )
+
+
+def write_chrome_trace(profiles: Dict[str, List[StageProfile]], file: Path) -> None:
+    """Write the stage profiles in the Chrome trace event format (chrome://tracing, Perfetto)."""
+    all_stages = [stage for stages in profiles.values() for stage in stages]
+    start = min((stage.start for stage in all_stages), default=0.0)
+    events = []
+    for variant, stages in profiles.items():
+        for stage in stages:
+            events.append(
+                {
+                    "name": stage.name,
+                    "cat": variant,
+                    "ph": "X",
+                    "ts": round((stage.start - start) * 1e6),
+                    "dur": round(stage.wall_time * 1e6),
+                    "pid": stage.pid,
+                    "tid": stage.pid,
+                    "args": {
+                        "cpu_time": stage.cpu_time,
+                        "peak_rss_delta": stage.peak_rss_delta,
+                        "peak_memory": stage.peak_memory,
+                        **stage.counts,
+                    },
+                }
+            )
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_text(json.dumps({"traceEvents": events}, indent=2))
@@ -1,7 +1,7 @@
+import dataclasses
 from dataclasses import dataclass, field
 import json
 from typing import Any, Dict, List, Optional
-import dacite
 from pathlib import Path
 from SubdirReplacement import SubdirReplacement
 from Variant import Variant
@@ -13,6 +13,15 @@ class DirMirrorData:
     target: Path
     patterns: List[str] = field(default_factory=list)
     mirror: bool = True
+    # compare file contents in case only the modification time changed
+    hash_contents: bool = False
+
+
+@dataclass
+class ComponentRule:
+    # the legacy sources below this directory, relative to the source directory, form the component
+    subdir_rel: str
+    name: str
 
 
 @dataclass
@@ -23,9 +32,24 @@ class TransformerConfig:
     source_dir_rel: str = "Impl/Src"
     build_dir_rel: str = "Impl/Bld"
     third_party_libs_dir_rel: str = "ThirdParty"
+    third_party_lib_extensions: List[str] = field(
+        default_factory=lambda: [".a", ".lib"]
+    )
+    # name patterns of directories not searched for third party libraries
+    third_party_exclude_dirs: List[str] = field(default_factory=list)
     includes_var: str = "CPPFLAGS_INC_LIST"
     sources_var: str = "VC_SRC_LIST"
     subdir_replacements: List[SubdirReplacement] = field(default_factory=list)
+    # split the legacy sources into one component per directory up to this depth, one component if 0
+    legacy_component_depth: int = 0
+    # components for the sources below some directories, the first matching rule wins over the depth
+    legacy_component_rules: List[ComponentRule] = field(default_factory=list)
+    # variables with the flags of the C and C++ compiler (e.g. 'CCFLAGS'), extracted into compile definitions and options
+    compile_flags_vars: List[str] = field(default_factory=list)
+    # variables with the flags of the assembler (e.g. 'ASMFLAGS')
+    asm_flags_vars: List[str] = field(default_factory=list)
+    # variables with the flags of the linker (e.g. 'LDFLAGS')
+    link_flags_vars: List[str] = field(default_factory=list)
     variant_compiler_flags: str = "TODO: to be replaced with compiler flags"
     variant_linker_file: str = "TODO: to be replaced with the .lsl file path"
     variant_link_flags: str = "TODO: to be replaced with linker flags"
@@ -34,6 +58,90 @@ class TransformerConfig:
     )
     mirror_directories: List[DirMirrorData] = field(default_factory=list)
     batch_commands: List[str] = field(default_factory=list)
+    # names or make patterns (e.g. '%FLAGS') of the variables to be dumped, all variables are dumped if empty
+    make_dump_variables: List[str] = field(default_factory=list)
+    # additionally collect the target and pattern specific variables from make's database
+    # ('make -p -n' running collect.mak), requires GNU make 3.82 or newer
+    make_dump_database: bool = False
+    # reuse make variable dumps as long as the makefiles read by make and the files in their
+    # directories and in the directories of the sources do not change. Wildcards on other
+    # directories are not detected, environment variables only if listed in `make_dump_cache_env_vars`.
+    make_dump_cache: bool = True
+    # directory for all caches (make dumps, third party libraries), '<output_dir>/.cache' if not set
+    make_dump_cache_dir: Optional[Path] = None
+    # environment variables which influence the legacy make evaluation
+    make_dump_cache_env_vars: List[str] = field(default_factory=list)
+    # additional variants transformed together with `variant` in one batch run. Make gets the
+    # variant in the environment variables VARIANT, FLAVOR and SUBSYSTEM.
+    variants: List[Variant] = field(default_factory=list)
+    # config fields differing for some variants, e.g. {"FLV1/SUB": {"batch_commands": ["set X=1"]}}
+    variant_overrides: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # extensions of the sources accepted by the source validation, no check if empty
+    source_extensions: List[str] = field(
+        default_factory=lambda: [".c", ".cc", ".cpp", ".cxx", ".s", ".asm"]
+    )
+    # source validation issues (e.g. 'missing') aborting the transformation
+    fail_on_source_issues: List[str] = field(default_factory=list)
+    # report the include paths used by the '#include' lines of the sources
+    analyze_includes: bool = False
+    # only add the include paths used by the sources to the variant
+    minimize_include_paths: bool = False
+    # trace the Python memory allocations of each stage (slow)
+    profile_memory: bool = False
+
+    @property
+    def all_variants(self) -> List[Variant]:
+        return [self.variant] + [
+            variant for variant in self.variants if variant != self.variant
+        ]
+
+    @property
+    def splits_legacy_components(self) -> bool:
+        return self.legacy_component_depth > 0 or bool(self.legacy_component_rules)
+
+    @property
+    def flags_vars(self) -> List[str]:
+        return self.compile_flags_vars + self.asm_flags_vars + self.link_flags_vars
+
+    @property
+    def make_dump_selection(self) -> List[str]:
+        """Variables to be dumped by make including the ones required by the transformer."""
+        if not self.make_dump_variables:
+            return []
+        required_variables = [
+            "MAKEFILE_LIST",
+            self.includes_var,
+            self.sources_var,
+            *self.flags_vars,
+        ]
+        return list(dict.fromkeys(required_variables + self.make_dump_variables))
+
+    def for_variant(self, variant: Variant) -> "TransformerConfig":
+        """Config of a single variant, with the overrides of the variant applied."""
+        config = dataclasses.replace(
+            self, variant=variant, variants=[], variant_overrides={}
+        )
+        overrides = self.variant_overrides.get(str(variant))
+        if not overrides:
+            return config
+        field_names = {field.name for field in dataclasses.fields(self)}
+        unknown_fields = set(overrides) - field_names
+        if unknown_fields:
+            raise ValueError(
+                f"Unknown config fields {', '.join(sorted(unknown_fields))} in the overrides of variant {variant}."
+            )
+        # convert the JSON values like the ones of a config file
+        overridden = self.from_dict(
+            {
+                "input_dir": str(self.input_dir),
+                "output_dir": str(self.output_dir),
+                "variant": str(variant),
+                **overrides,
+            }
+        )
+        return dataclasses.replace(
+            config, **{name: getattr(overridden, name) for name in overrides}
+        )
 
     @classmethod
     def from_json_file(cls, file: Path):
@@ -41,6 +149,23 @@ class TransformerConfig:
 
     @classmethod
     def from_dict(cls, dictionary: Any):
+        """Create the config from its JSON data.
+
+        Configs with simple values only (strings, flags, paths and variants) are
+        created directly, dacite and its type reflection are only needed for the others.
+        """
+        field_types = {field.name: field.type for field in dataclasses.fields(cls)}
+        try:
+            return cls(
+                **{
+                    name: convert_simple_value(field_types[name], value)
+                    for name, value in dictionary.items()
+                }
+            )
+        except (KeyError, TypeError):
+            pass
+        import dacite
+
         return dacite.from_dict(
             data_class=cls,
             data=dictionary,
@@ -59,3 +184,16 @@ class TransformerConfig:
         with open(config_json_file, "r") as f:
             data = json.load(f)
         return data
+
+
+def convert_simple_value(value_type: Any, value: Any) -> Any:
+    """Convert a JSON value to a simple type, raise a TypeError for all other types."""
+    if value_type in (str, bool, int) and isinstance(value, value_type):
+        return value
+    if value_type in (Path, Optional[Path]) and isinstance(value, (str, type(None))):
+        return Path(value) if value else None
+    if value_type is Variant and isinstance(value, str):
+        return Variant.from_str(value) if value else None
+    if value_type in (List[str], List[Variant]) and isinstance(value, list):
+        return [convert_simple_value(value_type.__args__[0], item) for item in value]
+    raise TypeError(f"{value_type} is not a simple type.")
@@ -0,0 +1,189 @@
+import logging
+import os
+from pathlib import Path
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from transformer import Transformer
+from TransformerConfig import TransformerConfig
+
+# modification time and size of each watched file, None for missing files
+Snapshot = Dict[str, Optional[Tuple[int, int]]]
+
+CONFIG = "config"
+MAKEFILES = "makefiles"
+MIRRORED_DIRS = "mirrored directories"
+
+
+class TransformerWatcher:
+    """Keeps transforming a variant whenever its inputs change.
+
+    The config file, the makefiles and the mirrored directories are polled for
+    changes. Each change runs the stage graph of the transformer again, its
+    stage stamps decide which stages are affected, e.g. only the CMake files
+    are regenerated if just the subdir replacements changed. Changed makefiles
+    mark the make variables dump dirty, the mirror manifests decide what to copy.
+    """
+
+    makefile_names = {"makefile", "Makefile", "GNUmakefile"}
+    makefile_extensions = {".mak", ".mk"}
+
+    def __init__(
+        self,
+        config: TransformerConfig,
+        config_file: Optional[Path] = None,
+        make_dump_file: Optional[str] = None,
+        poll_interval: float = 1.0,
+        force: bool = False,
+    ) -> None:
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.config = config
+        self.config_file = config_file
+        self.make_dump_file = make_dump_file
+        self.poll_interval = poll_interval
+        self.force = force
+        # e.g. set by '--profile' on the command line, kept for reloaded configs
+        self.profile_memory = config.profile_memory
+        self.transformer = Transformer(config, make_dump_file)
+        # makefiles read by make according to the current dump
+        self.read_makefiles: List[str] = []
+        self.snapshots: Dict[str, Snapshot] = {}
+
+    def run(self, cycles: Optional[int] = None) -> None:
+        """Transform once and then keep watching, forever if no number of cycles is given."""
+        self.transform()
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            time.sleep(self.poll_interval)
+            self.check()
+            cycle += 1
+
+    def transform(self) -> List[str]:
+        """Run all stages being outdated, all of them if forced."""
+        self.snapshots = self.take_snapshots()
+        return self.run_stages(self.force)
+
+    def check(self) -> List[str]:
+        """Run the stages affected by the changes since the last check."""
+        changes = self.poll()
+        if not changes:
+            return []
+        print(f"Detected changes of the {', '.join(sorted(changes))}.")
+        try:
+            return self.update(changes)
+        except Exception as error:
+            # keep watching, the next change might fix the problem
+            self.logger.error(f"Transformation failed: {error}")
+            return []
+
+    def poll(self) -> Set[str]:
+        snapshots = self.take_snapshots()
+        changes = {
+            name
+            for name, snapshot in snapshots.items()
+            if snapshot != self.snapshots.get(name)
+        }
+        self.snapshots = snapshots
+        return changes
+
+    def update(self, changes: Set[str]) -> List[str]:
+        if CONFIG in changes:
+            config = TransformerConfig.from_json_file(self.config_file)
+            config = config.for_variant(config.variant)
+            config.profile_memory = config.profile_memory or self.profile_memory
+            self.config = config
+            # the stage inputs tell which stages the changed fields affect
+            tree_mirrors = self.transformer.tree_mirrors
+            self.transformer = Transformer(config, self.make_dump_file)
+            self.transformer.tree_mirrors = tree_mirrors
+            # the watched makefiles and directories depend on the config
+            self.snapshots = self.take_snapshots()
+        transformer = self.transformer
+        if (
+            MAKEFILES in changes
+            and transformer.reuse_make_dump_file
+            and not self.make_dump_file
+        ):
+            # without the dump cache an existing dump is reused, a missing
+            # output marks the make variables dump stage dirty
+            transformer.make_dump_file.unlink(missing_ok=True)
+        return self.run_stages()
+
+    def run_stages(self, force: bool = False) -> List[str]:
+        transformer = self.transformer
+        transformer.execution_summary.clear()
+        transformer.profiler.stages.clear()
+        try:
+            transformer.run(force)
+        finally:
+            self.read_makefiles = self.makefiles_read_by_make()
+            self.snapshots[MAKEFILES] = self.makefiles_snapshot()
+        return [stage.name for stage in transformer.profiler.stages]
+
+    def makefiles_read_by_make(self) -> List[str]:
+        transformer = self.transformer
+        if not transformer.make_dump_file.is_file():
+            return []
+        with transformer.create_legacy_build_system() as legacy_build_system:
+            return [
+                os.path.normpath(transformer.build_dir / makefile)
+                for makefile in legacy_build_system.extract_source_paths(
+                    legacy_build_system.get_variable("MAKEFILE_LIST")
+                )
+            ]
+
+    def take_snapshots(self) -> Dict[str, Snapshot]:
+        snapshots = {
+            MAKEFILES: self.makefiles_snapshot(),
+            MIRRORED_DIRS: self.mirrored_dirs_snapshot(),
+        }
+        if self.config_file:
+            snapshots[CONFIG] = self.files_snapshot([self.config_file])
+        return snapshots
+
+    def makefiles_snapshot(self) -> Snapshot:
+        """Makefiles below the build directory and all makefiles read by make."""
+        build_dir = self.transformer.build_dir
+        makefiles = list(
+            self.walk(
+                build_dir,
+                lambda name: name in self.makefile_names
+                or os.path.splitext(name)[1] in self.makefile_extensions,
+            )
+        )
+        return self.files_snapshot(makefiles + self.read_makefiles)
+
+    def mirrored_dirs_snapshot(self) -> Snapshot:
+        files = []
+        for dir_mirror_data in self.config.mirror_directories:
+            files.extend(
+                self.walk(
+                    self.config.input_dir / dir_mirror_data.source, lambda _: True
+                )
+            )
+        return self.files_snapshot(files)
+
+    @staticmethod
+    def files_snapshot(files: Iterable) -> Snapshot:
+        snapshot: Snapshot = {}
+        for file in files:
+            try:
+                file_stat = os.stat(file)
+                snapshot[str(file)] = (file_stat.st_mtime_ns, file_stat.st_size)
+            except OSError:
+                snapshot[str(file)] = None
+        return snapshot
+
+    @staticmethod
+    def walk(directory: Path, matches: Callable[[str], bool]) -> Iterable[str]:
+        pending_dirs = [str(directory)]
+        while pending_dirs:
+            try:
+                with os.scandir(pending_dirs.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending_dirs.append(entry.path)
+                        elif matches(entry.name):
+                            yield entry.path
+            except OSError:
+                pass
@@ -0,0 +1,394 @@
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from dataclasses import dataclass
+import fnmatch
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import stat
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from TransformerConfig import DirMirrorData
+
+
+class FileState(NamedTuple):
+    size: int
+    mtime_ns: int
+    digest: Optional[str] = None
+
+
+class FileCopy(NamedTuple):
+    rel_path: str
+    source: Path
+    target: Path
+    source_state: FileState
+
+
+@dataclass
+class MirrorStatistics:
+    copied_files: int = 0
+    copied_bytes: int = 0
+    skipped_files: int = 0
+    deleted_files: int = 0
+    duration: float = 0.0
+    incremental: bool = False
+
+    @property
+    def files_per_second(self) -> float:
+        return self.copied_files / self.duration if self.duration else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.copied_bytes / self.duration if self.duration else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.copied_files} files ({self.copied_bytes / 1e6:.1f} MB) copied, "
+            f"{self.skipped_files} skipped, {self.deleted_files} deleted in {self.duration:.2f}s "
+            f"({self.files_per_second:.0f} files/s, {self.bytes_per_second / 1e6:.1f} MB/s"
+            + (", incremental)" if self.incremental else ")")
+        )
+
+
+class TreeMirror:
+    """Copies a directory tree in the spirit of robocopy.
+
+    In mirror mode new and changed files (size or modification time differ) are
+    copied and everything not existing in the source is purged from the target.
+    Otherwise only files missing in the target are copied and nothing is deleted.
+    Directories named like one of the `excluded_dirs` are neither copied nor kept in the target.
+
+    The state of all mirrored files is stored in a manifest in the `manifest_dir`, e.g. a
+    cache directory, so it is neither part of the target nor purged from it.
+    If a valid manifest exists, the source tree is scanned and compared against it,
+    and only the mirrored files listed in the manifest are checked in the target.
+    If one of them was deleted or modified in the target, source and target are
+    compared completely like without a manifest.
+    Running the same instance again keeps the manifest in memory.
+    Files which were not created by the mirroring are then left untouched.
+    A run can be cancelled by an event, the files copied until then are added
+    to the manifest.
+    """
+
+    excluded_dirs = {".dm"}
+    manifest_version = 2
+
+    def __init__(
+        self,
+        dir_mirror_data: DirMirrorData,
+        max_workers: Optional[int] = None,
+        manifest_dir: Optional[Path] = None,
+    ) -> None:
+        self.dir_mirror_data = dir_mirror_data
+        self.source = Path(dir_mirror_data.source)
+        self.target = Path(dir_mirror_data.target)
+        self.patterns = dir_mirror_data.patterns
+        self.mirror = dir_mirror_data.mirror
+        self.hash_contents = dir_mirror_data.hash_contents
+        self.max_workers = max_workers
+        self.manifest_dir = manifest_dir
+        # state of all files in the target after mirroring, relative posix path as key
+        self.files: Dict[str, FileState] = {}
+        self.cancel_event: Optional[threading.Event] = None
+
+    @property
+    def manifest_file(self) -> Optional[Path]:
+        if self.manifest_dir is None:
+            return None
+        # one manifest per target directory
+        target_hash = hashlib.sha1(str(self.target.absolute()).encode()).hexdigest()
+        return self.manifest_dir / f"{self.target.name}.{target_hash[:16]}.json"
+
+    def run(self, cancel_event: Optional[threading.Event] = None) -> MirrorStatistics:
+        start = time.perf_counter()
+        statistics = MirrorStatistics()
+        self.cancel_event = cancel_event
+        # a previous run of this instance knows the state of the target already
+        manifest = dict(self.files) if self.files else self.load_manifest()
+        self.files = {}
+        try:
+            copies = None
+            if manifest is not None:
+                statistics.incremental = True
+                copies = self.collect_incremental_changes(manifest, statistics)
+            if copies is None:
+                # no manifest or the target was modified, compare source and target
+                statistics = MirrorStatistics()
+                self.files = {}
+                copies = self.collect_changes(statistics)
+        except CancelledError:
+            # the manifest on disk still lists everything mirrored before
+            self.cancel_event = None
+            raise
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for copy, file_state in zip(
+                    copies, executor.map(self.copy_file, copies)
+                ):
+                    self.files[copy.rel_path] = file_state
+                    statistics.copied_files += 1
+                    statistics.copied_bytes += file_state.size
+        finally:
+            # the files copied so far are not copied again by the next run
+            self.cancel_event = None
+            self.save_manifest()
+        statistics.duration = time.perf_counter() - start
+        return statistics
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event and self.cancel_event.is_set():
+            raise CancelledError(f"Mirroring {self.source} to {self.target} cancelled.")
+
+    def collect_changes(self, statistics: MirrorStatistics) -> List[FileCopy]:
+        """Walk source and target side by side, purge obsolete target entries and return the files to be copied."""
+        copies = []
+        pending_dirs = [Path()]
+        while pending_dirs:
+            self.check_cancelled()
+            rel_dir = pending_dirs.pop()
+            source_entries = self.scan_dir(self.source / rel_dir)
+            target_entries = self.scan_dir(self.target / rel_dir)
+            for name, source_entry in source_entries.items():
+                target_entry = target_entries.pop(name, None)
+                if source_entry.is_dir():
+                    if name in self.excluded_dirs:
+                        if target_entry:
+                            statistics.deleted_files += self.delete(target_entry)
+                        continue
+                    if target_entry and not target_entry.is_dir():
+                        statistics.deleted_files += self.delete(target_entry)
+                    pending_dirs.append(rel_dir / name)
+                elif self.matches(name):
+                    if target_entry and target_entry.is_dir():
+                        statistics.deleted_files += self.delete(target_entry)
+                        target_entry = None
+                    rel_path = (rel_dir / name).as_posix()
+                    source_state = self.file_state(source_entry.stat())
+                    if target_entry is None or (
+                        self.mirror and self.is_changed(source_state, target_entry)
+                    ):
+                        copies.append(
+                            FileCopy(
+                                rel_path,
+                                Path(source_entry.path),
+                                self.target / rel_dir / name,
+                                source_state,
+                            )
+                        )
+                    else:
+                        self.files[rel_path] = source_state
+                        statistics.skipped_files += 1
+            # whatever is left in the target does not exist in the source
+            for name, target_entry in target_entries.items():
+                if target_entry.is_dir():
+                    if self.mirror or name in self.excluded_dirs:
+                        statistics.deleted_files += self.delete(target_entry)
+                elif self.mirror and self.matches(name):
+                    statistics.deleted_files += self.delete(target_entry)
+        return copies
+
+    def collect_incremental_changes(
+        self, manifest: Dict[str, FileState], statistics: MirrorStatistics
+    ) -> Optional[List[FileCopy]]:
+        """Walk the source, compare it against the manifest and return the files to be copied.
+
+        Files listed in the manifest but no longer existing in the source are purged.
+        Returns None as soon as a file listed in the manifest is missing or, when
+        mirroring, modified in the target.
+        """
+        copies = []
+        pending_dirs = [Path()]
+        while pending_dirs:
+            self.check_cancelled()
+            rel_dir = pending_dirs.pop()
+            # the target directory is only scanned if a file is not known by the manifest
+            target_entries = None
+            for name, source_entry in self.scan_dir(self.source / rel_dir).items():
+                if source_entry.is_dir():
+                    if name not in self.excluded_dirs:
+                        pending_dirs.append(rel_dir / name)
+                    continue
+                if not self.matches(name):
+                    continue
+                rel_path = (rel_dir / name).as_posix()
+                known_state = manifest.pop(rel_path, None)
+                source_state = self.file_state(source_entry.stat())
+                if known_state:
+                    if not self.is_unchanged_in_target(rel_path, known_state):
+                        return None
+                    if not self.mirror:
+                        self.files[rel_path] = known_state
+                        statistics.skipped_files += 1
+                        continue
+                    up_to_date_state = self.up_to_date_state(
+                        Path(source_entry.path), source_state, known_state
+                    )
+                    if up_to_date_state:
+                        if up_to_date_state.mtime_ns != known_state.mtime_ns:
+                            # keep the target like a copy of the source
+                            os.utime(
+                                self.target / rel_path,
+                                ns=(source_state.mtime_ns, source_state.mtime_ns),
+                            )
+                        self.files[rel_path] = up_to_date_state
+                        statistics.skipped_files += 1
+                        continue
+                elif not self.mirror:
+                    if target_entries is None:
+                        target_entries = self.scan_dir(self.target / rel_dir)
+                    if name in target_entries:
+                        self.files[rel_path] = source_state
+                        statistics.skipped_files += 1
+                        continue
+                copies.append(
+                    FileCopy(
+                        rel_path,
+                        Path(source_entry.path),
+                        self.target / rel_path,
+                        source_state,
+                    )
+                )
+        if self.mirror:
+            for rel_path in manifest:
+                statistics.deleted_files += self.delete_obsolete(self.target / rel_path)
+        return copies
+
+    def is_unchanged_in_target(self, rel_path: str, known_state: FileState) -> bool:
+        """Whether a mirrored file still exists in the target, when mirroring also unmodified."""
+        try:
+            target_stat = os.stat(self.target / rel_path)
+        except OSError:
+            return False
+        return not self.mirror or (
+            target_stat.st_size == known_state.size
+            and target_stat.st_mtime_ns == known_state.mtime_ns
+        )
+
+    def up_to_date_state(
+        self, source: Path, source_state: FileState, known_state: FileState
+    ) -> Optional[FileState]:
+        if source_state.size != known_state.size:
+            return None
+        if source_state.mtime_ns == known_state.mtime_ns:
+            return known_state
+        # only the modification time changed, e.g. after a fresh checkout
+        if self.hash_contents and known_state.digest == self.digest(source):
+            return source_state._replace(digest=known_state.digest)
+        return None
+
+    def load_manifest(self) -> Optional[Dict[str, FileState]]:
+        if self.manifest_file is None:
+            return None
+        try:
+            data = json.loads(self.manifest_file.read_text())
+        except (OSError, ValueError):
+            return None
+        if data.get("settings") != self.manifest_settings():
+            return None
+        return {
+            rel_path: FileState(*file_state)
+            for rel_path, file_state in data["files"].items()
+        }
+
+    def save_manifest(self) -> None:
+        if self.manifest_file is None or not self.target.is_dir():
+            return
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        tmp_file.write_text(
+            json.dumps({"settings": self.manifest_settings(), "files": self.files})
+        )
+        os.replace(tmp_file, self.manifest_file)
+
+    def manifest_settings(self) -> Dict:
+        return {
+            "version": self.manifest_version,
+            "source": str(self.source.absolute()),
+            "target": str(self.target.absolute()),
+            "patterns": self.patterns,
+            "mirror": self.mirror,
+            "hash_contents": self.hash_contents,
+        }
+
+    def matches(self, file_name: str) -> bool:
+        return not self.patterns or any(
+            fnmatch.fnmatch(file_name, pattern) for pattern in self.patterns
+        )
+
+    @staticmethod
+    def scan_dir(directory: Path) -> Dict[str, os.DirEntry]:
+        try:
+            with os.scandir(directory) as entries:
+                return {entry.name: entry for entry in entries}
+        except FileNotFoundError:
+            return {}
+
+    @staticmethod
+    def file_state(file_stat: os.stat_result) -> FileState:
+        return FileState(file_stat.st_size, file_stat.st_mtime_ns)
+
+    @staticmethod
+    def is_changed(source_state: FileState, target_entry: os.DirEntry) -> bool:
+        target_stat = target_entry.stat()
+        return (
+            source_state.size != target_stat.st_size
+            or source_state.mtime_ns != target_stat.st_mtime_ns
+        )
+
+    @staticmethod
+    def digest(file: Path) -> str:
+        with open(file, "rb") as f:
+            return hashlib.file_digest(f, "sha1").hexdigest()
+
+    def copy_file(self, copy: FileCopy) -> FileState:
+        self.check_cancelled()
+        copy.target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            shutil.copy2(copy.source, copy.target)
+        except PermissionError:
+            if not copy.target.is_file():
+                raise
+            # overwrite read-only files the same way robocopy does
+            os.chmod(copy.target, stat.S_IWRITE)
+            shutil.copy2(copy.source, copy.target)
+        if self.hash_contents:
+            return copy.source_state._replace(digest=self.digest(copy.source))
+        return copy.source_state
+
+    @staticmethod
+    def delete(entry: os.DirEntry) -> int:
+        """Delete a file or a whole directory and return the number of deleted files."""
+        if not entry.is_dir(follow_symlinks=False):
+            try:
+                os.unlink(entry.path)
+            except PermissionError:
+                _remove_readonly(os.unlink, entry.path, None)
+            return 1
+        deleted_files = sum(len(files) for _, _, files in os.walk(entry.path))
+        shutil.rmtree(entry.path, onerror=_remove_readonly)
+        return deleted_files
+
+    def delete_obsolete(self, file: Path) -> int:
+        """Delete a previously mirrored file together with its directories if they became empty."""
+        try:
+            os.unlink(file)
+        except FileNotFoundError:
+            return 0
+        except PermissionError:
+            _remove_readonly(os.unlink, file, None)
+        for directory in file.parents:
+            if directory == self.target:
+                break
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+        return 1
+
+
+def _remove_readonly(func, path, exc_info):
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
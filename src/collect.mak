@@ -2,14 +2,36 @@
 # and therefore not be part of MAKEFILE_LIST.
 undefine MAKEFILE_LIST
 
-include Makefile
+# use the makefile make would pick by default
+LEGACY_MAKEFILE ?= $(firstword $(wildcard GNUmakefile makefile Makefile))
+$(if $(LEGACY_MAKEFILE),,$(error No makefile found in $(CURDIR)))
+include $(LEGACY_MAKEFILE)
 
-# store all global make variables created by legacy build env
-$(file >$(MAKE_VARS_FILE),)
-$(foreach v, \
-      $(.VARIABLES), \
-      $(file >>$(MAKE_VARS_FILE),$(v) = $($(v))) \
+# newline terminating each variable in the dump file
+define COLLECT_NEWLINE
+
+
+endef
+
+# store global make variables created by legacy build env,
+# either all of them or only the ones matching the given selection of names and patterns.
+# Selected variables coming from the environment or from make itself are skipped,
+# like the flags make passes to sub-makes which would match e.g. '%FLAGS'.
+ifdef MAKE_VARS_SELECTION
+COLLECT_VARS := $(foreach v, \
+      $(filter-out MAKEFLAGS MFLAGS GNUMAKEFLAGS,$(filter $(MAKE_VARS_SELECTION),$(.VARIABLES))), \
+      $(if $(filter-out default environment automatic,$(origin $(v))),$(v)) \
  )
+else
+COLLECT_VARS := $(.VARIABLES)
+endif
+
+# $(foreach) separates the entries by a space, each entry ends with a newline and this marker
+# to remove exactly these spaces, so only newlines separate the variables in the dump file
+COLLECT_MARKER := __COLLECT_NEXT_VARIABLE__
+
+# write all variables at once instead of appending them one by one
+$(file >$(MAKE_VARS_FILE),$(subst $(COLLECT_MARKER),,$(subst $(COLLECT_MARKER) ,,$(foreach v,$(COLLECT_VARS),$(v) = $($(v))$(COLLECT_NEWLINE)$(COLLECT_MARKER)))))
 
 .PHONY: collect
 
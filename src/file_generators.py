@@ -1,32 +1,81 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+import filecmp
+import os
+import re
 import textwrap
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional
 from pathlib import Path
+from CompileFlags import CompileFlags
 from SubdirReplacement import SubdirReplacement
 from PathSearchAndReplace import PathSearchAndReplace
 
 
 class FileGenerator(ABC):
-    def to_file(self, file: Path) -> None:
+    def to_file(self, file: Path) -> bool:
+        """Write the content only if it differs from the existing file.
+
+        The content is streamed to a temporary file which replaces the target
+        atomically. An unchanged file keeps its modification time, so CMake does
+        not need to reconfigure. Returns whether the file was written.
+        """
         file.parent.mkdir(parents=True, exist_ok=True)
-        with open(file, "w") as f:
-            f.write(self.to_string())
+        tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_file, "w") as f:
+                f.writelines(self.chunks())
+            if file.is_file() and filecmp.cmp(tmp_file, file, shallow=False):
+                return False
+            os.replace(tmp_file, file)
+            return True
+        finally:
+            tmp_file.unlink(missing_ok=True)
+
+    def chunks(self) -> Iterator[str]:
+        """Content in chunks, by default the whole string at once"""
+        yield self.to_string()
 
     @abstractmethod
     def to_string(self) -> str:
         """Dump content to string"""
 
 
+def join_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Lazy equivalent of "\\n".join(lines)"""
+    separator = ""
+    for line in lines:
+        yield separator + line
+        separator = "\n"
+
+
+def cmake_argument(value: str) -> str:
+    """Quote the value if it would not be a single CMake argument otherwise."""
+    if value and not re.search(r'[\s"#;()\\]', value):
+        return value
+    return '"' + re.sub(r'(["\\])', r"\\\1", value) + '"'
+
+
+def cmake_command(command: str, arguments: List[str]) -> str:
+    lines = "".join(f"    {cmake_argument(argument)}\n" for argument in arguments)
+    return f"{command}(\n{lines})\n"
+
+
 @dataclass
 class VariantConfigCMakeGenerator(FileGenerator):
     compiler_flags: str
     linker_file: str
     link_flags: str
     cmake_toolchain_file: str
+    # flags extracted from the legacy makefiles
+    compile_flags: CompileFlags = field(default_factory=CompileFlags)
+    asm_flags: CompileFlags = field(default_factory=CompileFlags)
+    link_options: List[str] = field(default_factory=list)
 
     def to_string(self) -> str:
-        return textwrap.dedent(
+        return "".join(self.chunks())
+
+    def chunks(self) -> Iterator[str]:
+        yield textwrap.dedent(
             f"""\
         set(VARIANT_C_FLAGS {self.compiler_flags})
         set(VARIANT_LINKER_FILE {self.linker_file})
@@ -34,6 +83,28 @@ class VariantConfigCMakeGenerator(FileGenerator):
         set(CMAKE_TOOLCHAIN_FILE {self.cmake_toolchain_file} CACHE PATH "toolchain file")
         """
         )
+        for languages, flags in [
+            ("C,CXX", self.compile_flags),
+            ("ASM", self.asm_flags),
+        ]:
+            if flags.definitions:
+                yield cmake_command(
+                    "add_compile_definitions",
+                    [
+                        f"$<$<COMPILE_LANGUAGE:{languages}>:{definition}>"
+                        for definition in flags.definitions
+                    ],
+                )
+            if flags.options:
+                yield cmake_command(
+                    "add_compile_options",
+                    [
+                        f"$<$<COMPILE_LANGUAGE:{languages}>:{option}>"
+                        for option in flags.options
+                    ],
+                )
+        if self.link_options:
+            yield cmake_command("add_link_options", self.link_options)
 
 
 @dataclass
@@ -41,60 +112,105 @@ class VariantPartsCMakeGenerator(FileGenerator):
     include_paths: List[Path]
     third_party_libs: List[Path]
     subdir_extra_replacements: List[SubdirReplacement] = field(default_factory=list)
+    # the legacy sources are split into the components listed by the variant's components.cmake
+    legacy_components: bool = False
 
     def to_string(self) -> str:
-        return "\n".join(
-            [
-                "# Generated by Transformer",
-                self.cmake_includes(),
-                "",
-                f"spl_add_component(legacy)",
-                self.cmake_link_libraries(),
-                "",
-            ]
-        )
+        return "".join(self.chunks())
+
+    def chunks(self) -> Iterator[str]:
+        yield "# Generated by Transformer\n"
+        yield from join_lines(self.cmake_include_lines())
+        if self.legacy_components:
+            yield "\n\ninclude(${PROJECT_SOURCE_DIR}/legacy/${VARIANT}/components.cmake)\n"
+        else:
+            yield "\n\nspl_add_component(legacy)\n"
+        yield from join_lines(self.cmake_link_library_lines())
+        yield "\n"
 
     def cmake_includes(self) -> str:
-        return "\n".join(
-            [f"spl_add_include({self.replace(inc)})" for inc in self.include_paths]
-        )
+        return "\n".join(self.cmake_include_lines())
+
+    def cmake_include_lines(self) -> Iterator[str]:
+        for inc in self.replacer().replace_many(self.include_paths):
+            yield f"spl_add_include({inc.as_posix()})"
 
     def replace(self, path: Path) -> str:
-        replacer = PathSearchAndReplace(
+        return self.replacer().replace_path(path).as_posix()
+
+    def replacer(self) -> PathSearchAndReplace:
+        return PathSearchAndReplace(
             self.subdir_extra_replacements
             + [SubdirReplacement("/", "${PROJECT_SOURCE_DIR}/legacy/${VARIANT}/src")]
         )
-        return replacer.replace_path(path).as_posix()
 
     def cmake_link_libraries(self) -> str:
-        return "\n".join(
-            [
+        return "\n".join(self.cmake_link_library_lines())
+
+    def cmake_link_library_lines(self) -> Iterator[str]:
+        for lib in self.third_party_libs:
+            yield (
                 "target_link_libraries(${LINK_TARGET_NAME} ${CMAKE_CURRENT_LIST_DIR}/Lib/"
                 + lib.as_posix()
                 + ")"
-                for lib in self.third_party_libs
-            ]
-        )
+            )
 
 
 @dataclass
 class LegacyPartsCMakeGenerator(FileGenerator):
     sources: List[Path]
     subdir_extra_replacements: List[SubdirReplacement] = field(default_factory=list)
+    # directory of the sources not matching any replacement, relative to the parts file
+    source_root: str = "src"
+    # flags of single sources in addition to the variant's flags
+    source_flags: Dict[Path, CompileFlags] = field(default_factory=dict)
 
     def to_string(self) -> str:
-        return "\n".join(["# Generated by Transformer", self.cmake_sources(), ""])
+        return "".join(self.chunks())
+
+    def chunks(self) -> Iterator[str]:
+        replaced_sources = self.replacer().replace_many(self.sources)
+        yield "# Generated by Transformer\n"
+        yield from join_lines(self.cmake_source_lines(replaced_sources))
+        yield "\n"
+        for source, replaced_source in zip(self.sources, replaced_sources):
+            flags = self.source_flags.get(source)
+            if flags:
+                yield from self.cmake_source_properties(replaced_source, flags)
+
+    def cmake_source_properties(
+        self, replaced_source: Path, flags: CompileFlags
+    ) -> Iterator[str]:
+        # CMake resolves relative paths against the including CMakeLists.txt,
+        # spl_add_source against the directory of the parts file
+        path = replaced_source.as_posix()
+        if not (path.startswith("${") or replaced_source.is_absolute()):
+            path = f"${{CMAKE_CURRENT_LIST_DIR}}/{path}"
+        yield f"set_source_files_properties({cmake_argument(path)} PROPERTIES\n"
+        if flags.definitions:
+            yield f"    COMPILE_DEFINITIONS {cmake_argument(';'.join(flags.definitions))}\n"
+        if flags.options:
+            yield f"    COMPILE_OPTIONS {cmake_argument(';'.join(flags.options))}\n"
+        yield ")\n"
 
     def cmake_sources(self) -> str:
-        return "\n".join(
-            [f"spl_add_source({self.replace(source)})" for source in self.sources]
-        )
+        return "\n".join(self.cmake_source_lines())
+
+    def cmake_source_lines(
+        self, replaced_sources: Optional[List[Path]] = None
+    ) -> Iterator[str]:
+        if replaced_sources is None:
+            replaced_sources = self.replacer().replace_many(self.sources)
+        for source in replaced_sources:
+            yield f"spl_add_source({source.as_posix()})"
 
     def replace(self, path: Path) -> str:
-        replacer = PathSearchAndReplace(
-            self.subdir_extra_replacements + [SubdirReplacement("/", "src")]
+        return self.replacer().replace_path(path).as_posix()
+
+    def replacer(self) -> PathSearchAndReplace:
+        return PathSearchAndReplace(
+            self.subdir_extra_replacements + [SubdirReplacement("/", self.source_root)]
         )
-        return replacer.replace_path(path).as_posix()
 
 
 class LegacyCMakeListsGenerator(FileGenerator):
@@ -109,3 +225,16 @@ class LegacyCMakeListsGenerator(FileGenerator):
         spl_create_component()
         """
         )
+
+
+@dataclass
+class LegacyComponentsCMakeGenerator(FileGenerator):
+    components: List[str]
+
+    def to_string(self) -> str:
+        return "".join(self.chunks())
+
+    def chunks(self) -> Iterator[str]:
+        yield "# Generated by Transformer\n"
+        for component in self.components:
+            yield f"spl_add_component(legacy/components/{component})\n"
@@ -3,38 +3,47 @@
 """Transformer
 
 Usage:
-  transformer.py (--source=<source directory> --target=<target directory> --variant=<variant> | --config=<config_file>) [--make-dump-file=<make_dump_file>]
+  transformer.py (--source=<source directory> --target=<target directory> --variant=<variant>... | --config=<config_file>) [--make-dump-file=<make_dump_file>] [--jobs=<jobs>] [--profile=<profile_file>] [--profile-trace=<trace_file>] [--force] [--watch] [--watch-interval=<seconds>]
   transformer.py (-h | --help)
 
 Options:
   -h --help                 Show this screen.
   --source=DIR              Source directory holding a Dimensions make project
   --target=DIR              Target directory for the transformed CMake project
-  --variant=VARIANT         VARIANT of the transformed CMake project (e.g., 'customer1_subsystem_flavor')
+  --variant=VARIANT         VARIANT of the transformed CMake project (e.g., 'customer1_subsystem_flavor'). Can be given multiple times.
   --config=FILE             JSON configuration file
   --make-dump-file=FILE     Make dump file from previous run. This will avoid regenerating this file, which might take long time.
+                            Only supported when transforming a single variant.
+  --jobs=JOBS               Number of variants transformed in parallel [default: 1]
+  --profile=FILE            Write time, memory and counts of each stage as JSON
+  --profile-trace=FILE      Write the stages as Chrome trace events (chrome://tracing)
+  --force                   Run all stages, also the ones being up-to-date since the last run.
+  --watch                   Keep running and transform again whenever the config, the makefiles or the mirrored directories change.
+                            Only supported when transforming a single variant.
+  --watch-interval=SECONDS  Time between two checks for changes in watch mode [default: 1]
 """
 
-import dataclasses
+from __future__ import annotations
+
 import sys
-import textwrap
-from typing import List, Optional
-from docopt import docopt
-import logging
-import subprocess
-import shutil
 import os
-from pathlib import WindowsPath, Path
-import json
-from TransformerConfig import DirMirrorData, TransformerConfig
-from Variant import Variant
-from LegacyBuildSystem import LegacyBuildSystem
-from file_generators import (
-    LegacyCMakeListsGenerator,
-    LegacyPartsCMakeGenerator,
-    VariantConfigCMakeGenerator,
-    VariantPartsCMakeGenerator,
-)
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+# Only the modules required for parsing the arguments are imported eagerly, all
+# others are imported by the stages using them. This keeps the startup fast,
+# e.g. for '--help' or a run reusing cached results.
+if TYPE_CHECKING:
+    import subprocess
+    import threading
+    from CompileFlags import CompileFlags
+    from file_generators import FileGenerator
+    from LegacyBuildSystem import LegacyBuildSystem
+    from MakeDumpCache import MakeDumpCache
+    from StageGraph import Stage, StageGraph
+    from TransformerConfig import DirMirrorData, TransformerConfig
+    from TreeMirror import MirrorStatistics, TreeMirror
+    from Variant import Variant
 
 
 def this_script_dir() -> Path:
@@ -43,6 +52,9 @@ def this_script_dir() -> Path:
 
 class Transformer:
     def __init__(self, config: TransformerConfig, make_dump_file: Optional[str] = None):
+        import logging
+        from StageProfiler import StageProfiler
+
         self.logger = logging.getLogger(self.__class__.__name__)
         self.name = type(self).__name__
         self.config: TransformerConfig = config
@@ -51,7 +63,12 @@ class Transformer:
             if make_dump_file
             else self.variant_dir / "original_make_vars.txt"
         )
+        # an explicitly given make dump file is always used as it is
+        self.reuse_make_dump_file = bool(make_dump_file) or not config.make_dump_cache
         self.execution_summary: List[str] = []
+        # mirrors of previous runs, they know the state of their target already
+        self.tree_mirrors: Dict[Path, TreeMirror] = {}
+        self.profiler = StageProfiler(config.profile_memory)
 
     @property
     def input_dir(self) -> Path:
@@ -65,6 +82,18 @@ class Transformer:
     def variant(self) -> str:
         return self.config.variant
 
+    @property
+    def build_dir(self) -> Path:
+        return self.input_dir / self.config.build_dir_rel
+
+    @property
+    def cache_dir(self) -> Path:
+        return self.config.make_dump_cache_dir or self.output_dir / ".cache"
+
+    @property
+    def collect_mak_template(self) -> Path:
+        return this_script_dir().joinpath("collect.mak")
+
     @property
     def legacy_dir(self) -> Path:
         return self.output_dir.joinpath(f"legacy")
@@ -89,142 +118,965 @@ class Transformer:
     def legacy_parts_cmake_file(self) -> Path:
         return self.legacy_variant_dir / "parts.cmake"
 
+    @property
+    def make_target_variables_file(self) -> Path:
+        return self.variant_dir / "make_target_variables.json"
+
+    @property
+    def source_validation_report_file(self) -> Path:
+        return self.variant_dir / "source_validation.json"
+
+    @property
+    def include_analysis_report_file(self) -> Path:
+        return self.variant_dir / "include_analysis.json"
+
+    @property
+    def dependency_graph_json_file(self) -> Path:
+        return self.variant_dir / "dependencies.json"
+
+    @property
+    def dependency_graph_dot_file(self) -> Path:
+        return self.variant_dir / "dependencies.dot"
+
+    @property
+    def analyzes_includes(self) -> bool:
+        return self.config.analyze_includes or self.config.minimize_include_paths
+
     @property
     def legacy_cmake_lists_file(self) -> Path:
         return self.legacy_dir / "CMakeLists.txt"
 
-    def run(self):
+    @property
+    def legacy_components_dir(self) -> Path:
+        return self.legacy_dir / "components"
+
+    @property
+    def legacy_components_cmake_file(self) -> Path:
+        return self.legacy_variant_dir / "components.cmake"
+
+    @property
+    def variants_json_file(self) -> Path:
+        return self.output_dir / ".vscode/cmake-variants.json"
+
+    @property
+    def stage_stamps_file(self) -> Path:
+        return self.variant_dir / "stage_stamps.json"
+
+    @property
+    def shared_stage_stamps_file(self) -> Path:
+        return self.output_dir / "variants/shared_stage_stamps.json"
+
+    @property
+    def folder_structure(self) -> List[Path]:
+        return [
+            self.variant_dir,
+            self.legacy_variant_dir,
+            self.output_dir / "tools/toolchains/gcc",
+        ]
+
+    def run(self, force: bool = False):
+        """Run the stages being outdated since the last run, all of them if forced."""
+        self.check_input_dir()
+        try:
+            self.run_stage_graph(self.create_stage_graph(), force)
+        finally:
+            self.print_execution_summary()
+
+    def run_stage_graph(self, graph: StageGraph, force: bool = False) -> None:
+        _, skipped = graph.run(force)
+        if skipped:
+            self.add_execution_summary(
+                f"Skipped up-to-date stages: {', '.join(skipped)}."
+            )
+
+    def create_stage_graph(self, shared_stages: bool = True) -> StageGraph:
+        """The stages of a variant with their dependencies and inputs.
+
+        Mirroring, the make dump and the variant config do not depend on each
+        other and run concurrently, unless the variant config gets the flags
+        from the make dump. The stages reading make variables depend on
+        the content of the dump, so they are skipped if make reproduced the
+        same dump after a makefile changed.
+
+        Without the shared stages, mirroring and the variants file are left
+        to the caller, e.g. the batch mode runs them once for all variants.
+        """
+        import threading
+        from StageGraph import StageGraph, file_digest, tree_digest
+
+        lock = threading.Lock()
+        # created once after the make dump stage and shared by the following stages
+        shared: Dict[str, Any] = {}
+
+        def shared_value(name: str, create: Callable[[], Any]) -> Any:
+            with lock:
+                if name not in shared:
+                    shared[name] = create()
+            return shared[name]
+
+        def create_indexed_legacy_build_system() -> LegacyBuildSystem:
+            legacy_build_system = graph.resources.enter_context(
+                self.create_legacy_build_system()
+            )
+            legacy_build_system.make_variables_dump.load_index()
+            return legacy_build_system
+
+        def legacy_build_system() -> LegacyBuildSystem:
+            return shared_value(
+                "legacy build system", create_indexed_legacy_build_system
+            )
+
+        def make_variables_inputs(*field_names: str) -> Dict:
+            return {
+                "dump": shared_value(
+                    "dump digest", lambda: file_digest(self.make_dump_file)
+                ),
+                **self.config_inputs("build_dir_rel", "source_dir_rel", *field_names),
+            }
+
+        profiled = self.profiled_stage
+        graph = StageGraph(self.stage_stamps_file, version=self.stages_version())
+        folders = profiled("create folder structure", self.create_folder_structure)
+        folders.inputs = dict
+        folders.outputs = self.folder_structure
+
+        make_dump = profiled(
+            "make variables dump", lambda: self.run_make_dump(graph.cancel_event)
+        )
+        make_dump.dependencies = [folders.name]
+        make_dump.inputs = self.make_dump_inputs
+        make_dump.outputs = [self.make_dump_file]
+        if self.config.make_dump_database and not self.reuse_make_dump_file:
+            make_dump.outputs.append(self.make_target_variables_file)
+
+        validation = profiled(
+            "validate sources", lambda: self.validate_sources(legacy_build_system())
+        )
+        validation.dependencies = [make_dump.name]
+        validation.inputs = lambda: {
+            **make_variables_inputs(
+                "includes_var",
+                "sources_var",
+                "source_extensions",
+                "fail_on_source_issues",
+            ),
+            "directories": self.source_dirs_state(legacy_build_system()),
+        }
+        validation.outputs = [self.source_validation_report_file]
+
+        include_analysis = profiled(
+            "analyze includes",
+            lambda: self.analyze_includes(legacy_build_system()),
+        )
+        include_analysis.dependencies = [make_dump.name]
+        include_analysis.inputs = lambda: {
+            **make_variables_inputs(
+                "includes_var",
+                "sources_var",
+                "legacy_component_depth",
+                "legacy_component_rules",
+            ),
+            "trees": [
+                tree_digest(Path(root_dir))
+                for root_dir in self.include_analysis_roots(legacy_build_system())
+            ],
+        }
+        include_analysis.outputs = [
+            self.include_analysis_report_file,
+            self.dependency_graph_json_file,
+            self.dependency_graph_dot_file,
+        ]
+
+        variant_parts = profiled(
+            "variant parts cmake",
+            lambda: self.create_variant_parts_cmake(legacy_build_system()),
+        )
+        variant_parts.dependencies = [make_dump.name]
+        variant_parts.inputs = lambda: {
+            **make_variables_inputs(
+                "includes_var",
+                "subdir_replacements",
+                "legacy_component_depth",
+                "minimize_include_paths",
+            ),
+            **self.config_inputs("legacy_component_rules"),
+            "libraries": legacy_build_system().get_thirdparty_libs(),
+            "include analysis": (
+                file_digest(self.include_analysis_report_file)
+                if self.config.minimize_include_paths
+                else None
+            ),
+        }
+        variant_parts.outputs = [self.variant_parts_cmake_file]
+        if self.config.minimize_include_paths:
+            variant_parts.dependencies.append(include_analysis.name)
+
+        variant_config_fields = [
+            "variant_compiler_flags",
+            "variant_linker_file",
+            "variant_link_flags",
+            "cmake_toolchain_file",
+        ]
+        if self.config.flags_vars:
+            variant_config = profiled(
+                "variant config cmake",
+                lambda: self.create_variant_config_cmake(legacy_build_system()),
+            )
+            variant_config.dependencies = [make_dump.name]
+            variant_config.inputs = lambda: make_variables_inputs(
+                *variant_config_fields,
+                "compile_flags_vars",
+                "asm_flags_vars",
+                "link_flags_vars",
+            )
+        else:
+            variant_config = profiled(
+                "variant config cmake", self.create_variant_config_cmake
+            )
+            variant_config.dependencies = [folders.name]
+            variant_config.inputs = lambda: self.config_inputs(*variant_config_fields)
+        variant_config.outputs = [self.variant_config_cmake_file]
+
+        legacy_parts = profiled(
+            "legacy parts cmake",
+            lambda: self.create_legacy_parts_cmake(legacy_build_system()),
+        )
+        legacy_parts.dependencies = [make_dump.name]
+        legacy_parts.inputs = lambda: {
+            **make_variables_inputs(
+                "sources_var",
+                "subdir_replacements",
+                "legacy_component_depth",
+                "legacy_component_rules",
+                "compile_flags_vars",
+                "asm_flags_vars",
+            ),
+            "target variables": (
+                file_digest(self.make_target_variables_file)
+                if self.config.make_dump_database
+                else None
+            ),
+        }
+        legacy_parts.outputs = [
+            (
+                self.legacy_components_cmake_file
+                if self.config.splits_legacy_components
+                else self.legacy_parts_cmake_file
+            )
+        ]
+
+        legacy_cmake_lists = profiled(
+            "legacy cmake lists", self.create_legacy_cmake_lists
+        )
+        legacy_cmake_lists.dependencies = [folders.name]
+        legacy_cmake_lists.inputs = dict
+        legacy_cmake_lists.outputs = [self.legacy_cmake_lists_file]
+
+        variant_json = profiled("create variant json", self.create_variant_json)
+        variant_json.inputs = lambda: {"variant": str(self.variant)}
+        variant_json.outputs = [self.variants_json_file]
+
+        for stage in [
+            *([self.create_mirror_stage(graph)] if shared_stages else []),
+            folders,
+            make_dump,
+            validation,
+            *([include_analysis] if self.analyzes_includes else []),
+            variant_parts,
+            variant_config,
+            legacy_parts,
+            legacy_cmake_lists,
+            *([variant_json] if shared_stages else []),
+        ]:
+            graph.add(stage)
+        return graph
+
+    def create_shared_stage_graph(self) -> StageGraph:
+        """The stages shared by all variants of the output directory."""
+        from StageGraph import StageGraph
+
+        graph = StageGraph(self.shared_stage_stamps_file, version=self.stages_version())
+        graph.add(self.create_mirror_stage(graph))
+        return graph
+
+    def create_mirror_stage(self, graph: StageGraph) -> Stage:
+        # without inputs the stage always runs, the manifests of the tree mirrors
+        # decide what to copy, without scanning the trees twice
+        return self.profiled_stage(
+            "mirror directories", lambda: self.mirror_directories(graph.cancel_event)
+        )
+
+    def profiled_stage(self, name: str, function: Callable[[], None]) -> Stage:
+        from StageGraph import Stage
+
+        def run_profiled() -> None:
+            with self.profiler.stage(name):
+                function()
+
+        return Stage(name, run_profiled)
+
+    def stages_version(self) -> str:
+        """Digest of the transformer sources, the stages of an updated transformer may create different files."""
+        from StageGraph import files_digest
+
+        return files_digest(
+            sorted(this_script_dir().glob("*.py")) + [self.collect_mak_template]
+        )
+
+    def config_inputs(self, *field_names: str) -> Dict:
+        return {name: getattr(self.config, name) for name in field_names}
+
+    def make_dump_inputs(self) -> Dict:
+        """The collection setup, the makefiles read and the directories listed when creating the current dump."""
+        from MakeDumpCache import MakeDumpCache
+
+        dump_inputs = None
+        if self.make_dump_file.is_file():
+            dump_inputs = MakeDumpCache(
+                self.cache_dir, self.build_dir, {}, self.config.sources_var
+            ).dump_inputs(self.make_dump_file)
+        return {
+            "make_dump_file": self.make_dump_file,
+            "reuse_make_dump_file": self.reuse_make_dump_file,
+            "setup": self.make_dump_setup(),
+            "dump": dump_inputs,
+        }
+
+    @staticmethod
+    def source_dirs_state(
+        legacy_build_system: LegacyBuildSystem,
+    ) -> Dict[str, Optional[int]]:
+        """Modification time of the directories containing the sources and include paths.
+
+        Creating or deleting a source or include directory changes the
+        modification time of its parent directory.
+        """
+        directories = {
+            os.path.dirname(path)
+            for path in legacy_build_system.get_source_files()
+            + legacy_build_system.get_include_dirs()
+        }
+        result: Dict[str, Optional[int]] = {}
+        for directory in directories:
+            try:
+                result[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                result[directory] = None
+        return result
+
+    def check_input_dir(self) -> None:
         if not self.input_dir.exists():
             raise FileNotFoundError(f"Input directory {self.input_dir} does not exist.")
-        self.create_folder_structure()
-        self.create_legacy_make_variables_dump_file()
-        self.mirror_directories()
-        self.create_cmake_project(LegacyBuildSystem(self.make_dump_file, self.config))
-        self.create_variant_json()
-        self.print_execution_summary()
-
-    def create_cmake_project(self, legacy_build_system: LegacyBuildSystem) -> None:
-        VariantPartsCMakeGenerator(
-            legacy_build_system.get_include_paths(),
-            legacy_build_system.get_thirdparty_libs(),
-            self.config.subdir_replacements,
-        ).to_file(self.variant_parts_cmake_file)
-        self.add_execution_summary(
-            f"variant parts cmake {self.variant_parts_cmake_file.relative_to(self.output_dir)}"
+
+    def run_make_dump(self, cancel_event: Optional[threading.Event] = None) -> None:
+        self.create_legacy_make_variables_dump_file(cancel_event)
+        self.profiler.count("dump bytes", self.make_dump_file.stat().st_size)
+
+    def create_legacy_build_system(self) -> LegacyBuildSystem:
+        from LegacyBuildSystem import LegacyBuildSystem
+
+        target_variables = None
+        if self.config.make_dump_database and self.make_target_variables_file.is_file():
+            from MakeDatabase import MakeDatabase
+
+            target_variables = MakeDatabase.read_target_variables(
+                self.make_target_variables_file
+            )
+        return LegacyBuildSystem(
+            self.make_dump_file, self.config, self.cache_dir, target_variables
+        )
+
+    def validate_sources(self, legacy_build_system: LegacyBuildSystem) -> None:
+        from SourceValidator import SourceValidator
+
+        report = SourceValidator(
+            legacy_build_system.sources_dir, self.config.source_extensions
+        ).validate(
+            legacy_build_system.get_source_files(),
+            legacy_build_system.get_include_dirs(),
+        )
+        report.to_file(self.source_validation_report_file)
+        self.profiler.count("paths validated", report.sources + report.include_paths)
+        self.add_execution_summary(str(report))
+        if report.has_issues(self.config.fail_on_source_issues):
+            raise RuntimeError(
+                f"Source validation failed, see {self.source_validation_report_file}."
+            )
+
+    def analyze_includes(self, legacy_build_system: LegacyBuildSystem) -> None:
+        from ComponentSplitter import ComponentSplitter
+        from DependencyScanner import HEADER_EXTENSIONS, DependencyScanner
+        from IncludeAnalyzer import HeaderIndex, IncludeAnalyzer
+
+        sources = legacy_build_system.get_source_files()
+        components = None
+        if self.config.splits_legacy_components:
+            source_files = dict(zip(legacy_build_system.get_source_paths(), sources))
+            components = {
+                component: [source_files[path] for path in component_sources]
+                for component, component_sources in ComponentSplitter(
+                    self.config.legacy_component_depth,
+                    self.config.legacy_component_rules,
+                )
+                .split(list(source_files))
+                .items()
+            }
+        scanner = DependencyScanner(
+            legacy_build_system.sources_dir,
+            self.config.source_extensions + HEADER_EXTENSIONS,
+            self.cache_dir / "includes.json",
+        )
+        analyzer = IncludeAnalyzer(
+            legacy_build_system.get_include_dirs(),
+            HeaderIndex(self.include_analysis_roots(legacy_build_system)),
+            scanner,
+        )
+        report = analyzer.analyze(sources, components)
+        report.to_file(self.include_analysis_report_file)
+        graph = analyzer.graph()
+        graph.to_json(self.dependency_graph_json_file, legacy_build_system.sources_dir)
+        graph.to_dot(self.dependency_graph_dot_file, legacy_build_system.sources_dir)
+        self.profiler.count("files analyzed", report.sources + report.headers)
+        self.profiler.count("files scanned", scanner.scanned_files)
+        self.profiler.count("unused include paths", len(report.unused))
+        self.add_execution_summary(str(report))
+
+    @staticmethod
+    def include_analysis_roots(legacy_build_system: LegacyBuildSystem) -> List[str]:
+        """The source directory and the include paths outside of it."""
+        sources_dir = os.path.normpath(legacy_build_system.sources_dir)
+        return [sources_dir] + [
+            include_dir
+            for include_dir in legacy_build_system.get_include_dirs()
+            if not include_dir.startswith(sources_dir + os.sep)
+        ]
+
+    def create_variant_parts_cmake(
+        self, legacy_build_system: LegacyBuildSystem
+    ) -> None:
+        from file_generators import VariantPartsCMakeGenerator
+
+        include_paths = legacy_build_system.get_include_paths()
+        if self.config.minimize_include_paths:
+            from IncludeAnalyzer import IncludeAnalysisReport
+
+            used_include_dirs = set(
+                IncludeAnalysisReport.used_include_dirs(
+                    self.include_analysis_report_file
+                )
+            )
+            include_paths = [
+                include_path
+                for include_path, include_dir in zip(
+                    include_paths, legacy_build_system.get_include_dirs()
+                )
+                if include_dir in used_include_dirs
+            ]
+        third_party_libs = legacy_build_system.get_thirdparty_libs()
+        self.profiler.count("include paths", len(include_paths))
+        self.profiler.count("libraries", len(third_party_libs))
+        self.generate_file(
+            VariantPartsCMakeGenerator(
+                include_paths,
+                third_party_libs,
+                self.config.subdir_replacements,
+                self.config.splits_legacy_components,
+            ),
+            self.variant_parts_cmake_file,
+            "variant parts cmake",
         )
 
-        VariantConfigCMakeGenerator(
+    def create_variant_config_cmake(
+        self, legacy_build_system: Optional[LegacyBuildSystem] = None
+    ) -> None:
+        """Variant settings from the config and the flags of the legacy makefiles, if configured."""
+        from file_generators import VariantConfigCMakeGenerator
+
+        generator = VariantConfigCMakeGenerator(
             self.config.variant_compiler_flags,
             self.config.variant_linker_file,
             self.config.variant_link_flags,
             self.config.cmake_toolchain_file,
-        ).to_file(self.variant_config_cmake_file)
-        self.add_execution_summary(
-            f"variant config cmake {self.variant_config_cmake_file.relative_to(self.output_dir)}"
         )
-        LegacyPartsCMakeGenerator(
-            legacy_build_system.get_source_paths(),
-            self.config.subdir_replacements,
-        ).to_file(self.legacy_parts_cmake_file)
-        self.add_execution_summary(
-            f"legacy parts cmake {self.legacy_parts_cmake_file.relative_to(self.output_dir)}"
+        if legacy_build_system and self.config.flags_vars:
+            generator.compile_flags = legacy_build_system.get_compile_flags()
+            generator.asm_flags = legacy_build_system.get_asm_flags()
+            generator.link_options = legacy_build_system.get_link_options()
+            self.profiler.count(
+                "compile definitions",
+                len(generator.compile_flags.definitions)
+                + len(generator.asm_flags.definitions),
+            )
+        self.generate_file(
+            generator,
+            self.variant_config_cmake_file,
+            "variant config cmake",
         )
-        LegacyCMakeListsGenerator().to_file(self.legacy_cmake_lists_file)
+
+    def create_legacy_parts_cmake(self, legacy_build_system: LegacyBuildSystem) -> None:
+        from file_generators import LegacyPartsCMakeGenerator
+
+        sources = legacy_build_system.get_source_paths()
+        source_flags = legacy_build_system.get_source_compile_flags()
+        self.profiler.count("sources", len(sources))
+        self.profiler.count("sources with own flags", len(source_flags))
+        if self.config.splits_legacy_components:
+            self.create_legacy_components_cmake(sources, source_flags)
+            return
+        self.generate_file(
+            LegacyPartsCMakeGenerator(
+                sources,
+                self.config.subdir_replacements,
+                source_flags=source_flags,
+            ),
+            self.legacy_parts_cmake_file,
+            "legacy parts cmake",
+        )
+
+    def create_legacy_components_cmake(
+        self,
+        sources: List[Path],
+        source_flags: Optional[Dict[Path, CompileFlags]] = None,
+    ) -> None:
+        """One component per group of sources, so CMake can build them independently.
+
+        The CMakeLists.txt of a component is shared by all variants, the
+        sources of each variant are in its own parts.cmake.
+        """
+        from ComponentSplitter import ComponentSplitter
+        from file_generators import (
+            LegacyCMakeListsGenerator,
+            LegacyComponentsCMakeGenerator,
+            LegacyPartsCMakeGenerator,
+        )
+
+        components = ComponentSplitter(
+            self.config.legacy_component_depth, self.config.legacy_component_rules
+        ).split(sources)
+        files_written = 0
+        for component, component_sources in components.items():
+            component_dir = self.legacy_components_dir / component
+            files_written += LegacyCMakeListsGenerator().to_file(
+                component_dir / "CMakeLists.txt"
+            )
+            files_written += LegacyPartsCMakeGenerator(
+                component_sources,
+                self.config.subdir_replacements,
+                "${PROJECT_SOURCE_DIR}/legacy/${VARIANT}/src",
+                source_flags or {},
+            ).to_file(component_dir / f"{self.variant}/parts.cmake")
+        self.profiler.count("components", len(components))
+        self.profiler.count("files written", files_written)
         self.add_execution_summary(
-            f"legacy cmake listing {self.legacy_cmake_lists_file.relative_to(self.output_dir)}"
+            f"legacy components {self.legacy_components_dir.relative_to(self.output_dir)}: "
+            f"{len(components)} components, {files_written} files written"
+        )
+        self.generate_file(
+            LegacyComponentsCMakeGenerator(list(components)),
+            self.legacy_components_cmake_file,
+            "legacy components cmake",
         )
 
-    def create_folder_structure(self) -> None:
-        variant_and_legacy_folders = [self.variant_dir, self.legacy_variant_dir]
-        toolchain_folders = ["tools/toolchains/gcc"]
+    def create_legacy_cmake_lists(self) -> None:
+        from file_generators import LegacyCMakeListsGenerator
 
-        toolchain_paths = [
-            self.config.output_dir.joinpath(folder) for folder in toolchain_folders
-        ]
+        self.generate_file(
+            LegacyCMakeListsGenerator(),
+            self.legacy_cmake_lists_file,
+            "legacy cmake listing",
+        )
+
+    def generate_file(
+        self, generator: FileGenerator, file: Path, description: str
+    ) -> None:
+        changed = generator.to_file(file)
+        self.profiler.count("files written", int(changed))
+        self.add_execution_summary(
+            f"{description} {file.relative_to(self.output_dir)}"
+            + ("" if changed else " (unchanged)")
+        )
 
-        for folder in variant_and_legacy_folders + toolchain_paths:
+    def create_folder_structure(self) -> None:
+        for folder in self.folder_structure:
             folder.mkdir(parents=True, exist_ok=True)
 
-    def mirror_directories(self):
+    def resolved_mirror_dirs_data(self) -> List[DirMirrorData]:
+        import dataclasses
+        from TransformerConfig import DirMirrorData
+
         mirror_dirs_data = self.config.mirror_directories + [
             DirMirrorData(
                 this_script_dir().joinpath("dist"), self.output_dir, mirror=False
             )
         ]
+        resolved_dirs_data = []
         for dir_mirror_data in mirror_dirs_data:
             resolved_data = dataclasses.replace(dir_mirror_data)
             resolved_data.source = self.input_dir.joinpath(dir_mirror_data.source)
             resolved_data.target = self.output_dir.joinpath(dir_mirror_data.target)
-            mirror_tree(resolved_data)
+            resolved_dirs_data.append(resolved_data)
+        return resolved_dirs_data
+
+    def mirror_directories(self, cancel_event: Optional[threading.Event] = None):
+        for resolved_data in self.resolved_mirror_dirs_data():
+            statistics = self.mirror_tree(resolved_data, cancel_event)
+            self.profiler.count("files copied", statistics.copied_files)
+            self.profiler.count("bytes copied", statistics.copied_bytes)
             self.add_execution_summary(
-                f"Copied from {resolved_data.source} to {resolved_data.target}"
+                f"Copied from {resolved_data.source} to {resolved_data.target}: {statistics}"
             )
 
-    def create_legacy_make_variables_dump_file(self) -> None:
-        if self.make_dump_file.is_file():
+    def mirror_tree(
+        self,
+        dir_mirror_data: DirMirrorData,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> MirrorStatistics:
+        from TreeMirror import TreeMirror
+
+        tree_mirror = self.tree_mirrors.get(dir_mirror_data.target)
+        if tree_mirror is None or tree_mirror.dir_mirror_data != dir_mirror_data:
+            tree_mirror = TreeMirror(
+                dir_mirror_data, manifest_dir=self.cache_dir / "mirror_manifests"
+            )
+            self.tree_mirrors[dir_mirror_data.target] = tree_mirror
+        return tree_mirror.run(cancel_event)
+
+    def create_legacy_make_variables_dump_file(
+        self, cancel_event: Optional[threading.Event] = None
+    ) -> None:
+        """Collect the make variables, make is terminated if the cancel event is set."""
+        from concurrent.futures import CancelledError
+        import shutil
+        import time
+
+        if self.reuse_make_dump_file and self.make_dump_file.is_file():
             print(
                 f"Skipping make dump file generation, using already existing {self.make_dump_file}."
             )
             return
+        make_dump_cache = self.create_make_dump_cache()
+        cached_make_dump_file = make_dump_cache.lookup() if make_dump_cache else None
+        cached_target_variables_file = (
+            make_dump_cache.target_variables_file(cached_make_dump_file)
+            if cached_make_dump_file and self.config.make_dump_database
+            else None
+        )
+        if cached_target_variables_file and not cached_target_variables_file.is_file():
+            cached_make_dump_file = None
+        if cached_make_dump_file:
+            if cached_target_variables_file:
+                shutil.copyfile(
+                    cached_target_variables_file, self.make_target_variables_file
+                )
+            shutil.copyfile(cached_make_dump_file, self.make_dump_file)
+            self.add_execution_summary(
+                f"Reused cached make file dump {cached_make_dump_file} for {self.make_dump_file.relative_to(self.output_dir)}."
+            )
+            return
+        # a failing make shall not leave an outdated dump behind
+        self.make_dump_file.unlink(missing_ok=True)
+        self.make_target_variables_file.unlink(missing_ok=True)
+
+        start = time.perf_counter()
+        make_dump_file_rel = self.make_dump_file.relative_to(self.output_dir)
+        collect_mak = self.variant_dir.joinpath("collect.mak")
+        shutil.copy(self.collect_mak_template, collect_mak)
+        try:
+            if self.config.make_dump_database:
+                returncode = self.run_make_database(collect_mak, cancel_event)
+            else:
+                returncode = self.run_make(
+                    ["--silent", f"--file={collect_mak.absolute()}", "collect"],
+                    cancel_event,
+                )
+        except CancelledError:
+            # make might have written a part of the dump already
+            self.make_dump_file.unlink(missing_ok=True)
+            self.add_execution_summary(
+                f"Cancelled generating the make file dump to {make_dump_file_rel}."
+            )
+            raise
+        duration = time.perf_counter() - start
+        if returncode != 0 or not self.make_dump_file.is_file():
+            self.add_execution_summary(
+                f"Failed to generate make file dump to {make_dump_file_rel} after {duration:.2f}s (exit code {returncode})."
+            )
+            raise RuntimeError(
+                f"Make variables collection in {self.build_dir} failed with exit code {returncode}."
+            )
         self.add_execution_summary(
-            f"Generating make file dump to {self.make_dump_file.relative_to(self.output_dir)}."
+            f"Generated make file dump to {make_dump_file_rel} in {duration:.2f}s."
+        )
+        if make_dump_cache:
+            make_dump_cache.store(
+                self.make_dump_file,
+                (
+                    self.make_target_variables_file
+                    if self.config.make_dump_database
+                    else None
+                ),
+            )
+
+    def run_make_database(
+        self, collect_mak: Path, cancel_event: Optional[threading.Event] = None
+    ) -> int:
+        """Run collect.mak and parse the database make prints meanwhile, without running any recipe.
+
+        The global variables are taken from the dump, expanded by make itself,
+        the database is only needed for the target and pattern specific variables.
+        The goal is the one of collect.mak, so make neither builds nor checks
+        any target of the legacy makefiles.
+        """
+        from MakeDatabase import MakeDatabase
+        from MakeVariablesDump import MakeVariablesDump
+
+        database = MakeDatabase(self.config.make_dump_selection)
+
+        def parse_line(line: str) -> None:
+            # the errors of make are part of the output
+            if "***" in line:
+                print(line, end="")
+            database.feed(line)
+
+        returncode = self.run_make(
+            [
+                "--print-data-base",
+                "--dry-run",
+                f"--file={collect_mak.absolute()}",
+                "collect",
+            ],
+            cancel_event,
+            parse_line,
         )
+        if returncode == 0 and self.make_dump_file.is_file():
+            with MakeVariablesDump(self.make_dump_file) as dump:
+                global_values = dump.to_dict()
+            database.to_target_variables_file(
+                self.make_target_variables_file, global_values
+            )
+            self.profiler.count(
+                "make targets with own variables", len(database.target_variables)
+            )
+        return returncode
+
+    def run_make(
+        self,
+        make_arguments: List[str],
+        cancel_event: Optional[threading.Event] = None,
+        output: Optional[Callable[[str], None]] = None,
+    ) -> int:
+        if os.name == "nt":
+            return self.run_collect_bat(make_arguments, cancel_event, output)
+        return self.run_collect_make(make_arguments, cancel_event, output)
 
+    def run_collect_bat(
+        self,
+        make_arguments: List[str],
+        cancel_event: Optional[threading.Event] = None,
+        output: Optional[Callable[[str], None]] = None,
+    ) -> int:
         collect_bat = self.variant_dir.joinpath("collect.bat")
         collect_bat.write_text(
             "\n".join(
                 [
                     "@echo on",
-                    "set THIS_DIR=%~dp0",
                     f"set MAKE_VARS_FILE={str(self.make_dump_file)}",
-                    f"pushd {self.config.input_dir / self.config.build_dir_rel}",
+                    *[
+                        f"set {name}={value}"
+                        for name, value in self.variant_environment().items()
+                    ],
+                    # escape make patterns like '%FLAGS' for the batch file
+                    "set MAKE_VARS_SELECTION="
+                    + " ".join(self.config.make_dump_selection).replace("%", "%%"),
+                    f"pushd {self.build_dir}",
                 ]
                 + self.config.batch_commands
                 + [
                     "@echo on",
                     "where make",
-                    "make --silent --file=%THIS_DIR%collect.mak collect",
+                    " ".join(["make", *make_arguments]),
+                    "set MAKE_EXIT_CODE=%ERRORLEVEL%",
                     "popd",
+                    "exit /b %MAKE_EXIT_CODE%",
                 ]
             )
         )
+        from pathlib import WindowsPath
 
-        collect_mak = self.variant_dir.joinpath("collect.mak")
-        shutil.copy(Path("src/collect.mak"), collect_mak)
+        return self.run_process(
+            [WindowsPath(collect_bat).absolute()], cancel_event, output
+        )
+
+    def run_collect_make(
+        self,
+        make_arguments: List[str],
+        cancel_event: Optional[threading.Event] = None,
+        output: Optional[Callable[[str], None]] = None,
+    ) -> int:
+        """Run make directly, the batch commands are only evaluated for setting environment variables."""
+        import re
+
+        env = {**os.environ, **self.variant_environment()}
+        for command in self.config.batch_commands:
+            match = re.match(
+                r'\s*set\s+"?([^=\s]+)=(.*?)"?\s*$', command, re.IGNORECASE
+            )
+            if match:
+                env[match.group(1)] = match.group(2)
+            else:
+                self.logger.warning(f"Ignoring batch command '{command}'.")
+        env["MAKE_VARS_FILE"] = str(self.make_dump_file.absolute())
+        env["MAKE_VARS_SELECTION"] = " ".join(self.config.make_dump_selection)
+        return self.run_process(
+            ["make", *make_arguments],
+            cancel_event,
+            output,
+            cwd=self.build_dir,
+            env=env,
+        )
+
+    @staticmethod
+    def run_process(
+        command: List,
+        cancel_event: Optional[threading.Event] = None,
+        output: Optional[Callable[[str], None]] = None,
+        **kwargs,
+    ) -> int:
+        """Run a process and return its exit code, its output is printed or passed line by line to `output`.
+
+        The process and all processes it started are killed as soon as the
+        cancel event is set, e.g. make started by cmd.exe running collect.bat.
+        Otherwise they would keep the output pipe open.
+        """
+        from concurrent.futures import CancelledError
+        import subprocess
+        import threading
+
+        # a process group of its own to kill the process tree at once
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            **kwargs,
+        )
+        finished = threading.Event()
+
+        def kill_on_cancel() -> None:
+            while not finished.is_set():
+                if cancel_event.wait(0.1):
+                    Transformer.kill_process_tree(process)
+                    return
+
+        if cancel_event:
+            threading.Thread(target=kill_on_cancel, daemon=True).start()
+        try:
+            for line in process.stdout:
+                if output:
+                    output(line)
+                else:
+                    print(line, end="")
+            returncode = process.wait()
+        finally:
+            finished.set()
+        # a process finishing successfully while being cancelled keeps its result
+        if returncode != 0 and cancel_event and cancel_event.is_set():
+            raise CancelledError(f"Cancelled {command[0]}.")
+        return returncode
+
+    @staticmethod
+    def kill_process_tree(process: subprocess.Popen) -> None:
+        import signal
+        import subprocess
 
-        subprocess.run([WindowsPath(collect_bat).absolute()])
+        if os.name == "nt":
+            subprocess.run(
+                ["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        else:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def variant_environment(self) -> Dict[str, str]:
+        """Environment variables telling the legacy makefiles which variant to collect.
+
+        They are set before the batch commands, so these can use or change them.
+        """
+        return {
+            "VARIANT": str(self.variant),
+            "FLAVOR": self.variant.flavor,
+            "SUBSYSTEM": self.variant.subsystem,
+        }
+
+    def create_make_dump_cache(self) -> Optional[MakeDumpCache]:
+        from MakeDumpCache import MakeDumpCache
+
+        if not self.config.make_dump_cache:
+            return None
+        return MakeDumpCache(
+            self.cache_dir,
+            self.build_dir,
+            self.make_dump_setup(),
+            self.config.sources_var,
+        )
+
+    def make_dump_setup(self) -> Dict:
+        """Everything besides the makefiles influencing the make variables dump."""
+        return {
+            "build_dir": str(self.build_dir.absolute()),
+            "variant": self.variant_environment(),
+            "batch_commands": self.config.batch_commands,
+            "variables": self.config.make_dump_selection,
+            "environment": {
+                name: os.environ.get(name)
+                for name in self.config.make_dump_cache_env_vars
+            },
+            "collect_mak": self.collect_mak_template.read_text(),
+            "database": self.config.make_dump_database,
+        }
 
     def create_variant_json(self, variant: Variant = None):
         if not variant:
             variant = self.config.variant
-        (self.config.output_dir / ".vscode").mkdir(parents=True, exist_ok=True)
-        file = Path(self.config.output_dir / ".vscode/cmake-variants.json")
-        if os.path.isfile(file):
-            with open(file, "r") as f:
-                data = json.loads(f.read())
-            with open(file, "w") as f:
-                new_entry = {f"{variant}": self.create_vs_code_variant_config(variant)}
-                data["variant"]["choices"].update(new_entry)
-                f.write(json.dumps(data, indent=2, sort_keys=True) + "\n")
-        else:
-            with open(file, "w") as f:
-                f.write(
-                    json.dumps(
-                        {
-                            "variant": {
-                                "default": f"{variant}",
-                                "choices": {
-                                    f"{variant}": self.create_vs_code_variant_config(
-                                        variant
-                                    )
-                                },
-                            }
-                        },
-                        indent=2,
-                        sort_keys=True,
-                    )
-                    + "\n"
-                )
+        self.create_variants_json([variant])
+
+    def create_variants_json(self, variants: List[Variant]) -> bool:
+        """Add all variants to the VS Code variants file with a single read and write.
+
+        The file is shared by all variants of the output directory, possibly
+        transformed by concurrent runs. It is updated under a lock and replaced
+        atomically, an unchanged file is not written. Returns whether the file
+        was written.
+        """
+        import json
+        from FileLock import FileLock
+
+        file = self.variants_json_file
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(file.with_name(f"{file.name}.lock")):
+            content = file.read_text() if file.is_file() else None
+            if content:
+                data = json.loads(content)
+            else:
+                data = {"variant": {"default": f"{variants[0]}", "choices": {}}}
+            choices = data["variant"]["choices"]
+            for variant in variants:
+                choices[f"{variant}"] = self.create_vs_code_variant_config(variant)
+            new_content = json.dumps(data, indent=2, sort_keys=True) + "\n"
+            if new_content == content:
+                return False
+            tmp_file = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+            tmp_file.write_text(new_content)
+            os.replace(tmp_file, file)
+            return True
 
     def create_vs_code_variant_config(self, variant: Variant):
         return {
@@ -250,41 +1102,156 @@ class Transformer:
         for todo in todos:
             print(f" - [ ] {todo}")
 
+        print("Profile:")
+        for stage in self.profiler.stages:
+            print(f" - {stage}")
+
     def add_execution_summary(self, description: str) -> None:
         self.execution_summary.append(description)
 
 
-def mirror_tree(dir_mirror_data: DirMirrorData) -> None:
-    robocopy_params = (
-        ["/PURGE", "/S"] if dir_mirror_data.mirror else ["/XC", "/XN", "/XO", "/S"]
-    )
-    subprocess.run(
-        ["robocopy", dir_mirror_data.source, dir_mirror_data.target]
-        + dir_mirror_data.patterns
-        + robocopy_params,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.STDOUT,
+def transform_variant(config: TransformerConfig, force: bool = False) -> Transformer:
+    """Worker entry point of the batch mode, runs the outdated variant specific stages."""
+    transformer = Transformer(config)
+    transformer.run_stage_graph(
+        transformer.create_stage_graph(shared_stages=False), force
     )
-    for p in Path(dir_mirror_data.target).glob("**/.dm"):
-        shutil.rmtree(p)
+    return transformer
+
+
+class BatchTransformer:
+    """Transforms several variants in one run.
+
+    Stages shared by all variants of an output directory run only once,
+    the variant specific stages run in parallel on a process pool. Like for
+    a single variant, up-to-date stages are skipped unless forced.
+    """
+
+    def __init__(
+        self, configs: List[TransformerConfig], jobs: int = 1, force: bool = False
+    ) -> None:
+        self.configs = configs
+        self.jobs = jobs
+        self.force = force
+
+    @property
+    def configs_per_output_dir(self) -> Dict[Path, List[TransformerConfig]]:
+        result: Dict[Path, List[TransformerConfig]] = {}
+        for config in self.configs:
+            result.setdefault(config.output_dir, []).append(config)
+        return result
+
+    def run(self) -> List[Transformer]:
+        shared_transformers = {
+            output_dir: Transformer(configs[0])
+            for output_dir, configs in self.configs_per_output_dir.items()
+        }
+        for transformer in shared_transformers.values():
+            transformer.check_input_dir()
+            transformer.run_stage_graph(
+                transformer.create_shared_stage_graph(), self.force
+            )
+        if self.jobs > 1 and len(self.configs) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                variant_transformers = list(
+                    executor.map(
+                        transform_variant,
+                        self.configs,
+                        [self.force] * len(self.configs),
+                    )
+                )
+        else:
+            variant_transformers = [
+                transform_variant(config, self.force) for config in self.configs
+            ]
+        for output_dir, configs in self.configs_per_output_dir.items():
+            shared_transformers[output_dir].create_variants_json(
+                [config.variant for config in configs]
+            )
+        for transformer in variant_transformers:
+            # report the shared stages together with the first variant of each output directory
+            shared_transformer = shared_transformers.pop(transformer.output_dir, None)
+            if shared_transformer:
+                transformer.execution_summary[:0] = shared_transformer.execution_summary
+                transformer.profiler.stages[:0] = shared_transformer.profiler.stages
+            transformer.print_execution_summary()
+        return variant_transformers
 
 
 def create_argument_parser(argv=None):
+    if {"-h", "--help"}.intersection(sys.argv[1:] if argv is None else argv):
+        # same output as docopt, without importing it
+        print(__doc__.strip("\n"))
+        sys.exit()
+    from docopt import docopt
+
     arguments = docopt(__doc__, argv)
     return arguments
 
 
 def main() -> int:
     arguments = create_argument_parser()
+    from TransformerConfig import TransformerConfig
+    from Variant import Variant
+
     if arguments["--config"]:
         config = TransformerConfig.from_json_file(Path(arguments["--config"]))
     else:
+        variants = [Variant.from_str(variant) for variant in arguments["--variant"]]
         config = TransformerConfig(
             Path(arguments["--source"]),
             Path(arguments["--target"]),
-            Variant.from_str(arguments["--variant"]),
+            variants[0],
+            variants=variants[1:],
         )
-    Transformer(config, arguments["--make-dump-file"]).run()
+    if arguments["--profile"] or arguments["--profile-trace"]:
+        config.profile_memory = True
+    if arguments["--watch"]:
+        if len(config.all_variants) > 1:
+            raise ValueError("Watching is only supported for a single variant.")
+        config = config.for_variant(config.variant)
+        from TransformerWatcher import TransformerWatcher
+
+        config_file = Path(arguments["--config"]) if arguments["--config"] else None
+        try:
+            TransformerWatcher(
+                config,
+                config_file,
+                arguments["--make-dump-file"],
+                float(arguments["--watch-interval"]),
+                arguments["--force"],
+            ).run()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if len(config.all_variants) == 1:
+        transformers = [
+            Transformer(
+                config.for_variant(config.variant), arguments["--make-dump-file"]
+            )
+        ]
+        transformers[0].run(arguments["--force"])
+    elif arguments["--make-dump-file"]:
+        raise ValueError("A make dump file can only be used for a single variant.")
+    else:
+        transformers = BatchTransformer(
+            [config.for_variant(variant) for variant in config.all_variants],
+            int(arguments["--jobs"]),
+            arguments["--force"],
+        ).run()
+    profiles = {
+        str(transformer.variant): transformer.profiler.stages
+        for transformer in transformers
+    }
+    if arguments["--profile"] or arguments["--profile-trace"]:
+        from StageProfiler import write_chrome_trace, write_profile
+
+    if arguments["--profile"]:
+        write_profile(profiles, Path(arguments["--profile"]))
+    if arguments["--profile-trace"]:
+        write_chrome_trace(profiles, Path(arguments["--profile-trace"]))
     return 0
 
 
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the transformer stages on a synthetic legacy project
+
+Usage:
+  benchmark.py [--size=<size>] [--repeat=<repeat>] [--work-dir=<work_dir>] [--baseline=<baseline_file>] [--threshold=<threshold>] [--save-baseline]
+  benchmark.py (-h | --help)
+
+Options:
+  -h --help                 Show this screen.
+  --size=SIZE               Size of the synthetic project: small, medium or large [default: medium]
+  --repeat=N                Number of runs per stage, the fastest one counts [default: 3]
+  --work-dir=DIR            Directory for the synthetic project and the results [default: output/benchmark]
+  --baseline=FILE           Results to compare with, stored per project size [default: output/benchmark/baseline.json]
+  --threshold=RATIO         Allowed slowdown of a stage compared to the baseline [default: 0.25]
+  --save-baseline           Store the results as new baseline for the project size
+"""
+
+import contextlib
+from dataclasses import dataclass
+import io
+import json
+import platform
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+from docopt import docopt
+
+from synthetic_project import SyntheticProject
+from file_generators import LegacyPartsCMakeGenerator, VariantPartsCMakeGenerator
+from LegacyBuildSystem import LegacyBuildSystem
+from LibraryScanner import LibraryScanner
+from MakeVariablesIndex import MakeVariablesIndex
+from PathSearchAndReplace import PathSearchAndReplace
+from SourceValidator import SourceValidator
+from StageProfiler import StageProfiler
+from SubdirReplacement import SubdirReplacement
+from transformer import Transformer
+from TransformerConfig import DirMirrorData, TransformerConfig
+from TreeMirror import TreeMirror
+from Variant import Variant
+
+# stages faster than this are not reported as regression, the differences are mostly noise
+MIN_REGRESSION_SECONDS = 0.01
+
+
+@dataclass
+class BenchmarkStage:
+    name: str
+    function: Callable[[], object]
+    # called before each run without being measured
+    setup: Optional[Callable[[], None]] = None
+
+
+class Benchmark:
+    def __init__(self, project: SyntheticProject, work_dir: Path, repeat: int) -> None:
+        self.project = project
+        self.work_dir = work_dir
+        self.repeat = repeat
+
+    @property
+    def project_dir(self) -> Path:
+        return self.work_dir / "project"
+
+    @property
+    def output_dir(self) -> Path:
+        return self.work_dir / "transformed"
+
+    @property
+    def make_dump_file(self) -> Path:
+        return self.work_dir / "make_vars.txt"
+
+    def config(self) -> TransformerConfig:
+        return TransformerConfig(
+            self.project_dir.absolute(),
+            self.output_dir.absolute(),
+            Variant("FLV", "SUB"),
+            subdir_replacements=[
+                SubdirReplacement(
+                    self.project.component_dir(component), f"${{COMP_{component}}}"
+                )
+                for component in range(0, self.project.components, 2)
+            ],
+            make_dump_cache=False,
+        )
+
+    def legacy_build_system(self) -> LegacyBuildSystem:
+        return LegacyBuildSystem(self.make_dump_file, self.config())
+
+    def parse_make_dump(self) -> None:
+        with self.legacy_build_system() as legacy_build_system:
+            legacy_build_system.get_source_paths()
+
+    def generate_project(self) -> None:
+        shutil.rmtree(self.project_dir, ignore_errors=True)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.project.generate(self.project_dir)
+        self.make_dump_file.write_text(self.project.make_dump())
+
+    def remove_make_dump_index(self) -> None:
+        MakeVariablesIndex.index_file_for(self.make_dump_file).unlink(missing_ok=True)
+
+    def remove_output(self) -> None:
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        self.output_dir.joinpath("variants/FLV/SUB").mkdir(parents=True)
+
+    def stages(self) -> List[BenchmarkStage]:
+        legacy_build_system = self.legacy_build_system()
+        sources = legacy_build_system.get_source_paths()
+        include_paths = legacy_build_system.get_include_paths()
+        # the values read are kept, the index file gets removed by the stages below
+        legacy_build_system.close()
+        config = self.config()
+        mirror_data = DirMirrorData(
+            self.project_dir / "Impl/Src", self.output_dir / "mirror"
+        )
+        stages = []
+        if shutil.which("make"):
+            stages.append(
+                BenchmarkStage(
+                    "make variables dump",
+                    lambda: Transformer(
+                        config
+                    ).create_legacy_make_variables_dump_file(),
+                    self.remove_output,
+                )
+            )
+        stages.extend(
+            [
+                BenchmarkStage(
+                    "parse make dump",
+                    self.parse_make_dump,
+                    self.remove_make_dump_index,
+                ),
+                BenchmarkStage(
+                    "parse make dump (indexed)",
+                    self.parse_make_dump,
+                ),
+                BenchmarkStage(
+                    "relativize paths",
+                    lambda: legacy_build_system.relativize_paths(
+                        legacy_build_system.extract_source_paths(
+                            legacy_build_system.get_variable(config.sources_var)
+                        )
+                    ),
+                ),
+                BenchmarkStage(
+                    "replace paths",
+                    lambda: PathSearchAndReplace(
+                        config.subdir_replacements + [SubdirReplacement("/", "src")]
+                    ).replace_many(sources),
+                ),
+                BenchmarkStage(
+                    "generate cmake",
+                    lambda: (
+                        VariantPartsCMakeGenerator(
+                            include_paths, [], config.subdir_replacements
+                        ).to_string(),
+                        LegacyPartsCMakeGenerator(
+                            sources, config.subdir_replacements
+                        ).to_string(),
+                    ),
+                ),
+                BenchmarkStage(
+                    "validate sources",
+                    lambda: SourceValidator(
+                        legacy_build_system.sources_dir, config.source_extensions
+                    ).validate(
+                        legacy_build_system.get_source_files(),
+                        legacy_build_system.get_include_dirs(),
+                    ),
+                ),
+                BenchmarkStage(
+                    "third party libs",
+                    lambda: LibraryScanner(
+                        legacy_build_system.third_party_dir,
+                        config.third_party_lib_extensions,
+                    ).find(),
+                ),
+                BenchmarkStage(
+                    "mirror directories",
+                    lambda: TreeMirror(mirror_data).run(),
+                    self.remove_output,
+                ),
+                BenchmarkStage(
+                    "mirror directories (incremental)",
+                    lambda: TreeMirror(mirror_data).run(),
+                ),
+                BenchmarkStage("transform", self.transform, self.remove_output),
+            ]
+        )
+        return stages
+
+    def transform(self) -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            Transformer(self.config(), str(self.make_dump_file)).run()
+
+    def run(self) -> Dict[str, float]:
+        """Fastest wall time of each stage in seconds."""
+        start = time.perf_counter()
+        self.generate_project()
+        print(f"Generated synthetic project in {time.perf_counter() - start:.1f}s")
+        results = {}
+        for stage in self.stages():
+            profiler = StageProfiler()
+            for _ in range(self.repeat):
+                if stage.setup:
+                    stage.setup()
+                with profiler.stage(stage.name):
+                    stage.function()
+            results[stage.name] = min(profile.wall_time for profile in profiler.stages)
+        return results
+
+
+def compare(
+    results: Dict[str, float], baseline: Dict[str, float], threshold: float
+) -> List[str]:
+    """Print the results next to the baseline and return the regressed stages."""
+    regressions = []
+    print(f"{'stage':<35}{'time [s]':>12}{'baseline [s]':>14}{'change':>10}")
+    for name, duration in results.items():
+        baseline_duration = baseline.get(name)
+        if baseline_duration is None:
+            print(f"{name:<35}{duration:>12.3f}{'-':>14}{'-':>10}")
+            continue
+        change = duration / baseline_duration - 1 if baseline_duration else 0.0
+        regressed = (
+            change > threshold and duration - baseline_duration > MIN_REGRESSION_SECONDS
+        )
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<35}{duration:>12.3f}{baseline_duration:>14.3f}{change:>+10.0%}"
+            + (" REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    arguments = docopt(__doc__)
+    size = arguments["--size"]
+    work_dir = Path(arguments["--work-dir"])
+    baseline_file = Path(arguments["--baseline"])
+    results = Benchmark(
+        SyntheticProject.preset(size), work_dir / size, int(arguments["--repeat"])
+    ).run()
+
+    record = {
+        "commit": current_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size": size,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": results,
+    }
+    # the history allows to track the results across commits
+    with open(work_dir / "history.jsonl", "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    baselines = json.loads(baseline_file.read_text()) if baseline_file.is_file() else {}
+    regressions = compare(
+        results,
+        baselines.get(size, {}).get("stages", {}),
+        float(arguments["--threshold"]),
+    )
+    if arguments["--save-baseline"]:
+        baselines[size] = record
+        baseline_file.parent.mkdir(parents=True, exist_ok=True)
+        baseline_file.write_text(json.dumps(baselines, indent=2))
+        print(f"Saved baseline to {baseline_file}")
+    elif regressions:
+        print(f"Regressions compared to {baseline_file}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
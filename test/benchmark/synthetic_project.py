@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+
+@dataclass
+class SyntheticProject:
+    """Generates a legacy make project of configurable size.
+
+    The project has the same layout as the test projects in test/data:
+    components with sources and an include directory below Impl/Src, a makefile
+    in Impl/Bld and libraries between lots of other files in ThirdParty.
+    Besides the makefile, a make variables dump can be generated directly,
+    so the stages after collecting the make variables can run without make.
+    """
+
+    components: int = 10
+    sources_per_component: int = 5
+    headers_per_component: int = 2
+    third_party_dirs: int = 5
+    third_party_libs_per_dir: int = 2
+    third_party_files_per_dir: int = 20
+    # additional make variables to get a dump of realistic size
+    filler_variables: int = 100
+
+    @classmethod
+    def preset(cls, size: str) -> "SyntheticProject":
+        return {
+            "small": cls(),
+            "medium": cls(
+                components=100,
+                sources_per_component=20,
+                headers_per_component=5,
+                third_party_dirs=50,
+                third_party_libs_per_dir=2,
+                third_party_files_per_dir=100,
+                filler_variables=5_000,
+            ),
+            "large": cls(
+                components=500,
+                sources_per_component=40,
+                headers_per_component=10,
+                third_party_dirs=500,
+                third_party_libs_per_dir=2,
+                third_party_files_per_dir=200,
+                filler_variables=20_000,
+            ),
+        }[size]
+
+    def component_dir(self, component: int) -> str:
+        return f"comp_{component:04d}"
+
+    def sources(self) -> List[str]:
+        """Source paths relative to the build directory."""
+        return [
+            f"../Src/{self.component_dir(component)}/src_{source:04d}.c"
+            for component in range(self.components)
+            for source in range(self.sources_per_component)
+        ]
+
+    def include_paths(self) -> List[str]:
+        """Include paths relative to the build directory."""
+        return [
+            f"../Src/{self.component_dir(component)}/inc"
+            for component in range(self.components)
+        ]
+
+    def generate(self, project_dir: Path) -> None:
+        sources_dir = project_dir / "Impl/Src"
+        for component in range(self.components):
+            component_dir = sources_dir / self.component_dir(component)
+            component_dir.joinpath("inc").mkdir(parents=True, exist_ok=True)
+            for source in range(self.sources_per_component):
+                component_dir.joinpath(f"src_{source:04d}.c").write_text(
+                    f'#include "header_0000.h"\n\nint f_{component}_{source}(void) {{ return {source}; }}\n'
+                )
+            for header in range(self.headers_per_component):
+                component_dir.joinpath(f"inc/header_{header:04d}.h").write_text(
+                    f"int f_{component}_{header}(void);\n"
+                )
+        third_party_dir = project_dir / "ThirdParty"
+        for directory in range(self.third_party_dirs):
+            lib_dir = third_party_dir / f"vendor_{directory % 10}/sdk_{directory:04d}"
+            lib_dir.joinpath("include").mkdir(parents=True, exist_ok=True)
+            for lib in range(self.third_party_libs_per_dir):
+                lib_dir.joinpath(f"lib{lib}.a" if lib % 2 else f"lib{lib}.lib").touch()
+            for file in range(self.third_party_files_per_dir):
+                lib_dir.joinpath(f"include/file_{file:04d}.h").touch()
+        build_dir = project_dir / "Impl/Bld"
+        build_dir.mkdir(parents=True, exist_ok=True)
+        build_dir.joinpath("makefile").write_text(self.makefile())
+
+    def makefile(self) -> str:
+        lines = [
+            f"VAR_{index:05d} = {self.filler_value(index)}"
+            for index in range(self.filler_variables)
+        ]
+        lines.extend(
+            f"CPPFLAGS_INC_LIST += -I{include_path}"
+            for include_path in self.include_paths()
+        )
+        lines.extend(f"VC_SRC_LIST += {source}" for source in self.sources())
+        lines.append("")
+        return "\n".join(lines)
+
+    def make_dump(self) -> str:
+        """Content of the make variables dump as written by collect.mak."""
+        lines = [
+            "MAKEFILE_LIST = makefile",
+            "CPPFLAGS_INC_LIST = "
+            + " ".join(f"-I{include_path}" for include_path in self.include_paths()),
+            "VC_SRC_LIST = " + " ".join(self.sources()),
+        ]
+        lines.extend(
+            f"VAR_{index:05d} = {self.filler_value(index)}"
+            for index in range(self.filler_variables)
+        )
+        lines.append("")
+        return "\n".join(lines)
+
+    @staticmethod
+    def filler_value(index: int) -> str:
+        return " ".join(f"-DDEFINE_{index}_{define}=1" for define in range(10))
@@ -0,0 +1,43 @@
+from CompileFlags import CompileFlags, group_options, split_flags
+
+
+def test_parse():
+    flags = CompileFlags.parse(
+        r"-DKARSTEN -D MATTHIAS=1 -O2 -c -o main.o -I..\inc -I ../src "
+        r'-DMATTHIAS=2 -O2 -cpu=rh850 "-DNAME=a b" -include "my config.h"'
+    )
+
+    assert flags.definitions == ["KARSTEN", "MATTHIAS=2", "NAME=a b"]
+    assert flags.options == ["-O2", "-cpu=rh850", 'SHELL:-include "my config.h"']
+    assert not CompileFlags.parse(None)
+    assert not CompileFlags.parse("-c -I../inc")
+
+
+def test_difference():
+    target_flags = CompileFlags.parse("-DA -DB=2 -O0 -g")
+    global_flags = CompileFlags.parse("-DA -DB=1 -O2 -g")
+
+    assert target_flags.difference(global_flags) == CompileFlags(["B=2"], ["-O0"])
+
+
+def test_missing():
+    target_flags = CompileFlags.parse("-DB=2 -O3")
+    global_flags = CompileFlags.parse("-DA -DB=1 -O2 -g")
+
+    assert target_flags.missing(global_flags) == CompileFlags(["A"], ["-O2", "-g"])
+    assert str(target_flags.missing(global_flags)) == "-DA -O2 -g"
+    # appended flags keep the global ones, a definition only changes its value
+    assert not CompileFlags.parse("-DA -DB=2 -O2 -g -O0").missing(global_flags)
+
+
+def test_split_flags():
+    assert split_flags(r"  -Ic:\legacy\inc -DX=\"s\"  -Wall ") == [
+        r"-Ic:\legacy\inc",
+        r"-DX=\"s\"",
+        "-Wall",
+    ]
+    assert list(group_options(["-Xlinker", "-Map", "-T", "Cfg/Linker.ld", "-lm"])) == [
+        "SHELL:-Xlinker -Map",
+        "SHELL:-T Cfg/Linker.ld",
+        "-lm",
+    ]
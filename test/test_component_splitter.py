@@ -0,0 +1,52 @@
+from pathlib import Path
+
+from ComponentSplitter import ComponentSplitter
+from TransformerConfig import ComponentRule
+
+SOURCES = [
+    Path("main.c"),
+    Path("app/io/uart.c"),
+    Path("app/io/spi/spi.c"),
+    Path("app/main_loop.c"),
+    Path("lib-ext/crc/crc.c"),
+    Path("app/io/can.c"),
+]
+
+
+def test_split_by_depth():
+    components = ComponentSplitter(2, []).split(SOURCES)
+
+    assert components == {
+        "app": [Path("app/main_loop.c")],
+        "app_io": [
+            Path("app/io/uart.c"),
+            Path("app/io/spi/spi.c"),
+            Path("app/io/can.c"),
+        ],
+        "lib_ext_crc": [Path("lib-ext/crc/crc.c")],
+        "root": [Path("main.c")],
+    }
+
+
+def test_split_by_rules():
+    rules = [ComponentRule("app/io/spi", "spi"), ComponentRule("app", "application")]
+
+    components = ComponentSplitter(1, rules).split(SOURCES)
+
+    assert components == {
+        "application": [
+            Path("app/io/uart.c"),
+            Path("app/main_loop.c"),
+            Path("app/io/can.c"),
+        ],
+        "lib_ext": [Path("lib-ext/crc/crc.c")],
+        "root": [Path("main.c")],
+        "spi": [Path("app/io/spi/spi.c")],
+    }
+
+
+def test_split_by_rules_only():
+    components = ComponentSplitter(0, [ComponentRule("lib-ext", "ext")]).split(SOURCES)
+
+    assert list(components) == ["ext", "root"]
+    assert len(components["root"]) == 5
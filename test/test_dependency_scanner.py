@@ -0,0 +1,103 @@
+import json
+import os
+from pathlib import Path
+
+from DependencyScanner import DependencyGraph, DependencyScanner, scan_file
+
+
+def write_file(file: Path, content: str, mtime_ns: int = 1_000_000_000) -> None:
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_text(content)
+    os.utime(file, ns=(mtime_ns, mtime_ns))
+
+
+def test_scan_file(tmp_path: Path):
+    write_file(
+        tmp_path / "main.c",
+        '#include "a.h"\n  #  include <sys/b.h>\n// #include "c.h"\n#define X 1\n',
+    )
+    write_file(tmp_path / "empty.h", "")
+
+    assert scan_file(str(tmp_path / "main.c")) == [(True, "a.h"), (False, "sys/b.h")]
+    assert scan_file(str(tmp_path / "empty.h")) == []
+    assert scan_file(str(tmp_path / "missing.h")) == []
+
+
+def test_cache_invalidated_per_file(tmp_path: Path):
+    src_dir = tmp_path / "src"
+    write_file(src_dir / "main.c", '#include "a.h"\n')
+    write_file(src_dir / "a.h", "#include <b.h>\n")
+    write_file(src_dir / "readme.txt", '#include "ignored.h"\n')
+    cache_file = tmp_path / "cache/includes.json"
+
+    scanner = DependencyScanner(src_dir, [".c", ".h"], cache_file)
+    files = scanner.scan()
+    assert sorted(files) == [str(src_dir / "a.h"), str(src_dir / "main.c")]
+    assert scanner.scanned_files == 2
+    assert cache_file.exists()
+
+    scanner = DependencyScanner(src_dir, [".c", ".h"], cache_file)
+    scanner.scan()
+    assert scanner.scanned_files == 0
+    assert scanner.includes_of(str(src_dir / "main.c")) == [(True, "a.h")]
+
+    # same size, only the modification time changed
+    write_file(src_dir / "a.h", "#include <c.h>\n", mtime_ns=2_000_000_000)
+    scanner = DependencyScanner(src_dir, [".c", ".h"], cache_file)
+    scanner.scan()
+    assert scanner.scanned_files == 1
+    assert scanner.includes_of(str(src_dir / "a.h")) == [(False, "c.h")]
+
+    # other settings invalidate the whole cache
+    scanner = DependencyScanner(src_dir, [".c"], cache_file)
+    scanner.scan()
+    assert scanner.scanned_files == 1
+
+
+def test_scan_in_parallel(tmp_path: Path):
+    for index in range(DependencyScanner.min_parallel_files):
+        write_file(
+            tmp_path / f"dir{index % 7}/file{index}.c", f"#include <h{index}.h>\n"
+        )
+
+    scanner = DependencyScanner(tmp_path, [".c"], max_workers=2)
+    files = scanner.scan()
+
+    assert len(files) == DependencyScanner.min_parallel_files
+    assert files[str(tmp_path / "dir3/file10.c")][2] == [(False, "h10.h")]
+    # files outside of the root directory are scanned on demand
+    write_file(tmp_path.parent / f"{tmp_path.name}_other.h", '#include "x.h"\n')
+    assert scanner.includes_of(str(tmp_path.parent / f"{tmp_path.name}_other.h")) == [
+        (True, "x.h")
+    ]
+
+
+def test_dependency_graph(tmp_path: Path):
+    root = str(tmp_path)
+    graph = DependencyGraph(
+        {
+            os.path.join(root, "a.c"): [os.path.join(root, "common.h")],
+            os.path.join(root, "b.c"): [
+                os.path.join(root, "util.h"),
+                os.path.join(root, "common.h"),
+            ],
+            os.path.join(root, "util.h"): [os.path.join(root, "common.h")],
+            os.path.join(root, "common.h"): ["/usr/include/types.h"],
+        }
+    )
+
+    assert graph.fan_in([os.path.join(root, "a.c"), os.path.join(root, "b.c")]) == {
+        "/usr/include/types.h": 2,
+        os.path.join(root, "common.h"): 2,
+        os.path.join(root, "util.h"): 1,
+    }
+
+    graph.to_json(tmp_path / "out/dependencies.json", tmp_path)
+    assert json.loads((tmp_path / "out/dependencies.json").read_text())["b.c"] == [
+        "util.h",
+        "common.h",
+    ]
+    graph.to_dot(tmp_path / "out/dependencies.dot", tmp_path)
+    dot = (tmp_path / "out/dependencies.dot").read_text()
+    assert dot.startswith("digraph includes {\n")
+    assert '  "common.h" -> "/usr/include/types.h";\n' in dot
@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+import threading
+import time
+
+import pytest
+from FileLock import FileLock
+
+
+def test_lock_is_exclusive(tmp_path: Path):
+    lock_file = tmp_path / "file.lock"
+    counter = tmp_path / "counter.txt"
+    counter.write_text("0")
+
+    def increment() -> None:
+        for _ in range(20):
+            with FileLock(lock_file):
+                counter.write_text(str(int(counter.read_text()) + 1))
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.read_text() == "80"
+    assert not lock_file.exists()
+
+
+def test_lock_timeout(tmp_path: Path):
+    lock_file = tmp_path / "file.lock"
+    with FileLock(lock_file):
+        with pytest.raises(TimeoutError):
+            FileLock(lock_file, timeout=0.1).acquire()
+
+
+def test_stale_lock_is_removed(tmp_path: Path):
+    lock_file = tmp_path / "file.lock"
+    lock_file.write_text("12345 token")
+    old_time = time.time() - 600
+    os.utime(lock_file, (old_time, old_time))
+
+    with FileLock(lock_file, timeout=1) as lock:
+        assert lock_file.read_text() == lock.owner
+        assert lock.owner.startswith(f"{os.getpid()} ")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_lock_taken_while_removing_stale_lock_is_kept(tmp_path: Path, monkeypatch):
+    lock_file = tmp_path / "file.lock"
+    lock_file.write_text("12345 token")
+    old_time = time.time() - 600
+    os.utime(lock_file, (old_time, old_time))
+    open_file = os.open
+
+    def take_lock_and_open(path, *args) -> int:
+        # another process took over the stale lock in the meantime
+        lock_file.unlink()
+        lock_file.write_text("54321 other")
+        return open_file(path, *args)
+
+    monkeypatch.setattr(os, "open", take_lock_and_open)
+    FileLock(lock_file).remove_stale_lock()
+
+    assert lock_file.read_text() == "54321 other"
+    assert list(tmp_path.iterdir()) == [lock_file]
+
+
+def test_release_keeps_the_lock_of_another_process(tmp_path: Path):
+    lock_file = tmp_path / "file.lock"
+    lock = FileLock(lock_file)
+    lock.acquire()
+    # the lock was taken over as stale and taken by another process
+    lock_file.write_text("54321 other")
+
+    lock.release()
+
+    assert lock_file.read_text() == "54321 other"
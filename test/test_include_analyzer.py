@@ -0,0 +1,99 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from DependencyScanner import DependencyScanner
+from IncludeAnalyzer import HeaderIndex, IncludeAnalyzer
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    files = {
+        "src/app/main.c": '#include "local.h"\n#include <api.h>\n  #  include "sub/deep.h"\n#include <stdio.h>\n',
+        "src/app/local.h": '#ifdef SHADOW\n#include "shadow.h"\n#endif\n',
+        "src/lib/lib.c": "#include <api.h>\n",
+        "inc1/api.h": "",
+        "inc1/shadow.h": "",
+        "inc2/sub/deep.h": '#include "../../inc3/other.h"\n',
+        "inc3/shadow.h": "",
+        "inc3/other.h": "",
+        "dead/api.h": "",
+    }
+    for name, content in files.items():
+        tmp_path.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.joinpath(name).write_text(content)
+    return tmp_path
+
+
+def analyze(project_dir: Path, components: Dict[str, List[str]] = None):
+    include_dirs = [
+        str(project_dir / name) for name in ["inc1", "inc2", "inc3", "dead", "missing"]
+    ]
+    sources = [str(project_dir / "src/app/main.c"), str(project_dir / "src/lib/lib.c")]
+    analyzer = IncludeAnalyzer(
+        include_dirs,
+        HeaderIndex([str(project_dir)]),
+        DependencyScanner(project_dir / "src", [".c", ".h"]),
+    )
+    return analyzer.analyze(sources, components)
+
+
+def test_used_include_paths(project_dir: Path):
+    report = analyze(project_dir)
+
+    assert report.used == {str(project_dir / "inc1"): 3, str(project_dir / "inc2"): 1}
+    assert report.unused == [
+        str(project_dir / name) for name in ["inc3", "dead", "missing"]
+    ]
+    assert report.unresolved == {"stdio.h": 1}
+    assert report.sources == 2
+    # local.h, api.h, shadow.h, deep.h and other.h
+    assert report.headers == 5
+    assert report.includes == 7
+    assert str(report).startswith("Analyzed 7 includes of 2 sources and 5 headers")
+    assert report.fan_in[os.path.normcase(str(project_dir / "inc1/api.h"))] == 2
+
+
+def test_include_paths_per_component(project_dir: Path, tmp_path: Path):
+    report = analyze(
+        project_dir,
+        {
+            "app": [str(project_dir / "src/app/main.c")],
+            "lib": [str(project_dir / "src/lib/lib.c")],
+        },
+    )
+
+    assert report.components == {
+        "app": [str(project_dir / "inc1"), str(project_dir / "inc2")],
+        "lib": [str(project_dir / "inc1")],
+    }
+    report.to_file(tmp_path / "report.json")
+    assert json.loads(tmp_path.joinpath("report.json").read_text())["unused"] == [
+        str(project_dir / name) for name in ["inc3", "dead", "missing"]
+    ]
+
+
+def test_header_index(project_dir: Path):
+    index = HeaderIndex([str(project_dir), str(project_dir / "inc2")])
+
+    assert index.resolve(str(project_dir / "inc2"), "sub/deep.h") == os.path.normcase(
+        str(project_dir / "inc2/sub/deep.h")
+    )
+    assert index.resolve(str(project_dir / "inc2"), "deep.h") is None
+    assert index.resolve(str(project_dir / "inc1"), "../inc3/other.h") is not None
+
+
+def test_header_index_mixed_case_directory(tmp_path: Path, monkeypatch):
+    tmp_path.joinpath("inc/Sub").mkdir(parents=True)
+    tmp_path.joinpath("inc/Sub/Deep.h").write_text("")
+    # file names are compared lower-case on Windows
+    monkeypatch.setattr(os.path, "normcase", lambda path: path.lower())
+
+    index = HeaderIndex([str(tmp_path)])
+
+    assert (
+        index.resolve(str(tmp_path / "inc"), "Sub/Deep.h")
+        == str(tmp_path / "inc/sub/deep.h").lower()
+    )
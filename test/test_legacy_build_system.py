@@ -1,6 +1,7 @@
 from pathlib import Path
 
 import pytest
+from CompileFlags import CompileFlags
 from LegacyBuildSystem import LegacyBuildSystem
 from TransformerConfig import TransformerConfig
 
@@ -76,6 +77,28 @@ def test_get_sources():
     ]
 
 
+def test_relativize_paths():
+    config = TransformerConfig(Path("X:/in"), Path("X:/out"), "my/var")
+    config.build_dir_rel = "Impl/Bld"
+    config.source_dir_rel = "Impl/Src"
+    legacy_build = LegacyBuildSystem("", config)
+    assert legacy_build.relativize_paths(
+        [
+            "../Src/main.c",
+            "../Src/../Src/component_a/component_a.c",
+            "../Src/component_a/./component_b.c",
+            "../Src",
+            "../../ThirdParty/lib.h",
+        ]
+    ) == [
+        Path("main.c"),
+        Path("component_a/component_a.c"),
+        Path("component_a/component_b.c"),
+        Path("."),
+        Path("ThirdParty/lib.h"),
+    ]
+
+
 def test_get_thirdparty_libs(tmp_path):
     third_party_dir = tmp_path / "ThirdParty"
     third_party_dir.mkdir()
@@ -88,3 +111,74 @@ def test_get_thirdparty_libs(tmp_path):
     assert LegacyBuildSystem(
         "", config=TransformerConfig(tmp_path, Path("X:/out"), "my/var")
     ).get_thirdparty_libs() == [Path("lib1.a"), Path("subdir/lib2.lib")]
+
+
+def test_get_flags():
+    make_var_dump = "\n".join(
+        [
+            "VC_SRC_LIST = ../Src/main.c ../Src/component_a/component_a.c ../Src/startup.s",
+            "CCFLAGS = -DKARSTEN -DMATTHIAS -O2",
+            "TARGETFLAGS = -DALEXANDER -O2",
+            "ASMFLAGS = -DFoo",
+            "LDFLAGS = -Dp=../Bin/blablub -T Cfg/Linker.ld",
+        ]
+    )
+    config = TransformerConfig(Path("X:/in"), Path("X:/out"), "my/var")
+    config.compile_flags_vars = ["CCFLAGS", "TARGETFLAGS"]
+    config.asm_flags_vars = ["ASMFLAGS"]
+    config.link_flags_vars = ["LDFLAGS"]
+    legacy_build = LegacyBuildSystem(
+        make_var_dump,
+        config,
+        target_variables={
+            # object in the build directory, matched by name
+            "obj/main.o": {"CCFLAGS": "-DKARSTEN -DMATTHIAS -O0 -DDEBUG"},
+            # matched by path
+            "../Src/startup.o": {"ASMFLAGS": "-DFoo -DBar"},
+            "../Src/component_a/component_a.o": {"OTHER": "value"},
+            "unknown.o": {"CCFLAGS": "-DUNKNOWN"},
+        },
+    )
+
+    assert legacy_build.get_compile_flags() == CompileFlags(
+        ["KARSTEN", "MATTHIAS", "ALEXANDER"], ["-O2"]
+    )
+    assert legacy_build.get_asm_flags() == CompileFlags(["Foo"])
+    assert legacy_build.get_link_options() == [
+        "-Dp=../Bin/blablub",
+        "SHELL:-T Cfg/Linker.ld",
+    ]
+    assert legacy_build.get_source_compile_flags() == {
+        Path("main.c"): CompileFlags(["DEBUG"], ["-O0"]),
+        Path("startup.s"): CompileFlags(["Bar"]),
+    }
+
+
+def test_get_source_compile_flags_warns_about_removed_flags(caplog):
+    make_var_dump = "\n".join(
+        [
+            "VC_SRC_LIST = ../Src/main.c ../Src/fast_a.c ../Src/fast_b.c",
+            "CCFLAGS = -DKARSTEN -O2",
+        ]
+    )
+    config = TransformerConfig(Path("X:/in"), Path("X:/out"), "my/var")
+    config.compile_flags_vars = ["CCFLAGS"]
+    legacy_build = LegacyBuildSystem(
+        make_var_dump,
+        config,
+        target_variables={
+            # 'fast_%.o: CCFLAGS := -O3' replaces the global flags
+            "fast_%.o": {"CCFLAGS": "-O3"},
+            # appended flags keep the global ones
+            "fast_b.o": {"CCFLAGS": "-DKARSTEN -O2 -DB"},
+        },
+    )
+
+    assert legacy_build.get_source_compile_flags() == {
+        Path("fast_a.c"): CompileFlags([], ["-O3"]),
+        Path("fast_b.c"): CompileFlags(["B"]),
+    }
+    assert [record.getMessage() for record in caplog.records] == [
+        "The target variables of fast_a.c remove the flags '-DKARSTEN -O2', "
+        "CMake still applies them as global flags."
+    ]
@@ -1,6 +1,6 @@
 import textwrap
 
-from file_generators import LegacyCMakeListsGenerator
+from file_generators import LegacyCMakeListsGenerator, LegacyComponentsCMakeGenerator
 
 
 def test_to_string():
@@ -13,3 +13,15 @@ def test_to_string():
         """
     )
     assert generator.to_string() == expected_output
+
+
+def test_components_to_string():
+    generator = LegacyComponentsCMakeGenerator(["app_io", "root"])
+    expected_output = textwrap.dedent(
+        """\
+        # Generated by Transformer
+        spl_add_component(legacy/components/app_io)
+        spl_add_component(legacy/components/root)
+        """
+    )
+    assert generator.to_string() == expected_output
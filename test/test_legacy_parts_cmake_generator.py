@@ -1,6 +1,8 @@
+import os
 import textwrap
 import pytest
 from pathlib import Path
+from CompileFlags import CompileFlags
 from SubdirReplacement import SubdirReplacement
 
 from file_generators import LegacyPartsCMakeGenerator
@@ -21,6 +23,22 @@ def test_to_file(generator, tmp_path):
         assert f.read() == generator.to_string()
 
 
+def test_to_file_only_writes_changes(generator, tmp_path):
+    file_path = tmp_path / "parts.cmake"
+    assert generator.to_file(file_path)
+    mtime_ns = 1_000_000_000
+    os.utime(file_path, ns=(mtime_ns, mtime_ns))
+
+    assert not generator.to_file(file_path)
+    assert file_path.stat().st_mtime_ns == mtime_ns
+    assert list(tmp_path.iterdir()) == [file_path]
+
+    generator.sources.append(Path("path/to/source3.c"))
+    assert generator.to_file(file_path)
+    assert file_path.stat().st_mtime_ns != mtime_ns
+    assert file_path.read_text() == generator.to_string()
+
+
 def test_to_string(generator: LegacyPartsCMakeGenerator):
     generator.subdir_extra_replacements = [
         SubdirReplacement("TO_BE_REPLACED", "${NEW}")
@@ -33,3 +51,44 @@ def test_to_string(generator: LegacyPartsCMakeGenerator):
         """
     )
     assert generator.to_string() == expected_output
+
+
+def test_to_string_with_source_flags():
+    sources = [Path("to/source1.c"), Path("to/source2.c")]
+    generator = LegacyPartsCMakeGenerator(
+        sources,
+        source_flags={Path("to/source2.c"): CompileFlags(["A", "B=1"], ["-O0"])},
+    )
+    assert generator.to_string() == textwrap.dedent(
+        """\
+        # Generated by Transformer
+        spl_add_source(src/to/source1.c)
+        spl_add_source(src/to/source2.c)
+        set_source_files_properties(${CMAKE_CURRENT_LIST_DIR}/src/to/source2.c PROPERTIES
+            COMPILE_DEFINITIONS "A;B=1"
+            COMPILE_OPTIONS -O0
+        )
+        """
+    )
+
+
+def test_source_properties_use_the_path_of_spl_add_source():
+    sources = [Path("to/source1.c"), Path("comp/source2.c")]
+    generator = LegacyPartsCMakeGenerator(
+        sources,
+        [SubdirReplacement("comp", "${PROJECT_SOURCE_DIR}/comp")],
+        source_flags={source: CompileFlags(["A"]) for source in sources},
+    )
+    lines = generator.to_string().splitlines()
+
+    added = [line[len("spl_add_source(") : -1] for line in lines[1:3]]
+    properties = [
+        line[len("set_source_files_properties(") : -len(" PROPERTIES")]
+        for line in lines
+        if line.startswith("set_source_files_properties(")
+    ]
+    assert added == ["src/to/source1.c", "${PROJECT_SOURCE_DIR}/comp/source2.c"]
+    assert properties == [
+        "${CMAKE_CURRENT_LIST_DIR}/src/to/source1.c",
+        "${PROJECT_SOURCE_DIR}/comp/source2.c",
+    ]
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pytest
+from LibraryScanner import LibraryScanner
+
+
+@pytest.fixture
+def third_party_dir(tmp_path: Path) -> Path:
+    third_party_dir = tmp_path / "ThirdParty"
+    for file in [
+        "lib1.a",
+        "readme.txt",
+        "sdk/lib2.lib",
+        "sdk/include/lib.h",
+        "sdk/docs/lib3.a",
+        "other/lib4.so",
+    ]:
+        third_party_dir.joinpath(file).parent.mkdir(parents=True, exist_ok=True)
+        third_party_dir.joinpath(file).touch()
+    return third_party_dir
+
+
+def test_find(third_party_dir: Path):
+    assert LibraryScanner(third_party_dir, [".a", ".lib"]).find() == [
+        Path("lib1.a"),
+        Path("sdk/docs/lib3.a"),
+        Path("sdk/lib2.lib"),
+    ]
+    assert LibraryScanner(third_party_dir, [".so"]).find() == [Path("other/lib4.so")]
+
+
+def test_find_with_excluded_dirs(third_party_dir: Path):
+    assert LibraryScanner(third_party_dir, [".a", ".lib"], ["doc*"]).find() == [
+        Path("lib1.a"),
+        Path("sdk/lib2.lib"),
+    ]
+
+
+def test_find_not_existing_dir(tmp_path: Path):
+    assert LibraryScanner(tmp_path / "ThirdParty", [".a"]).find() == []
+
+
+def test_find_with_cache(third_party_dir: Path, tmp_path: Path, monkeypatch):
+    cache_file = tmp_path / "cache/libs.json"
+    assert LibraryScanner(third_party_dir, [".a"], cache_file=cache_file).find() == [
+        Path("lib1.a"),
+        Path("sdk/docs/lib3.a"),
+    ]
+    assert cache_file.is_file()
+
+    scanned_dirs = []
+    original_scan_dir = LibraryScanner.scan_dir
+
+    def scan_dir(self, directory):
+        scanned_dirs.append(Path(directory))
+        return original_scan_dir(self, directory)
+
+    monkeypatch.setattr(LibraryScanner, "scan_dir", scan_dir)
+    scanner = LibraryScanner(third_party_dir, [".a"], cache_file=cache_file)
+    assert scanner.find() == [Path("lib1.a"), Path("sdk/docs/lib3.a")]
+    assert scanned_dirs == []
+
+    third_party_dir.joinpath("sdk/lib5.a").touch()
+    assert scanner.find() == [
+        Path("lib1.a"),
+        Path("sdk/docs/lib3.a"),
+        Path("sdk/lib5.a"),
+    ]
+    assert scanned_dirs == [third_party_dir / "sdk"]
+
+    # different settings do not use the cache
+    scanned_dirs.clear()
+    LibraryScanner(third_party_dir, [".lib"], cache_file=cache_file).find()
+    assert len(scanned_dirs) == 5
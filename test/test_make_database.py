@@ -0,0 +1,127 @@
+from pathlib import Path
+import textwrap
+
+from MakeDatabase import MakeDatabase, matches_pattern
+
+DATABASE = textwrap.dedent("""\
+    # GNU Make 4.3
+    # Make data base, printed on Fri Oct 16 23:01:31 2026
+
+    # Variables
+
+    # environment
+    PATH = /usr/bin
+    # default
+    CC = cc
+    # automatic
+    @D = $(patsubst %/,%,$(dir $@))
+    # makefile (from 'makefile', line 1)
+    MAKEFILE_LIST :=  makefile common.mak
+    # makefile (from 'makefile', line 2)
+    OPT = -O2
+    # makefile (from 'makefile', line 3)
+    CCFLAGS = -DKARSTEN $(OPT) $${HOME} $(INCFLAGS)
+    # makefile (from 'makefile', line 8)
+    INCFLAGS = $(addprefix -I,$(wildcard inc*))
+    # makefile (from 'makefile', line 4)
+    SIMPLE := a$$b -O2
+    # makefile (from 'makefile', line 5)
+    SRC = main.c fast.c
+    # makefile (from 'makefile', line 6)
+    OBJ = $(SRC:.c=.o) $(subst /,\\\\,$(BINDIR))
+    # makefile (from 'makefile', line 7)
+    define MULTI
+    line1
+    line2
+    endef
+    # variable set hash-table stats:
+    # Load=174/1024=17%, Rehash=0, Collisions=14/213=7%
+
+    # Pattern-specific Variable Values
+
+    obj/fast_%.o :
+    # makefile (from 'makefile', line 11)
+    # CCFLAGS := -O3
+
+    # 1 pattern-specific variable values
+
+    # Files
+
+    # Not a target:
+    .c.o:
+    #  Builtin rule
+    #  recipe to execute (built-in):
+    \t$(COMPILE.c) $(OUTPUT_OPTION) $<
+
+    # makefile (from 'makefile', line 9)
+    obj/main.o: OPT = -O0
+    # 'override' directive (from 'makefile', line 10)
+    obj/main.o: CCFLAGS += -DDEBUG
+    # Not a target:
+    obj/main.o:
+    #  Implicit rule search has not been done.
+
+    # files hash-table stats:
+    # VPATH Search Paths
+    """)
+
+
+# the global values make expanded, as collect.mak writes them to the dump
+GLOBAL_VALUES = {
+    "PATH": "/usr/bin",
+    "CC": "cc",
+    "MAKEFILE_LIST": "makefile common.mak",
+    "OPT": "-O2",
+    "CCFLAGS": "-DKARSTEN -O2 ${HOME} -Iinc1 -Iinc2",
+    "INCFLAGS": "-Iinc1 -Iinc2",
+    "SIMPLE": "a$b -O2",
+    "SRC": "main.c fast.c",
+    "OBJ": "main.o fast.o ..\\Bin",
+}
+
+
+def parse(selection=None) -> MakeDatabase:
+    return MakeDatabase(selection).parse(DATABASE.splitlines(keepends=True))
+
+
+def test_global_definitions():
+    database = parse()
+
+    assert database.variables["CCFLAGS"] == (
+        "makefile",
+        ("=", "-DKARSTEN $(OPT) $${HOME} $(INCFLAGS)"),
+    )
+    assert database.variables["MULTI"] == ("makefile", ("=", "line1\nline2"))
+    assert database.variables["PATH"] == ("environment", ("=", "/usr/bin"))
+    assert "@D" not in database.variables
+
+
+def test_target_values():
+    assert parse().target_values(GLOBAL_VALUES) == {
+        "obj/fast_%.o": {"CCFLAGS": "-O3"},
+        # the global CCFLAGS is expanded with the OPT of the target,
+        # the function calls of INCFLAGS are expanded by make already
+        "obj/main.o": {
+            "OPT": "-O0",
+            "CCFLAGS": "-DKARSTEN -O0 ${HOME} -Iinc1 -Iinc2 -DDEBUG",
+        },
+    }
+
+
+def test_selection(tmp_path: Path):
+    database = parse(["MAKEFILE_LIST", "%FLAGS", "CC", "PATH"])
+
+    database.to_target_variables_file(tmp_path / "targets.json", GLOBAL_VALUES)
+
+    assert MakeDatabase.read_target_variables(tmp_path / "targets.json") == {
+        "obj/fast_%.o": {"CCFLAGS": "-O3"},
+        "obj/main.o": {"CCFLAGS": "-DKARSTEN -O0 ${HOME} -Iinc1 -Iinc2 -DDEBUG"},
+    }
+
+
+def test_matches_pattern():
+    assert matches_pattern("CCFLAGS", "%FLAGS")
+    assert matches_pattern("FLAGS", "%FLAGS")
+    assert not matches_pattern("FLAGS_C", "%FLAGS")
+    assert matches_pattern("main", "main")
+    assert not matches_pattern("fast_main", "fast_%_x")
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+from MakeDumpCache import MakeDumpCache
+
+
+@pytest.fixture
+def build_dir(tmp_path: Path) -> Path:
+    build_dir = tmp_path / "Bld"
+    build_dir.mkdir()
+    build_dir.joinpath("Makefile").write_text("include cfg.mak")
+    build_dir.joinpath("cfg.mak").write_text("SRC = main.c")
+    return build_dir
+
+
+@pytest.fixture
+def make_dump_file(tmp_path: Path) -> Path:
+    make_dump_file = tmp_path / "original_make_vars.txt"
+    make_dump_file.write_text("MAKEFILE_LIST = Makefile cfg.mak\nSRC = main.c\n")
+    return make_dump_file
+
+
+def test_lookup_without_stored_dump(build_dir: Path, tmp_path: Path):
+    cache = MakeDumpCache(tmp_path / "cache", build_dir, {"batch_commands": []})
+    assert cache.lookup() is None
+
+
+def test_lookup_stored_dump(build_dir: Path, make_dump_file: Path, tmp_path: Path):
+    MakeDumpCache(tmp_path / "cache", build_dir, {"batch_commands": []}).store(
+        make_dump_file
+    )
+
+    cached_dump_file = MakeDumpCache(
+        tmp_path / "cache", build_dir, {"batch_commands": []}
+    ).lookup()
+
+    assert cached_dump_file.read_text() == make_dump_file.read_text()
+
+
+def test_lookup_stored_target_variables(
+    build_dir: Path, make_dump_file: Path, tmp_path: Path
+):
+    target_variables_file = tmp_path / "make_target_variables.json"
+    target_variables_file.write_text('{"main.o": {"CFLAGS": "-O0"}}')
+    cache = MakeDumpCache(tmp_path / "cache", build_dir, {"database": True})
+    cache.store(make_dump_file, target_variables_file)
+
+    cached_dump_file = cache.lookup()
+
+    assert (
+        cache.target_variables_file(cached_dump_file).read_text()
+        == target_variables_file.read_text()
+    )
+
+
+def test_changed_makefile_invalidates_dump(
+    build_dir: Path, make_dump_file: Path, tmp_path: Path
+):
+    cache = MakeDumpCache(tmp_path / "cache", build_dir, {"batch_commands": []})
+    cache.store(make_dump_file)
+
+    build_dir.joinpath("cfg.mak").write_text("SRC = main.c other.c")
+
+    assert cache.lookup() is None
+
+
+def test_changed_setup_invalidates_dump(
+    build_dir: Path, make_dump_file: Path, tmp_path: Path
+):
+    MakeDumpCache(tmp_path / "cache", build_dir, {"batch_commands": []}).store(
+        make_dump_file
+    )
+
+    assert (
+        MakeDumpCache(
+            tmp_path / "cache", build_dir, {"batch_commands": ["set FOO=1"]}
+        ).lookup()
+        is None
+    )
+
+
+def test_added_source_invalidates_dump(
+    build_dir: Path, make_dump_file: Path, tmp_path: Path
+):
+    # e.g. SRC = $(wildcard ../Src/*.c)
+    build_dir.parent.joinpath("Src").mkdir()
+    build_dir.parent.joinpath("Src/main.c").write_text("")
+    make_dump_file.write_text("MAKEFILE_LIST = Makefile cfg.mak\nSRC = ../Src/main.c\n")
+    cache = MakeDumpCache(tmp_path / "cache", build_dir, {}, sources_var="SRC")
+    cache.store(make_dump_file)
+    assert cache.lookup()
+
+    build_dir.parent.joinpath("Src/util.c").write_text("")
+
+    assert cache.lookup() is None
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import pytest
+from MakeVariablesDump import MakeVariablesDump
+
+CONTENT = """CC = gcc
+SRC = main.c  component.c
+RULE = out.a:
+	@echo "AR = out.a"
+CC = overwritten
+EMPTY =
+"""
+
+
+@pytest.fixture(params=["string", "file"])
+def make_variables_dump(request, tmp_path: Path) -> MakeVariablesDump:
+    if request.param == "string":
+        return MakeVariablesDump(CONTENT)
+    file = tmp_path / "dump.txt"
+    file.write_bytes(CONTENT.replace("\n", "\r\n").encode())
+    return MakeVariablesDump(file)
+
+
+def test_get(make_variables_dump: MakeVariablesDump):
+    assert make_variables_dump.get("SRC") == "main.c  component.c"
+    assert make_variables_dump.get("CC") == "overwritten"
+    assert make_variables_dump.get("EMPTY") == ""
+    assert make_variables_dump.get("UNKNOWN") is None
+    assert make_variables_dump.offsets is None
+
+
+def test_find(make_variables_dump: MakeVariablesDump):
+    assert make_variables_dump.find(["CC", "RULE", "UNKNOWN"]) == {
+        "CC": "overwritten",
+        "RULE": "out.a:",
+        "UNKNOWN": None,
+    }
+
+
+def test_get_with_index(make_variables_dump: MakeVariablesDump):
+    assert set(make_variables_dump.build_index().keys()) == {
+        "CC",
+        "SRC",
+        "RULE",
+        '@echo "AR',
+        "EMPTY",
+    }
+    assert make_variables_dump.get("SRC") == "main.c  component.c"
+    assert make_variables_dump.get("CC") == "overwritten"
+    assert make_variables_dump.get("UNKNOWN") is None
+    assert make_variables_dump.values == {
+        "SRC": "main.c  component.c",
+        "CC": "overwritten",
+        "UNKNOWN": None,
+    }
+
+
+def test_to_dict(make_variables_dump: MakeVariablesDump):
+    assert make_variables_dump.to_dict() == {
+        "CC": "overwritten",
+        "SRC": "main.c  component.c",
+        "RULE": "out.a:",
+        '@echo "AR': 'out.a"',
+        "EMPTY": "",
+    }
+
+
+def test_last_occurrence_wins():
+    make_variables_dump = MakeVariablesDump("CC = gcc\nCC = clang\n")
+
+    assert make_variables_dump.find(["CC"]) == {"CC": "clang"}
+    assert make_variables_dump.read_value("CC") == "clang"
+    assert make_variables_dump.to_dict() == {"CC": "clang"}
+
+
+def test_find_stops_at_the_last_occurrences(tmp_path: Path):
+    file = tmp_path / "dump.txt"
+    # the earlier, undecodable values are never read
+    file.write_bytes(b"CC = \xff\nSRC = \xff\nCC = clang\nSRC = main.c\nLD = ld\n")
+
+    assert MakeVariablesDump(file).find(["CC", "SRC"]) == {
+        "CC": "clang",
+        "SRC": "main.c",
+    }
+
+
+def test_find_in_empty_file(tmp_path: Path):
+    file = tmp_path / "dump.txt"
+    file.write_bytes(b"")
+
+    assert MakeVariablesDump(file).find(["CC"]) == {"CC": None}
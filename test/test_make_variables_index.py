@@ -0,0 +1,125 @@
+import os
+from pathlib import Path
+
+import pytest
+from MakeVariablesDump import MakeVariablesDump
+from MakeVariablesIndex import MakeVariablesIndex
+
+
+@pytest.fixture
+def dump_file(tmp_path: Path) -> Path:
+    dump_file = tmp_path / "original_make_vars.txt"
+    dump_file.write_text("CC = gcc\nSRC = main.c  component.c\nCC = other\nEMPTY =\n")
+    return dump_file
+
+
+def load_index(dump_file: Path) -> MakeVariablesIndex:
+    return MakeVariablesIndex.load(dump_file, MakeVariablesDump(dump_file).build_index)
+
+
+def test_get(dump_file: Path):
+    index = load_index(dump_file)
+    assert index.rebuilt
+    assert index.get("CC") == b"other"
+    assert index.get("SRC") == b"main.c  component.c"
+    assert index.get("EMPTY") == b""
+    assert index.get("UNKNOWN") is None
+    index.close()
+
+
+def test_reload(dump_file: Path):
+    load_index(dump_file).close()
+
+    index = load_index(dump_file)
+    assert not index.rebuilt
+    assert index.get("SRC") == b"main.c  component.c"
+    index.close()
+
+
+def test_rebuild_after_dump_change(dump_file: Path):
+    load_index(dump_file).close()
+    dump_file.write_text("CC = clang\n")
+
+    index = load_index(dump_file)
+    assert index.rebuilt
+    assert index.get("CC") == b"clang"
+    assert index.get("SRC") is None
+    index.close()
+
+
+def test_no_rebuild_after_touching_dump(dump_file: Path):
+    load_index(dump_file).close()
+    dump_stat = dump_file.stat()
+    os.utime(dump_file, ns=(dump_stat.st_atime_ns, dump_stat.st_mtime_ns + 10**9))
+
+    index = load_index(dump_file)
+    assert not index.rebuilt
+    index.close()
+    assert not load_index(dump_file).rebuilt
+
+
+def test_empty_dump(tmp_path: Path):
+    dump_file = tmp_path / "empty.txt"
+    dump_file.write_text("")
+    assert load_index(dump_file).get("CC") is None
+
+
+def test_make_variables_dump_with_persistent_index(dump_file: Path):
+    make_variables_dump = MakeVariablesDump(dump_file, persistent_index=True)
+    assert make_variables_dump.get("CC") == "other"
+    assert make_variables_dump.get("UNKNOWN") is None
+    assert MakeVariablesIndex.index_file_for(dump_file).is_file()
+    make_variables_dump.close()
+    assert make_variables_dump.index is None
+
+
+def test_close_index(dump_file: Path):
+    with load_index(dump_file) as index:
+        assert index.get("SRC") == b"main.c  component.c"
+    assert index.mapped_file.closed
+    with MakeVariablesDump(dump_file, persistent_index=True) as make_variables_dump:
+        make_variables_dump.get("CC")
+        index = make_variables_dump.index
+    assert index.mapped_file.closed
+    # not mapped anymore, so it can be deleted also on Windows
+    MakeVariablesIndex.index_file_for(dump_file).unlink()
+
+
+def test_names_encoded_like_the_dump(tmp_path: Path):
+    dump_file = tmp_path / "dump.txt"
+    dump_file.write_bytes("GRÖSSE = 3\n".encode("cp1252"))
+    make_variables_dump = MakeVariablesDump(dump_file, persistent_index=True)
+    make_variables_dump.encoding = "cp1252"
+
+    with make_variables_dump:
+        assert make_variables_dump.get("GRÖSSE") == "3"
+    with MakeVariablesIndex.load(
+        dump_file, make_variables_dump.build_index, "utf-8"
+    ) as index:
+        # rebuilt for another encoding, the name in the dump is not UTF-8
+        assert index.rebuilt
+        assert index.get("GRÖSSE") is None
+
+
+def test_index_is_smaller_than_the_dump(tmp_path: Path):
+    dump_file = tmp_path / "dump.txt"
+    dump_file.write_text(
+        "".join(f"VARIABLE_{i} = -I../some/include/dir_{i}\n" for i in range(300))
+    )
+
+    with load_index(dump_file) as index:
+        assert index.get("VARIABLE_299") == b"-I../some/include/dir_299"
+    assert (
+        MakeVariablesIndex.index_file_for(dump_file).stat().st_size
+        < dump_file.stat().st_size / 2
+    )
+
+
+def test_hash_collisions(dump_file: Path, monkeypatch):
+    monkeypatch.setattr(MakeVariablesIndex, "hash", staticmethod(lambda name: 0))
+
+    with load_index(dump_file) as index:
+        assert index.get("CC") == b"other"
+        assert index.get("SRC") == b"main.c  component.c"
+        assert index.get("EMPTY") == b""
+        assert index.get("UNKNOWN") is None
@@ -39,3 +39,49 @@ def test_replace_path_multiple_matches():
     psar = PathSearchAndReplace(replacements)
     my_path = Path("path/to/baz/quux/foo/file.txt")
     assert psar.replace_path(my_path) == Path("path/to/baz/quux/bar/file.txt")
+
+
+def test_replace_path_first_replacement_wins():
+    replacements = [
+        SubdirReplacement("foo", "bar"),
+        SubdirReplacement("baz", "qux"),
+        SubdirReplacement("/", "root"),
+    ]
+    psar = PathSearchAndReplace(replacements)
+    assert psar.replace_path(Path("baz/foo/foo/file.txt")) == Path(
+        "baz/bar/foo/file.txt"
+    )
+    assert psar.replace_path(Path("baz/file.txt")) == Path("qux/file.txt")
+    assert psar.replace_path(Path("my/file.txt")) == Path("root/my/file.txt")
+
+
+def test_replace_path_ignores_replacements_after_root():
+    replacements = [
+        SubdirReplacement("/", "root"),
+        SubdirReplacement("foo", "bar"),
+    ]
+    psar = PathSearchAndReplace(replacements)
+    assert psar.replace_path(Path("foo/file.txt")) == Path("root/foo/file.txt")
+
+
+def test_replace_many():
+    replacements = [
+        SubdirReplacement("foo", "bar"),
+        SubdirReplacement("file.txt", "other.txt"),
+    ]
+    psar = PathSearchAndReplace(replacements)
+    paths = [
+        Path("path/to/foo/file.txt"),
+        Path("path/to/file.txt"),
+        Path("path/to/foo"),
+        Path("file.txt"),
+        Path("path/to/unrelated.txt"),
+    ]
+    assert psar.replace_many(paths) == [psar.replace_path(path) for path in paths]
+    assert psar.replace_many(paths) == [
+        Path("path/to/bar/file.txt"),
+        Path("path/to/other.txt"),
+        Path("path/to/bar"),
+        Path("other.txt"),
+        Path("path/to/unrelated.txt"),
+    ]
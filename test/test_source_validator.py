@@ -0,0 +1,94 @@
+import json
+import os
+from pathlib import Path
+
+from SourceValidator import SourceValidationReport, SourceValidator
+
+
+def create_files(root: Path, files):
+    for file in files:
+        root.joinpath(file).parent.mkdir(parents=True, exist_ok=True)
+        root.joinpath(file).write_text("")
+
+
+def issue_paths(report: SourceValidationReport, kind: str):
+    return [Path(issue["path"]) for issue in report.issues[kind]]
+
+
+def test_validate(tmp_path: Path):
+    sources_dir = tmp_path / "Impl/Src"
+    create_files(
+        tmp_path,
+        ["Impl/Src/a/a.c", "Impl/Src/b/b.cpp", "Impl/Src/b/b.txt", "Other/o.c"],
+    )
+    sources = [
+        str(sources_dir / "a/a.c"),
+        str(sources_dir / "b/b.cpp"),
+        str(sources_dir / "b/b.txt"),
+        str(sources_dir / "a/missing.c"),
+        str(sources_dir / "a/a.c"),
+        str(tmp_path / "Other/o.c"),
+        str(sources_dir / "a"),
+    ]
+    include_paths = [
+        str(sources_dir / "a"),
+        str(sources_dir / "a/a.c"),
+        str(sources_dir / "missing"),
+        str(tmp_path / "Other"),
+    ]
+
+    report = SourceValidator(sources_dir, [".c", ".CPP"]).validate(
+        sources, include_paths
+    )
+
+    assert report.sources == 7
+    assert report.include_paths == 4
+    assert issue_paths(report, "missing") == [
+        sources_dir / "a/missing.c",
+        sources_dir / "a",
+        sources_dir / "a/a.c",
+        sources_dir / "missing",
+    ]
+    assert issue_paths(report, "duplicate") == [sources_dir / "a/a.c"]
+    assert issue_paths(report, "outside_source_tree") == [
+        tmp_path / "Other/o.c",
+        tmp_path / "Other",
+    ]
+    assert issue_paths(report, "unknown_extension") == [
+        sources_dir / "b/b.txt",
+        sources_dir / "a",
+    ]
+    assert report.issues["outside_source_tree"][1]["type"] == "include"
+    assert report.has_issues(["duplicate"])
+    assert str(report).endswith(
+        "4 missing, 1 duplicate, 2 outside source tree, 2 unknown extension"
+    )
+
+
+def test_validate_without_extension_check(tmp_path: Path):
+    create_files(tmp_path, ["src/a.xyz"])
+
+    report = SourceValidator(tmp_path / "src", []).validate(
+        [os.path.join(tmp_path, "src", "a.xyz")], []
+    )
+
+    assert not report.has_issues(report.issues.keys())
+
+
+def test_report_to_file(tmp_path: Path):
+    report = SourceValidationReport(sources=1)
+    report.add_issue("missing", "src/a.c", "source")
+    report_file = tmp_path / "out/report.json"
+
+    report.to_file(report_file)
+
+    assert json.loads(report_file.read_text()) == {
+        "sources": 1,
+        "include_paths": 0,
+        "issues": {
+            "missing": [{"path": "src/a.c", "type": "source"}],
+            "duplicate": [],
+            "outside_source_tree": [],
+            "unknown_extension": [],
+        },
+    }
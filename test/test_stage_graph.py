@@ -0,0 +1,160 @@
+from concurrent.futures import CancelledError
+from pathlib import Path
+import threading
+import time
+from typing import Dict, List
+
+import pytest
+from StageGraph import Stage, StageGraph, file_digest, tree_digest
+
+
+def create_graph(
+    tmp_path: Path, inputs: Dict[str, str], calls: List[str], version: str = ""
+) -> StageGraph:
+    output = tmp_path / "output.txt"
+
+    def stage(name: str) -> Stage:
+        return Stage(name, lambda: calls.append(name), inputs=lambda: inputs[name])
+
+    graph = StageGraph(tmp_path / "stamps.json", version=version)
+    dump = stage("dump")
+    graph.add(dump)
+    parts = stage("parts")
+    parts.dependencies = ["dump"]
+    graph.add(parts)
+    config = Stage(
+        "config",
+        lambda: (calls.append("config"), output.write_text("config")),
+        inputs=lambda: inputs["config"],
+        outputs=[output],
+    )
+    graph.add(config)
+    return graph
+
+
+def test_skip_up_to_date_stages(tmp_path: Path):
+    inputs = {"dump": "a", "parts": "b", "config": "c"}
+    calls: List[str] = []
+
+    executed, skipped = create_graph(tmp_path, inputs, calls).run()
+    assert sorted(executed) == ["config", "dump", "parts"]
+    assert skipped == []
+    assert calls.index("dump") < calls.index("parts")
+
+    calls.clear()
+    executed, skipped = create_graph(tmp_path, inputs, calls).run()
+    assert executed == []
+    assert sorted(skipped) == ["config", "dump", "parts"]
+
+    inputs["parts"] = "changed"
+    (tmp_path / "output.txt").unlink()
+    executed, _ = create_graph(tmp_path, inputs, calls).run()
+    assert sorted(executed) == ["config", "parts"]
+
+    executed, _ = create_graph(tmp_path, inputs, calls).run(force=True)
+    assert sorted(executed) == ["config", "dump", "parts"]
+
+
+def test_new_version_runs_all_stages(tmp_path: Path):
+    inputs = {"dump": "a", "parts": "b", "config": "c"}
+    calls: List[str] = []
+    create_graph(tmp_path, inputs, calls, version="1").run()
+
+    executed, skipped = create_graph(tmp_path, inputs, calls, version="2").run()
+
+    assert sorted(executed) == ["config", "dump", "parts"]
+    assert skipped == []
+
+
+def test_modified_output_runs_stage(tmp_path: Path):
+    inputs = {"dump": "a", "parts": "b", "config": "c"}
+    calls: List[str] = []
+    create_graph(tmp_path, inputs, calls).run()
+
+    (tmp_path / "output.txt").write_text("edited by hand")
+    executed, _ = create_graph(tmp_path, inputs, calls).run()
+
+    assert executed == ["config"]
+    assert (tmp_path / "output.txt").read_text() == "config"
+    executed, _ = create_graph(tmp_path, inputs, calls).run()
+    assert executed == []
+
+
+def test_independent_stages_run_concurrently(tmp_path: Path):
+    barrier = threading.Barrier(2, timeout=5)
+    graph = StageGraph(tmp_path / "stamps.json")
+    # deadlocks if the stages do not run at the same time
+    graph.add(Stage("mirror", barrier.wait))
+    graph.add(Stage("dump", barrier.wait))
+
+    executed, _ = graph.run()
+
+    assert sorted(executed) == ["dump", "mirror"]
+
+
+def test_failing_stage(tmp_path: Path):
+    inputs = {"dump": "a", "parts": "b", "config": "c"}
+    calls: List[str] = []
+    create_graph(tmp_path, inputs, calls).run()
+    inputs["dump"] = "changed"
+    graph = create_graph(tmp_path, inputs, calls)
+    graph.stages["dump"].function = lambda: 1 / 0
+
+    with pytest.raises(ZeroDivisionError):
+        graph.run()
+
+    calls.clear()
+    inputs["dump"] = "a"
+    executed, _ = create_graph(tmp_path, inputs, calls).run()
+    # the stamp of the failed stage is gone
+    assert executed == ["dump"]
+
+
+def test_failing_stage_cancels_running_stages(tmp_path: Path):
+    graph = StageGraph(tmp_path / "stamps.json")
+    started = threading.Event()
+
+    def fail() -> None:
+        started.wait(5)
+        raise RuntimeError("make failed")
+
+    def mirror() -> None:
+        started.set()
+        if graph.cancel_event.wait(5):
+            raise CancelledError()
+
+    graph.add(Stage("make", fail))
+    graph.add(Stage("mirror", mirror))
+    graph.add(Stage("parts", lambda: None, dependencies=["make"]))
+    start = time.perf_counter()
+
+    with pytest.raises(RuntimeError, match="make failed"):
+        graph.run()
+
+    assert time.perf_counter() - start < 5
+
+
+def test_invalid_dependencies(tmp_path: Path):
+    graph = StageGraph(tmp_path / "stamps.json")
+    graph.add(Stage("parts", lambda: None, dependencies=["dump"]))
+    with pytest.raises(ValueError, match="unknown stages dump"):
+        graph.run()
+
+    graph.add(Stage("dump", lambda: None, dependencies=["parts"]))
+    with pytest.raises(
+        ValueError, match="Cyclic dependencies between the stages dump, parts"
+    ):
+        graph.run()
+
+
+def test_digests(tmp_path: Path):
+    file = tmp_path / "tree/sub/file.txt"
+    file.parent.mkdir(parents=True)
+    file.write_text("content")
+    digest = tree_digest(tmp_path / "tree")
+
+    assert file_digest(file) == file_digest(file)
+    assert file_digest(tmp_path / "missing.txt") is None
+    assert tree_digest(tmp_path / "tree") == digest
+    file.write_text("changed content")
+    assert tree_digest(tmp_path / "tree") != digest
@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+
+import pytest
+from StageProfiler import StageProfiler, write_chrome_trace, write_profile
+
+
+def test_stage():
+    profiler = StageProfiler()
+
+    with profiler.stage("first") as profile:
+        profiler.count("files", 2)
+        profiler.count("files", 3)
+    profiler.count("ignored", 1)
+    with pytest.raises(ValueError):
+        with profiler.stage("second"):
+            raise ValueError()
+
+    assert profiler.stages == [profile, profiler.stages[1]]
+    assert profile.counts == {"files": 5}
+    assert profile.wall_time >= 0.0
+    assert profile.peak_memory is None
+    assert profiler.stages[1].name == "second"
+    assert str(profile).startswith("first: ")
+    assert str(profile).endswith("files 5")
+
+
+def test_stage_with_memory_tracing():
+    profiler = StageProfiler(trace_memory=True)
+
+    with profiler.stage("allocate") as profile:
+        data = bytearray(10_000_000)
+    del data
+
+    assert profile.peak_memory >= 10_000_000
+
+
+def test_write_profile_and_chrome_trace(tmp_path: Path):
+    profiler = StageProfiler()
+    with profiler.stage("first"):
+        profiler.count("files", 2)
+    with profiler.stage("second"):
+        pass
+    profiles = {"FLV/SUB": profiler.stages}
+
+    write_profile(profiles, tmp_path / "profile.json")
+    write_chrome_trace(profiles, tmp_path / "trace.json")
+
+    profile = json.loads(tmp_path.joinpath("profile.json").read_text())
+    assert [stage["name"] for stage in profile["FLV/SUB"]] == ["first", "second"]
+    assert profile["FLV/SUB"][0]["counts"] == {"files": 2}
+    events = json.loads(tmp_path.joinpath("trace.json").read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["first", "second"]
+    assert events[0]["ph"] == "X"
+    assert events[0]["ts"] == 0
+    assert events[0]["cat"] == "FLV/SUB"
+    assert events[0]["args"]["files"] == 2
+    assert events[1]["ts"] >= events[0]["dur"]
@@ -0,0 +1,63 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+from typing import Dict, List
+
+# modules only needed by some stages, they shall not slow down the startup
+LAZY_MODULES = [
+    "concurrent.futures",
+    "dacite",
+    "docopt",
+    "file_generators",
+    "json",
+    "LegacyBuildSystem",
+    "MakeDumpCache",
+    "multiprocessing",
+    "shutil",
+    "subprocess",
+    "TreeMirror",
+]
+
+
+def import_times(arguments: List[str]) -> Dict[str, int]:
+    """Cumulative import time in microseconds of each module imported by running python with the given arguments."""
+    env = dict(os.environ)
+    src_dir = str(Path(__file__).parent.parent / "src")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src_dir, env.get("PYTHONPATH")]))
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime"] + arguments,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = {}
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                result[name.strip()] = int(cumulative)
+    return result
+
+
+def test_import_transformer():
+    imported_modules = import_times(["-c", "import transformer"])
+    assert [module for module in LAZY_MODULES if module in imported_modules] == []
+
+
+def test_help():
+    transformer_script = str(Path(__file__).parent.parent / "src/transformer.py")
+    assert "docopt" not in import_times([transformer_script, "--help"])
+
+
+def test_simple_config_without_dacite():
+    imported_modules = import_times(
+        [
+            "-c",
+            "from TransformerConfig import TransformerConfig;"
+            "TransformerConfig.from_dict({'input_dir': 'in', 'output_dir': 'out', 'variant': 'MY/VAR', 'variants': ['MY/OTHER']})",
+        ]
+    )
+    assert "TransformerConfig" in imported_modules
+    assert "dacite" not in imported_modules
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from benchmark.synthetic_project import SyntheticProject
+from LegacyBuildSystem import LegacyBuildSystem
+from SourceValidator import SourceValidator
+from TransformerConfig import TransformerConfig
+
+
+def test_generate(tmp_path: Path):
+    project = SyntheticProject(
+        components=3,
+        sources_per_component=4,
+        third_party_dirs=2,
+        third_party_libs_per_dir=3,
+        filler_variables=10,
+    )
+    project.generate(tmp_path)
+    legacy_build_system = LegacyBuildSystem(
+        project.make_dump(), TransformerConfig(tmp_path, tmp_path / "out", "FLV/SUB")
+    )
+
+    assert len(legacy_build_system.get_source_paths()) == 12
+    assert legacy_build_system.get_source_paths()[0] == Path("comp_0000/src_0000.c")
+    assert legacy_build_system.get_include_paths()[-1] == Path("comp_0002/inc")
+    assert len(legacy_build_system.get_thirdparty_libs()) == 6
+    assert len(legacy_build_system.make_variables) == 13
+    report = SourceValidator(legacy_build_system.sources_dir, [".c"]).validate(
+        legacy_build_system.get_source_files(), legacy_build_system.get_include_dirs()
+    )
+    assert not report.has_issues(report.issues.keys())
+    assert tmp_path.joinpath("Impl/Bld/makefile").is_file()
+
+
+def test_preset():
+    assert SyntheticProject.preset("small") == SyntheticProject()
+    large = SyntheticProject.preset("large")
+    assert len(large.sources()) == 20_000
+    assert len(large.include_paths()) == 500
@@ -1,19 +1,28 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import CancelledError
+import json
 import os
 import stat
 import subprocess
+import sys
 import tempfile
 import textwrap
+import threading
+import time
 import unittest
 import shutil
 from docopt import DocoptExit
 
 import pytest
+from CompileFlags import CompileFlags
 from LegacyBuildSystem import LegacyBuildSystem
+from MakeDatabase import MakeDatabase
+from SubdirReplacement import SubdirReplacement
 from TransformerConfig import DirMirrorData, TransformerConfig
 from Variant import Variant
 from transformer import (
+    BatchTransformer,
     Transformer,
     create_argument_parser,
 )
@@ -162,6 +171,24 @@ def test_argument_parser():
     assert parsed_args["--config"] == "C:/my_file"
 
 
+def test_argument_parser_multiple_variants():
+    arg_list = [
+        "--source",
+        "C:/input",
+        "--target",
+        "C:/output",
+        "--variant",
+        "A/B",
+        "--variant",
+        "C/D",
+        "--jobs",
+        "4",
+    ]
+    parsed_args = create_argument_parser(arg_list)
+    assert parsed_args["--variant"] == ["A/B", "C/D"]
+    assert parsed_args["--jobs"] == "4"
+
+
 def test_argument_parser_mutually_exclusive_arguments():
     arg_list = ["--config", "C:/my_file", "--source", "C:/input"]
     with pytest.raises(DocoptExit):
@@ -171,7 +198,11 @@ def test_argument_parser_mutually_exclusive_arguments():
 @pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
 def test_cmake_project_creation(new_transformer: Transformer):
     transformer = new_transformer
-    transformer.create_cmake_project(LegacyBuildSystem("", transformer.config))
+    legacy_build_system = LegacyBuildSystem("", transformer.config)
+    transformer.create_variant_parts_cmake(legacy_build_system)
+    transformer.create_variant_config_cmake(legacy_build_system)
+    transformer.create_legacy_parts_cmake(legacy_build_system)
+    transformer.create_legacy_cmake_lists()
 
     out_dir = transformer.output_dir
     variant = transformer.variant
@@ -211,10 +242,447 @@ def test_create_legacy_make_variables_dump_file(new_transformer: Transformer):
     transformer.create_legacy_make_variables_dump_file()
 
     assert transformer.variant_dir.joinpath("original_make_vars.txt").is_file()
-    assert transformer.variant_dir.joinpath("collect.bat").is_file()
+    if os.name == "nt":
+        assert transformer.variant_dir.joinpath("collect.bat").is_file()
     assert transformer.variant_dir.joinpath("collect.mak").is_file()
 
     assert (
         "TESTVAR = BLAFASEL"
         in transformer.variant_dir.joinpath("original_make_vars.txt").read_text()
     )
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_create_legacy_make_variables_dump_file_with_selected_variables(
+    new_transformer: Transformer,
+):
+    transformer = new_transformer
+    transformer.config.batch_commands = ["set TESTVAR=BLAFASEL"]
+    transformer.config.make_dump_variables = ["%FLAGS", "TESTVAR"]
+    transformer.variant_dir.mkdir(parents=True, exist_ok=True)
+    transformer.create_legacy_make_variables_dump_file()
+
+    make_variables = LegacyBuildSystem.parse_make_var_dump(transformer.make_dump_file)
+    assert make_variables["CCFLAGS"] == "-DKARSTEN -DMATTHIAS"
+    assert make_variables["LDFLAGS"] == "-Dp=../Bin/blablub"
+    assert make_variables["MAKEFILE_LIST"] == "makefile"
+    assert "TESTVAR" not in make_variables
+    assert "CC" not in make_variables
+    # the flags make passes to sub-makes match '%FLAGS' but are not from the makefiles
+    assert "MAKEFLAGS" not in make_variables
+    assert "MFLAGS" not in make_variables
+    # only newlines separate the variables
+    assert not [
+        line
+        for line in transformer.make_dump_file.read_text().splitlines()
+        if line.startswith(" ")
+    ]
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_create_variant_config_with_legacy_flags(new_transformer: Transformer):
+    transformer = new_transformer
+    transformer.config.compile_flags_vars = ["CCFLAGS", "TARGETFLAGS"]
+    transformer.config.asm_flags_vars = ["ASMFLAGS"]
+    transformer.config.link_flags_vars = ["LDFLAGS"]
+    transformer.config.make_dump_variables = ["PROJECTNAME"]
+    transformer.variant_dir.mkdir(parents=True, exist_ok=True)
+    transformer.create_legacy_make_variables_dump_file()
+
+    transformer.create_variant_config_cmake(transformer.create_legacy_build_system())
+
+    config_cmake = transformer.variant_config_cmake_file.read_text()
+    assert (
+        "add_compile_definitions(\n"
+        "    $<$<COMPILE_LANGUAGE:C,CXX>:KARSTEN>\n"
+        "    $<$<COMPILE_LANGUAGE:C,CXX>:MATTHIAS>\n"
+        "    $<$<COMPILE_LANGUAGE:C,CXX>:ALEXANDER>\n"
+        ")\n" in config_cmake
+    )
+    assert "$<$<COMPILE_LANGUAGE:ASM>:Foo>" in config_cmake
+    assert "add_link_options(\n    -Dp=../Bin/blablub\n)\n" in config_cmake
+
+
+def test_create_legacy_make_variables_dump_file_from_database(tmp_path: Path):
+    input_dir = tmp_path / "prj1"
+    shutil.copytree(Path("test/data/prj1"), input_dir)
+    with open(input_dir / "Impl/Bld/makefile", "a") as f:
+        f.write("\nOPT = -O2\nCCFLAGS += $(OPT)\n")
+        f.write("VC_SRC_LIST = ../Src/main.c ../Src/component_a/component_a.c\n")
+        f.write("obj/main.o: OPT = -O0\n")
+        f.write("obj/component_%.o: TARGETFLAGS += -DFAST\n")
+    config = TransformerConfig(
+        input_dir,
+        tmp_path / "out",
+        Variant("MY", "VAR"),
+        make_dump_database=True,
+        make_dump_variables=["%FLAGS"],
+        compile_flags_vars=["CCFLAGS", "TARGETFLAGS"],
+    )
+    transformer = Transformer(config)
+    transformer.variant_dir.mkdir(parents=True, exist_ok=True)
+    transformer.create_legacy_make_variables_dump_file()
+
+    make_variables = LegacyBuildSystem.parse_make_var_dump(transformer.make_dump_file)
+    assert make_variables["CCFLAGS"] == "-DKARSTEN -DMATTHIAS -O2"
+    assert make_variables["MAKEFILE_LIST"] == "makefile"
+    assert "CC" not in make_variables
+    expected_flags = {
+        Path("main.c"): CompileFlags([], ["-O0"]),
+        Path("component_a/component_a.c"): CompileFlags(["FAST"]),
+    }
+    assert (
+        transformer.create_legacy_build_system().get_source_compile_flags()
+        == expected_flags
+    )
+
+    # the target variables are cached together with the dump
+    transformer = Transformer(config)
+    transformer.create_legacy_make_variables_dump_file()
+    assert transformer.execution_summary[-1].startswith("Reused cached make file dump")
+    assert (
+        transformer.create_legacy_build_system().get_source_compile_flags()
+        == expected_flags
+    )
+
+
+def test_make_database_dump_is_expanded_by_make(tmp_path: Path):
+    input_dir = tmp_path / "prj1"
+    shutil.copytree(Path("test/data/prj1"), input_dir)
+    with open(input_dir / "Impl/Bld/makefile", "a") as f:
+        f.write("\nSRC_DIR = ../Src\n")
+        f.write("VC_SRC_LIST = $(sort $(wildcard $(SRC_DIR)/*.c $(SRC_DIR)/*/*.c))\n")
+        f.write("OBJS = $(patsubst $(SRC_DIR)/%.c,obj/%.o,$(VC_SRC_LIST))\n")
+        f.write("INCFLAGS = $(addprefix -I,$(SRC_DIR)/include_dir)\n")
+        f.write("CCFLAGS += $(INCFLAGS) $(OPT)\n")
+        f.write("obj/main.o: OPT = -O0\n")
+    config = TransformerConfig(
+        input_dir,
+        tmp_path / "out",
+        Variant("MY", "VAR"),
+        make_dump_database=True,
+        make_dump_variables=["%FLAGS", "VC_SRC_LIST", "OBJS"],
+        compile_flags_vars=["CCFLAGS"],
+    )
+    transformer = Transformer(config)
+    transformer.variant_dir.mkdir(parents=True, exist_ok=True)
+    transformer.create_legacy_make_variables_dump_file()
+
+    make_variables = LegacyBuildSystem.parse_make_var_dump(transformer.make_dump_file)
+    assert make_variables["VC_SRC_LIST"] == (
+        "../Src/component_a/component_a.c ../Src/main.c"
+    )
+    assert make_variables["OBJS"] == "obj/component_a/component_a.o obj/main.o"
+    assert make_variables["INCFLAGS"] == "-I../Src/include_dir"
+    assert make_variables["CCFLAGS"] == "-DKARSTEN -DMATTHIAS -I../Src/include_dir"
+    # the target value keeps the function calls expanded by make
+    target_variables = MakeDatabase.read_target_variables(
+        transformer.make_target_variables_file
+    )
+    assert target_variables == {
+        "obj/main.o": {"CCFLAGS": "-DKARSTEN -DMATTHIAS -I../Src/include_dir -O0"}
+    }
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_create_legacy_make_variables_dump_file_from_cache(
+    new_transformer: Transformer,
+):
+    transformer = new_transformer
+    transformer.variant_dir.mkdir(parents=True, exist_ok=True)
+    transformer.create_legacy_make_variables_dump_file()
+    make_dump = transformer.make_dump_file.read_text()
+    transformer.make_dump_file.unlink()
+
+    transformer.create_legacy_make_variables_dump_file()
+
+    assert transformer.make_dump_file.read_text() == make_dump
+    assert transformer.execution_summary[-1].startswith("Reused cached make file dump")
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_create_legacy_make_variables_dump_file_fails(new_transformer: Transformer):
+    transformer = new_transformer
+    transformer.config.build_dir_rel = "Impl/Src"
+    transformer.variant_dir.mkdir(parents=True, exist_ok=True)
+
+    with pytest.raises(RuntimeError):
+        transformer.create_legacy_make_variables_dump_file()
+
+    assert not transformer.make_dump_file.exists()
+    assert transformer.execution_summary[-1].startswith(
+        "Failed to generate make file dump"
+    )
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_create_legacy_components(new_transformer: Transformer):
+    transformer = new_transformer
+    transformer.config.sources_var = "SRC"
+    transformer.config.legacy_component_depth = 1
+    transformer.run()
+
+    assert transformer.legacy_components_cmake_file.read_text() == textwrap.dedent("""\
+        # Generated by Transformer
+        spl_add_component(legacy/components/component_a)
+        spl_add_component(legacy/components/root)
+        """)
+    component_dir = transformer.legacy_components_dir / "component_a"
+    assert component_dir.joinpath("CMakeLists.txt").is_file()
+    assert component_dir.joinpath("MY/VAR/parts.cmake").read_text() == textwrap.dedent(
+        """\
+        # Generated by Transformer
+        spl_add_source(${PROJECT_SOURCE_DIR}/legacy/${VARIANT}/src/component_a/component_a.c)
+        """
+    )
+    assert (
+        "include(${PROJECT_SOURCE_DIR}/legacy/${VARIANT}/components.cmake)"
+        in transformer.variant_parts_cmake_file.read_text()
+    )
+    assert not transformer.legacy_parts_cmake_file.exists()
+
+
+def test_minimize_include_paths(tmp_path: Path):
+    input_dir = tmp_path / "prj1"
+    shutil.copytree(Path("test/data/prj1"), input_dir)
+    input_dir.joinpath("Impl/Src/uses_header.c").write_text("#include <header.h>\n")
+    transformer = Transformer(
+        TransformerConfig(
+            input_dir,
+            tmp_path / "out",
+            Variant("MY", "VAR"),
+            minimize_include_paths=True,
+        )
+    )
+    legacy_build_system = LegacyBuildSystem(
+        "VC_SRC_LIST = ../Src/main.c ../Src/uses_header.c\n"
+        "CPPFLAGS_INC_LIST = -I../Src/component_a -I../Src/include_dir",
+        transformer.config,
+    )
+
+    transformer.analyze_includes(legacy_build_system)
+    transformer.create_variant_parts_cmake(legacy_build_system)
+
+    report = json.loads(transformer.include_analysis_report_file.read_text())
+    assert report["unused"] == [str(input_dir / "Impl/Src/component_a")]
+    assert transformer.execution_summary[0].startswith(
+        "Analyzed 2 includes of 2 sources and 2 headers"
+    )
+    dependencies = json.loads(transformer.dependency_graph_json_file.read_text())
+    assert dependencies["uses_header.c"] == ["include_dir/header.h"]
+    assert transformer.dependency_graph_dot_file.exists()
+    assert (
+        "spl_add_include(${PROJECT_SOURCE_DIR}/legacy/${VARIANT}/src/include_dir)\n\n"
+        in transformer.variant_parts_cmake_file.read_text()
+    )
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_create_variants_json_concurrently(new_transformer: Transformer):
+    variants = [Variant(f"FLV{index}", "SUB") for index in range(8)]
+    threads = [
+        threading.Thread(
+            target=Transformer(new_transformer.config).create_variants_json,
+            args=([variant],),
+        )
+        for variant in variants
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    variants_json = json.loads(new_transformer.variants_json_file.read_text())
+    assert sorted(variants_json["variant"]["choices"]) == sorted(
+        str(variant) for variant in variants
+    )
+    mtime_ns = new_transformer.variants_json_file.stat().st_mtime_ns
+    assert not new_transformer.create_variants_json(variants)
+    assert new_transformer.variants_json_file.stat().st_mtime_ns == mtime_ns
+
+
+def test_run_process_cancelled():
+    cancel_event = threading.Event()
+    threading.Timer(0.1, cancel_event.set).start()
+    start = time.perf_counter()
+
+    with pytest.raises(CancelledError):
+        Transformer.run_process(
+            [sys.executable, "-c", "import time; time.sleep(10)"], cancel_event
+        )
+
+    assert time.perf_counter() - start < 5
+    assert Transformer.run_process([sys.executable, "-c", "print(1)"]) == 0
+
+
+def test_run_process_cancelled_kills_child_processes():
+    # like cmd.exe running make, the child process holds the output pipe open as well
+    script = textwrap.dedent("""\
+        import subprocess, sys, time
+        subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        print("started", flush=True)
+        time.sleep(30)
+        """)
+    cancel_event = threading.Event()
+    start = time.perf_counter()
+
+    def cancel_when_started(line: str) -> None:
+        if line.startswith("started"):
+            cancel_event.set()
+
+    with pytest.raises(CancelledError):
+        Transformer.run_process(
+            [sys.executable, "-c", script], cancel_event, cancel_when_started
+        )
+
+    assert time.perf_counter() - start < 10
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_batch_transformer(new_transformer: Transformer):
+    config = new_transformer.config
+    config.sources_var = "SRC"
+    config.variant_overrides = {"FLV2/SUB": {"variant_compiler_flags": "-O0"}}
+    variants = [Variant("FLV1", "SUB"), Variant("FLV2", "SUB")]
+    configs = [config.for_variant(variant) for variant in variants]
+    variant_stages = {
+        "create folder structure",
+        "make variables dump",
+        "validate sources",
+        "variant parts cmake",
+        "variant config cmake",
+        "legacy parts cmake",
+        "legacy cmake lists",
+    }
+
+    transformers = BatchTransformer(configs, jobs=2).run()
+
+    assert {stage.name for stage in transformers[0].profiler.stages} == {
+        "mirror directories",
+        *variant_stages,
+    }
+    assert {stage.name for stage in transformers[1].profiler.stages} == variant_stages
+    legacy_parts_stage = next(
+        stage
+        for stage in transformers[0].profiler.stages
+        if stage.name == "legacy parts cmake"
+    )
+    assert legacy_parts_stage.counts["sources"] == 2
+    for variant in variants:
+        variant_dir = config.output_dir / f"variants/{variant}"
+        assert variant_dir.joinpath("parts.cmake").is_file()
+        assert (
+            "spl_add_source(src/main.c)"
+            in config.output_dir.joinpath(f"legacy/{variant}/parts.cmake").read_text()
+        )
+        # make gets the variant
+        assert (
+            f"FLAVOR = {variant.flavor}\n"
+            in variant_dir.joinpath("original_make_vars.txt").read_text()
+        )
+    assert (
+        "-O0"
+        not in config.output_dir.joinpath("variants/FLV1/SUB/config.cmake").read_text()
+    )
+    assert (
+        "set(VARIANT_C_FLAGS -O0)"
+        in config.output_dir.joinpath("variants/FLV2/SUB/config.cmake").read_text()
+    )
+    assert config.output_dir.joinpath("CMakeLists.txt").is_file()
+    variants_json = json.loads(
+        config.output_dir.joinpath(".vscode/cmake-variants.json").read_text()
+    )
+    assert variants_json["variant"]["default"] == "FLV1/SUB"
+    assert list(variants_json["variant"]["choices"].keys()) == ["FLV1/SUB", "FLV2/SUB"]
+
+    transformers = BatchTransformer(configs, jobs=2).run()
+    assert [
+        [stage.name for stage in transformer.profiler.stages]
+        for transformer in transformers
+    ] == [["mirror directories"], []]
+    assert transformers[1].execution_summary[-1].startswith("Skipped up-to-date stages")
+
+    transformers = BatchTransformer(configs, force=True).run()
+    assert {stage.name for stage in transformers[1].profiler.stages} == variant_stages
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_run_skips_up_to_date_stages(new_transformer: Transformer):
+    config = new_transformer.config
+    config.sources_var = "SRC"
+    all_stages = {
+        "mirror directories",
+        "create folder structure",
+        "make variables dump",
+        "validate sources",
+        "variant parts cmake",
+        "variant config cmake",
+        "legacy parts cmake",
+        "legacy cmake lists",
+        "create variant json",
+    }
+
+    Transformer(config).run()
+    assert new_transformer.stage_stamps_file.is_file()
+
+    # the mirror always runs, its manifest tells what to copy
+    toolchain_file = config.output_dir / "tools/toolchains/gcc/toolchain.cmake"
+    toolchain_file.unlink()
+    transformer = Transformer(config)
+    transformer.run()
+    assert [stage.name for stage in transformer.profiler.stages] == [
+        "mirror directories"
+    ]
+    assert toolchain_file.is_file()
+    assert transformer.execution_summary[-1].startswith("Skipped up-to-date stages")
+
+    config.subdir_replacements = [SubdirReplacement("component_a", "${COMPONENT_A}")]
+    transformer = Transformer(config)
+    transformer.run()
+    assert {stage.name for stage in transformer.profiler.stages} == {
+        "mirror directories",
+        "variant parts cmake",
+        "legacy parts cmake",
+    }
+    assert (
+        "spl_add_source(${COMPONENT_A}/component_a.c)"
+        in transformer.legacy_parts_cmake_file.read_text()
+    )
+
+    transformer.variant_config_cmake_file.unlink()
+    transformer = Transformer(config)
+    transformer.run()
+    assert {stage.name for stage in transformer.profiler.stages} == {
+        "mirror directories",
+        "variant config cmake",
+    }
+
+    transformer = Transformer(config)
+    transformer.run(force=True)
+    assert {stage.name for stage in transformer.profiler.stages} == all_stages
+
+
+@pytest.mark.parametrize("new_transformer", ["prj1"], indirect=True)
+def test_validate_sources(new_transformer: Transformer):
+    transformer = new_transformer
+    legacy_build_system = LegacyBuildSystem(
+        "VC_SRC_LIST = ../Src/main.c ../Src/missing.c\n"
+        "CPPFLAGS_INC_LIST = -I../Src/include_dir",
+        transformer.config,
+    )
+
+    transformer.validate_sources(legacy_build_system)
+
+    report = json.loads(transformer.source_validation_report_file.read_text())
+    assert report["sources"] == 2
+    assert report["include_paths"] == 1
+    assert [issue["path"] for issue in report["issues"]["missing"]] == [
+        (transformer.input_dir / "Impl/Src/missing.c").as_posix()
+    ]
+    assert transformer.execution_summary[-1].startswith(
+        "Validated 2 sources and 1 include paths"
+    )
+
+    transformer.config.fail_on_source_issues = ["missing"]
+    with pytest.raises(RuntimeError):
+        transformer.validate_sources(legacy_build_system)
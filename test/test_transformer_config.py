@@ -1,5 +1,7 @@
 import json
 from pathlib import Path
+
+import pytest
 from SubdirReplacement import SubdirReplacement
 
 from TransformerConfig import TransformerConfig
@@ -71,3 +73,56 @@ def test_variant_linker_file(tmp_path: Path):
     assert "my/linker.lsl" == config.variant_linker_file
     assert "my_variant_link_flags" == config.variant_link_flags
     assert "my/toolchain.cmake" == config.cmake_toolchain_file
+
+
+def test_variants():
+    data = {
+        "input_dir": "C:/my/in_dir",
+        "output_dir": "C:/my/out_dir",
+        "variant": "MY/VAR",
+        "variants": ["MY/VAR", "MY/OTHER"],
+    }
+
+    config = TransformerConfig.from_dict(data)
+    assert [Variant("MY", "VAR"), Variant("MY", "OTHER")] == config.all_variants
+    assert [] == config.for_variant(Variant("MY", "OTHER")).variants
+    assert Variant("MY", "OTHER") == config.for_variant(Variant("MY", "OTHER")).variant
+
+
+def test_variant_overrides():
+    data = {
+        "input_dir": "C:/my/in_dir",
+        "output_dir": "C:/my/out_dir",
+        "variant": "MY/VAR",
+        "variants": ["MY/VAR", "MY/OTHER"],
+        "make_dump_variables": ["VC_SRC_LIST"],
+        "variant_overrides": {
+            "MY/OTHER": {"sources_var": "OTHER_SRC", "make_dump_variables": []}
+        },
+    }
+
+    config = TransformerConfig.from_dict(data)
+    variant_config = config.for_variant(Variant("MY", "VAR"))
+    assert "VC_SRC_LIST" == variant_config.sources_var
+    assert ["VC_SRC_LIST"] == variant_config.make_dump_variables
+    other_config = config.for_variant(Variant("MY", "OTHER"))
+    assert "OTHER_SRC" == other_config.sources_var
+    assert [] == other_config.make_dump_variables
+    assert {} == other_config.variant_overrides
+
+    config.variant_overrides = {"MY/OTHER": {"no_such_field": 1}}
+    with pytest.raises(ValueError):
+        config.for_variant(Variant("MY", "OTHER"))
+
+
+def test_make_dump_selection():
+    config = TransformerConfig(Path("C:/my/in_dir"), Path("C:/my/out_dir"), "MY/VAR")
+    assert [] == config.make_dump_selection
+
+    config.make_dump_variables = ["%FLAGS", "VC_SRC_LIST"]
+    assert [
+        "MAKEFILE_LIST",
+        "CPPFLAGS_INC_LIST",
+        "VC_SRC_LIST",
+        "%FLAGS",
+    ] == config.make_dump_selection
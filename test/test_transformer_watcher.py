@@ -0,0 +1,140 @@
+import json
+import os
+from pathlib import Path
+import shutil
+
+import pytest
+from TransformerConfig import TransformerConfig
+from TransformerWatcher import CONFIG, MAKEFILES, MIRRORED_DIRS, TransformerWatcher
+
+
+def touch(file: Path, content: str) -> None:
+    """Change the file and make sure its modification time changes as well."""
+    mtime_ns = file.stat().st_mtime_ns if file.exists() else 0
+    file.write_text(content)
+    os.utime(file, ns=(mtime_ns + 1_000_000_000, mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def watcher(tmp_path: Path) -> TransformerWatcher:
+    input_dir = tmp_path / "prj1"
+    shutil.copytree(Path(__file__).parent / "data/prj1", input_dir)
+    config_data = {
+        "input_dir": str(input_dir),
+        "output_dir": str(tmp_path / "out"),
+        "variant": "FLV/SUB",
+        "sources_var": "SRC",
+        "mirror_directories": [{"source": "Impl/Cfg", "target": "cfg"}],
+    }
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config_data))
+    watcher = TransformerWatcher(
+        TransformerConfig.from_json_file(config_file), config_file, poll_interval=0
+    )
+    watcher.config_data = config_data
+    return watcher
+
+
+ALL_STAGES = {
+    "mirror directories",
+    "create folder structure",
+    "make variables dump",
+    "validate sources",
+    "variant parts cmake",
+    "variant config cmake",
+    "legacy parts cmake",
+    "legacy cmake lists",
+    "create variant json",
+}
+
+
+def test_transform(watcher: TransformerWatcher):
+    assert set(watcher.transform()) == ALL_STAGES
+    assert watcher.transformer.legacy_parts_cmake_file.is_file()
+    assert watcher.poll() == set()
+    assert watcher.check() == []
+
+
+def test_config_change(watcher: TransformerWatcher):
+    watcher.transform()
+
+    watcher.config_data["subdir_replacements"] = [
+        {"subdir_rel": "component_a", "replacement": "${COMPONENT_A}"}
+    ]
+    touch(watcher.config_file, json.dumps(watcher.config_data))
+
+    assert watcher.poll() == {CONFIG}
+    assert set(watcher.update({CONFIG})) == {
+        "mirror directories",
+        "variant parts cmake",
+        "legacy parts cmake",
+    }
+    assert (
+        "spl_add_source(${COMPONENT_A}/component_a.c)"
+        in watcher.transformer.legacy_parts_cmake_file.read_text()
+    )
+
+    watcher.config_data["batch_commands"] = ["set SOME_VAR=1"]
+    touch(watcher.config_file, json.dumps(watcher.config_data))
+    assert "make variables dump" in watcher.check()
+
+
+def test_makefile_change(watcher: TransformerWatcher):
+    watcher.transform()
+    makefile = watcher.transformer.build_dir / "makefile"
+
+    touch(makefile, makefile.read_text() + "\nSRC += ../Src/new.c\n")
+
+    assert watcher.poll() == {MAKEFILES}
+    assert "make variables dump" in watcher.update({MAKEFILES})
+    assert (
+        "spl_add_source(src/new.c)"
+        in watcher.transformer.legacy_parts_cmake_file.read_text()
+    )
+
+
+def test_mirrored_dir_change(watcher: TransformerWatcher):
+    watcher.transform()
+    new_file = watcher.config.input_dir / "Impl/Cfg/new.txt"
+
+    touch(new_file, "new")
+
+    assert watcher.check() == ["mirror directories"]
+    assert watcher.config.output_dir.joinpath("cfg/new.txt").read_text() == "new"
+    assert watcher.poll() == set()
+
+
+def test_failing_update_keeps_watching(watcher: TransformerWatcher):
+    watcher.transform()
+
+    touch(watcher.config_file, "{ invalid json")
+
+    assert watcher.check() == []
+    assert watcher.poll() == set()
+
+
+def test_unchanged_config_content_only_mirrors(watcher: TransformerWatcher):
+    watcher.transform()
+
+    touch(watcher.config_file, json.dumps(watcher.config_data))
+
+    assert watcher.check() == ["mirror directories"]
+
+
+def test_profile_memory_kept_for_reloaded_config(watcher: TransformerWatcher):
+    watcher.config.profile_memory = True
+    watcher.profile_memory = True
+    watcher.transform()
+
+    touch(watcher.config_file, json.dumps(watcher.config_data))
+    watcher.check()
+
+    assert watcher.transformer.config.profile_memory
+
+
+def test_force(watcher: TransformerWatcher):
+    watcher.transform()
+    assert watcher.transformer.stage_stamps_file.is_file()
+
+    watcher.force = True
+    assert set(watcher.transform()) == ALL_STAGES
@@ -0,0 +1,217 @@
+from concurrent.futures import CancelledError
+import os
+from pathlib import Path
+import threading
+
+import pytest
+from TransformerConfig import DirMirrorData
+from TreeMirror import TreeMirror
+
+
+@pytest.fixture
+def source_dir(tmp_path: Path) -> Path:
+    source = tmp_path / "source"
+    for file in ["main.c", "main.h", "sub/component.c", "sub/.dm/meta.txt"]:
+        source.joinpath(file).parent.mkdir(parents=True, exist_ok=True)
+        source.joinpath(file).write_text(file)
+    return source
+
+
+def test_mirror_copies_tree(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache"
+    ).run()
+
+    assert target.joinpath("main.c").read_text() == "main.c"
+    assert target.joinpath("sub/component.c").is_file()
+    assert not target.joinpath("sub/.dm").exists()
+    assert statistics.copied_files == 3
+    assert statistics.copied_bytes == len("main.c") + len("main.h") + len(
+        "sub/component.c"
+    )
+
+
+def test_mirror_copies_only_changed_files(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    TreeMirror(DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache").run()
+    source_dir.joinpath("main.c").write_text("changed")
+
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache"
+    ).run()
+
+    assert target.joinpath("main.c").read_text() == "changed"
+    assert statistics.copied_files == 1
+    assert statistics.skipped_files == 2
+
+
+def test_mirror_purges_target(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    target.joinpath("obsolete/.dm").mkdir(parents=True)
+    target.joinpath("obsolete.c").write_text("obsolete")
+    target.joinpath("sub/.dm").mkdir(parents=True)
+
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache"
+    ).run()
+
+    assert not target.joinpath("obsolete").exists()
+    assert not target.joinpath("obsolete.c").exists()
+    assert not target.joinpath("sub/.dm").exists()
+    assert statistics.deleted_files == 1
+
+
+def test_no_overwrite(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    target.mkdir()
+    target.joinpath("main.c").write_text("modified in target")
+    target.joinpath("extra.c").write_text("extra")
+
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target, mirror=False), manifest_dir=tmp_path / "cache"
+    ).run()
+
+    assert target.joinpath("main.c").read_text() == "modified in target"
+    assert target.joinpath("extra.c").is_file()
+    assert target.joinpath("main.h").is_file()
+    assert statistics.copied_files == 2
+    assert statistics.skipped_files == 1
+
+
+def test_patterns(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    target.mkdir()
+    target.joinpath("unrelated.txt").write_text("unrelated")
+
+    TreeMirror(
+        DirMirrorData(source_dir, target, patterns=["*.c"]),
+        manifest_dir=tmp_path / "cache",
+    ).run()
+
+    assert sorted(
+        Path(root, file).relative_to(target).as_posix()
+        for root, _, files in os.walk(target)
+        for file in files
+    ) == ["main.c", "sub/component.c", "unrelated.txt"]
+
+
+def test_incremental_mirror(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    TreeMirror(DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache").run()
+    # the manifest is kept out of the target
+    assert sorted(file.name for file in target.iterdir()) == ["main.c", "main.h", "sub"]
+    assert len(list(tmp_path.joinpath("cache").iterdir())) == 1
+    source_dir.joinpath("sub/component.c").unlink()
+    source_dir.joinpath("new.c").write_text("new")
+
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache"
+    ).run()
+
+    assert statistics.incremental
+    assert statistics.copied_files == 1
+    assert statistics.skipped_files == 2
+    assert statistics.deleted_files == 1
+    assert target.joinpath("new.c").is_file()
+    assert not target.joinpath("sub").exists()
+
+
+def test_incremental_mirror_with_changed_settings(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    TreeMirror(DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache").run()
+
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target, patterns=["*.c"]),
+        manifest_dir=tmp_path / "cache",
+    ).run()
+
+    assert not statistics.incremental
+    assert statistics.skipped_files == 2
+
+
+def test_incremental_mirror_hash_contents(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    TreeMirror(
+        DirMirrorData(source_dir, target, hash_contents=True),
+        manifest_dir=tmp_path / "cache",
+    ).run()
+    source_stat = source_dir.joinpath("main.c").stat()
+    os.utime(
+        source_dir.joinpath("main.c"),
+        ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns + 10**9),
+    )
+
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target, hash_contents=True),
+        manifest_dir=tmp_path / "cache",
+    ).run()
+
+    assert statistics.incremental
+    assert statistics.copied_files == 0
+    assert statistics.skipped_files == 3
+
+
+def test_cancel_mirror(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    cancel_event = threading.Event()
+    tree_mirror = TreeMirror(
+        DirMirrorData(source_dir, target),
+        max_workers=1,
+        manifest_dir=tmp_path / "cache",
+    )
+    copy_file = tree_mirror.copy_file
+
+    def copy_file_and_cancel(copy):
+        file_state = copy_file(copy)
+        cancel_event.set()
+        return file_state
+
+    tree_mirror.copy_file = copy_file_and_cancel
+    with pytest.raises(CancelledError):
+        tree_mirror.run(cancel_event)
+
+    # the file copied before the cancellation is kept in the manifest
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache"
+    ).run()
+    assert statistics.incremental
+    assert statistics.copied_files == 2
+    assert statistics.skipped_files == 1
+
+
+def test_incremental_mirror_restores_target(source_dir: Path, tmp_path: Path):
+    target = tmp_path / "target"
+    TreeMirror(DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache").run()
+    target.joinpath("main.c").unlink()
+    target.joinpath("main.h").write_text("modified in target")
+
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache"
+    ).run()
+
+    assert not statistics.incremental
+    assert statistics.copied_files == 2
+    assert target.joinpath("main.c").read_text() == "main.c"
+    assert target.joinpath("main.h").read_text() == "main.h"
+    statistics = TreeMirror(
+        DirMirrorData(source_dir, target), manifest_dir=tmp_path / "cache"
+    ).run()
+    assert statistics.incremental
+    assert statistics.copied_files == 0
+
+
+def test_incremental_no_overwrite_restores_deleted_files(
+    source_dir: Path, tmp_path: Path
+):
+    target = tmp_path / "target"
+    data = DirMirrorData(source_dir, target, mirror=False)
+    TreeMirror(data, manifest_dir=tmp_path / "cache").run()
+    target.joinpath("main.c").unlink()
+    target.joinpath("main.h").write_text("modified in target")
+
+    statistics = TreeMirror(data, manifest_dir=tmp_path / "cache").run()
+
+    assert statistics.copied_files == 1
+    assert target.joinpath("main.c").read_text() == "main.c"
+    assert target.joinpath("main.h").read_text() == "modified in target"
@@ -1,4 +1,5 @@
 import textwrap
+from CompileFlags import CompileFlags
 from file_generators import VariantConfigCMakeGenerator
 
 
@@ -20,3 +21,36 @@ def test_to_string():
         )
         == generator.to_string()
     )
+
+
+def test_to_string_with_legacy_flags():
+    generator = VariantConfigCMakeGenerator(
+        compiler_flags="my_compiler_flags",
+        linker_file="my/linker_file.lsl",
+        link_flags="my_link_flags",
+        cmake_toolchain_file="my/cmake_toolchain_file.cmake",
+        compile_flags=CompileFlags(["KARSTEN", 'NAME="a b"'], ["-O2"]),
+        asm_flags=CompileFlags(["Foo"]),
+        link_options=["-Wl,--gc-sections", "SHELL:-T Cfg/Linker.ld"],
+    )
+    assert generator.to_string().endswith(
+        textwrap.dedent(
+            """\
+        set(CMAKE_TOOLCHAIN_FILE my/cmake_toolchain_file.cmake CACHE PATH "toolchain file")
+        add_compile_definitions(
+            $<$<COMPILE_LANGUAGE:C,CXX>:KARSTEN>
+            "$<$<COMPILE_LANGUAGE:C,CXX>:NAME=\\"a b\\">"
+        )
+        add_compile_options(
+            $<$<COMPILE_LANGUAGE:C,CXX>:-O2>
+        )
+        add_compile_definitions(
+            $<$<COMPILE_LANGUAGE:ASM>:Foo>
+        )
+        add_link_options(
+            -Wl,--gc-sections
+            "SHELL:-T Cfg/Linker.ld"
+        )
+        """
+        )
+    )
@@ -37,6 +37,32 @@ def test_to_string(generator: VariantPartsCMakeGenerator):
     assert generator.to_string() == expected_output
 
 
+def test_to_string_without_includes_and_libs():
+    generator = VariantPartsCMakeGenerator([], [])
+    assert generator.to_string() == textwrap.dedent(
+        """\
+        # Generated by Transformer
+
+
+        spl_add_component(legacy)
+
+        """
+    )
+
+
+def test_to_string_with_legacy_components():
+    generator = VariantPartsCMakeGenerator([], [], legacy_components=True)
+    assert generator.to_string() == textwrap.dedent(
+        """\
+        # Generated by Transformer
+
+
+        include(${PROJECT_SOURCE_DIR}/legacy/${VARIANT}/components.cmake)
+
+        """
+    )
+
+
 def test_cmake_includes(generator: VariantPartsCMakeGenerator):
     generator.subdir_extra_replacements = [
         SubdirReplacement("TO_BE_REPLACED", "$ENV{SOME_DIR}"),